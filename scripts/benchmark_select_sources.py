@@ -0,0 +1,121 @@
+"""
+图片源选择性能测试
+
+构造 100+ 条规则（正则规则 + 作品来源规则）和 10 万个标签，
+对比逐条调用匹配函数的原始实现与 ImageSourceManager.select_sources（合并正则 + 字典索引 + 选择缓存），
+并校验两者的选择结果完全一致
+
+用法:
+  python benchmark_select_sources.py [--tags 100000] [--pattern-rules 80] [--source-rules 40]
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from card_generator.image_source import ImageSource, ImageSourceManager
+
+
+class DummyImageSource(ImageSource):
+    """只有名称的图片源（不发请求）"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def get_name(self) -> str:
+        return self.name
+
+    async def search(self, *args, **kwargs):
+        return None
+
+
+def legacy_select_sources(manager: ImageSourceManager, tag: str, item_data: Dict) -> List[ImageSource]:
+    """原始实现：逐条调用规则的匹配函数，按名称线性查找图片源"""
+    def get_source_by_name(name):
+        for source in manager.sources:
+            if source.get_name() == name:
+                return source
+        return None
+
+    selected_sources = []
+    for matcher, source_name in manager.rules:
+        try:
+            if matcher(tag, item_data):
+                source = get_source_by_name(source_name)
+                if source and source not in selected_sources:
+                    selected_sources.append(source)
+        except Exception:
+            pass
+
+    default_source = get_source_by_name(manager.default_source_name)
+    if default_source and default_source not in selected_sources:
+        selected_sources.append(default_source)
+
+    if not selected_sources:
+        selected_sources = manager.sources.copy()
+    return selected_sources
+
+
+def build_manager(pattern_rules: int, source_rules: int, source_count: int = 12) -> ImageSourceManager:
+    """注册图片源和规则：正则规则按作品后缀匹配，作品来源规则按 source_en 匹配"""
+    manager = ImageSourceManager()
+    manager.register_source(DummyImageSource('Safebooru'))
+    for i in range(source_count):
+        manager.register_source(DummyImageSource(f'Source{i}'))
+
+    for i in range(pattern_rules):
+        manager.add_pattern_rule(rf'_\(game_{i}\)$', f'Source{i % source_count}')
+    for i in range(source_rules):
+        manager.add_source_rule(f'Work {i}', f'Source{(i * 7) % source_count}')
+    return manager
+
+
+def build_items(count: int, pattern_rules: int, source_rules: int, seed: int = 42) -> List[Dict]:
+    """生成标签：约 15% 带有规则中的作品后缀，约 30% 的 source_en 命中作品来源规则"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        tag = f'character_{i}'
+        roll = rng.random()
+        if roll < 0.15:
+            tag += f'_(game_{rng.randrange(pattern_rules)})'
+        elif roll < 0.25:
+            tag += f'_(other_series_{rng.randrange(1000)})'
+        source_en = f'Work {rng.randrange(source_rules * 3)}' if rng.random() < 0.9 else ''
+        items.append({'tag': tag, 'source_en': source_en})
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片源选择性能测试')
+    parser.add_argument('--tags', type=int, default=100000, help='标签数量（默认: 100000）')
+    parser.add_argument('--pattern-rules', type=int, default=80, help='正则规则数量（默认: 80）')
+    parser.add_argument('--source-rules', type=int, default=40, help='作品来源规则数量（默认: 40）')
+    args = parser.parse_args()
+
+    manager = build_manager(args.pattern_rules, args.source_rules)
+    items = build_items(args.tags, args.pattern_rules, args.source_rules)
+    print(f"🧪 {len(items)} 个标签 | {len(manager.rules)} 条规则 | {len(manager.sources)} 个图片源")
+
+    start = time.perf_counter()
+    legacy = [legacy_select_sources(manager, item['tag'], item) for item in items]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [manager.select_sources(item['tag'], item) for item in items]
+    indexed_seconds = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(legacy, indexed) if a != b)
+    print(f"🐢 逐条匹配: {legacy_seconds:.2f} 秒（{legacy_seconds / len(items) * 1e6:.1f} µs/标签）")
+    print(f"⚡ 索引匹配: {indexed_seconds:.2f} 秒（{indexed_seconds / len(items) * 1e6:.1f} µs/标签）"
+          f" | 缓存 {len(manager._selection_cache)} 种组合")
+    print(f"📈 加速: {legacy_seconds / indexed_seconds:.1f}x")
+    if mismatches:
+        print(f"❌ 选择结果不一致: {mismatches} 个标签")
+    else:
+        print("✅ 选择结果完全一致")
+
+
+if __name__ == '__main__':
+    main()
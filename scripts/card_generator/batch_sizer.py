@@ -0,0 +1,134 @@
+"""
+自适应批大小模块 - 根据 LLM 响应的完整率、延迟和输出 token 调整批大小
+"""
+
+import math
+import time
+from typing import Dict, List, Optional
+
+
+class AdaptiveBatchSizer:
+    """
+    自适应 LLM 批大小
+
+    每累积 window 次观测做一次决策：
+    - 出现截断或返回完整率偏低 -> 按比例缩小
+    - 平均延迟超过目标 -> 减 1
+    - 完整率高且延迟充裕 -> 加 1（不超过输出 token 预算允许的大小）
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_size: int = 3,
+        max_size: int = 30,
+        target_latency: float = 30.0,
+        window: int = 3,
+        max_output_tokens: Optional[int] = None
+    ):
+        """
+        Args:
+            initial: 初始批大小
+            min_size: 最小批大小
+            max_size: 最大批大小
+            target_latency: 目标单次请求延迟（秒）
+            window: 每多少次观测做一次决策
+            max_output_tokens: 单次请求的输出 token 上限，用于限制批大小
+        """
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(max(initial, self.min_size), self.max_size)
+        self.initial = self.size
+        self.target_latency = target_latency
+        self.window = max(1, window)
+        self.max_output_tokens = max_output_tokens
+
+        self.decisions: List[Dict] = []
+        self._observations: List[Dict] = []
+        self._tokens_per_item: Optional[float] = None
+
+    def record(
+        self,
+        requested: int,
+        valid: int,
+        latency: float,
+        truncated: bool = False,
+        completion_tokens: Optional[int] = None
+    ):
+        """
+        记录一次 LLM 批次结果
+
+        Args:
+            requested: 请求的标签数量
+            valid: 返回的有效条目数量
+            latency: 请求耗时（秒）
+            truncated: 输出是否被截断（finish_reason == "length"）
+            completion_tokens: 输出 token 数
+        """
+        if requested <= 0:
+            return
+
+        if completion_tokens and valid > 0:
+            per_item = completion_tokens / valid
+            if self._tokens_per_item is None:
+                self._tokens_per_item = per_item
+            else:
+                self._tokens_per_item = 0.8 * self._tokens_per_item + 0.2 * per_item
+
+        self._observations.append({
+            'requested': requested,
+            'valid': valid,
+            'latency': latency,
+            'truncated': truncated,
+        })
+        if len(self._observations) >= self.window:
+            self._decide()
+
+    def _token_cap(self) -> int:
+        """输出 token 预算允许的最大批大小（预留 20% 余量）"""
+        if not self.max_output_tokens or not self._tokens_per_item:
+            return self.max_size
+        return max(self.min_size, int(self.max_output_tokens * 0.8 / self._tokens_per_item))
+
+    def _decide(self):
+        observations, self._observations = self._observations, []
+
+        requested = sum(o['requested'] for o in observations)
+        valid = sum(o['valid'] for o in observations)
+        validity = valid / requested if requested else 1.0
+        latency = sum(o['latency'] for o in observations) / len(observations)
+        truncated = any(o['truncated'] for o in observations)
+
+        old_size = self.size
+        if truncated:
+            new_size, reason = math.floor(old_size * 0.5), '输出截断'
+        elif validity < 0.9:
+            new_size, reason = math.floor(old_size * 0.7), f'完整率 {validity:.0%}'
+        elif latency > self.target_latency:
+            new_size, reason = old_size - 1, f'延迟 {latency:.1f}s'
+        elif validity >= 0.99 and latency < self.target_latency * 0.8:
+            new_size, reason = old_size + 1, f'完整率 {validity:.0%}，延迟 {latency:.1f}s'
+        else:
+            return
+
+        new_size = min(max(new_size, self.min_size), self.max_size, self._token_cap())
+        if new_size == old_size:
+            return
+
+        self.size = new_size
+        self.decisions.append({
+            'time': time.time(),
+            'from': old_size,
+            'to': new_size,
+            'reason': reason,
+        })
+
+    def summary(self) -> Dict:
+        """返回调整摘要（用于统计报告和持久化）"""
+        return {
+            'initial': self.initial,
+            'final': self.size,
+            'grow': sum(1 for d in self.decisions if d['to'] > d['from']),
+            'shrink': sum(1 for d in self.decisions if d['to'] < d['from']),
+            'tokens_per_item': round(self._tokens_per_item, 1) if self._tokens_per_item else None,
+        }
@@ -0,0 +1,191 @@
+"""
+并发控制模块 - AIMD 自适应并发限制器
+
+可直接替代 asyncio.Semaphore 用于 `async with`：
+    async with limiter as slot:
+        ...
+        if slot:
+            slot.report(response.status)
+
+asyncio.Semaphore 的 `async with` 返回 None，因此同一段代码对两者都适用
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class _Slot:
+    """一次并发占用，用于回报请求结果"""
+
+    __slots__ = ('status', 'start')
+
+    def __init__(self):
+        self.status: Optional[int] = None
+        self.start = time.perf_counter()
+
+    def report(self, status: int):
+        """回报 HTTP 状态码"""
+        self.status = status
+
+
+class AIMDLimiter:
+    """
+    AIMD（加性增、乘性减）并发限制器
+
+    - 请求成功且延迟正常：每完成约 limit 个请求，上限加 1
+    - 429 / 5xx / 请求异常 / 延迟突增：上限乘以 decrease_factor（冷却期内只减一次）
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 50,
+        decrease_factor: float = 0.5,
+        latency_spike: float = 3.0
+    ):
+        """
+        Args:
+            name: 限制器名称（主机名或图片源名称）
+            initial: 初始并发上限
+            min_limit: 并发上限下限
+            max_limit: 并发上限上限
+            decrease_factor: 乘性减小系数
+            latency_spike: 延迟超过平滑基线的多少倍视为突增
+        """
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.latency_spike = latency_spike
+
+        self.in_flight = 0
+        self.peak_limit = self.limit
+        self.low_limit = self.limit
+        self.decreases = 0
+        self._baseline_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._slots: Dict[asyncio.Task, _Slot] = {}
+
+    @property
+    def current_limit(self) -> int:
+        """当前并发上限（整数）"""
+        return int(self.limit)
+
+    async def __aenter__(self) -> _Slot:
+        while self.in_flight >= self.current_limit:
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if not fut.done():
+                    self._waiters.remove(fut)
+                else:
+                    # 已被唤醒却被取消，把机会让给下一个等待者
+                    self._wake()
+                raise
+        self.in_flight += 1
+        slot = _Slot()
+        self._slots[asyncio.current_task()] = slot
+        return slot
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # 释放过程不含 await，取消时也不会泄漏并发名额
+        slot = self._slots.pop(asyncio.current_task(), None)
+        self.in_flight -= 1
+        # 取消（如 asyncio.CancelledError）不代表下游有压力，不参与调整
+        if slot and not (exc_type and issubclass(exc_type, asyncio.CancelledError)):
+            self._on_result(slot, exc_type is not None)
+        self._wake()
+        return False
+
+    def _wake(self):
+        """按空闲名额唤醒等待者"""
+        free = self.current_limit - self.in_flight
+        while free > 0 and self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+    def _on_result(self, slot: _Slot, failed: bool):
+        latency = time.perf_counter() - slot.start
+        status = slot.status
+
+        overloaded = failed or (status is not None and (status == 429 or status >= 500))
+        spiked = (
+            not overloaded
+            and self._baseline_latency is not None
+            and latency > self._baseline_latency * self.latency_spike
+        )
+
+        if overloaded or spiked:
+            self._decrease(latency)
+            return
+
+        if status is not None and status >= 400:
+            # 其他 4xx 是请求本身的问题，与负载无关
+            return
+
+        # 平滑延迟基线（只用正常响应更新）
+        if self._baseline_latency is None:
+            self._baseline_latency = latency
+        else:
+            self._baseline_latency = 0.9 * self._baseline_latency + 0.1 * latency
+
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _decrease(self, latency: float):
+        now = time.perf_counter()
+        # 冷却期：同一波拥塞中并发请求同时失败时只减一次
+        cooldown = max(1.0, self._baseline_latency or latency)
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        self.low_limit = min(self.low_limit, self.limit)
+        self.decreases += 1
+
+    def summary(self) -> Dict:
+        """返回限制器状态摘要"""
+        return {
+            'limit': self.current_limit,
+            'peak': int(self.peak_limit),
+            'low': int(self.low_limit),
+            'decreases': self.decreases,
+        }
+
+
+class LimiterRegistry:
+    """按名称（主机名或图片源名称）管理各自独立的限制器"""
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 50):
+        """
+        Args:
+            initial: 新建限制器的初始并发上限
+            min_limit: 并发上限下限
+            max_limit: 并发上限上限
+        """
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limiters: Dict[str, AIMDLimiter] = {}
+
+    def get(self, name: str) -> AIMDLimiter:
+        """获取（不存在时创建）指定名称的限制器"""
+        limiter = self.limiters.get(name)
+        if limiter is None:
+            limiter = AIMDLimiter(name, self.initial, self.min_limit, self.max_limit)
+            self.limiters[name] = limiter
+        return limiter
+
+    def summary(self) -> Dict[str, Dict]:
+        """返回所有限制器的状态摘要"""
+        return {name: limiter.summary() for name, limiter in self.limiters.items()}
@@ -2,6 +2,7 @@
 配置管理模块 - 配置加载和环境变量管理
 """
 
+import copy
 import json
 import os
 import sys
@@ -45,14 +46,52 @@ class Config:
             self.llm_concurrency = self.config_data['llm'].get('concurrency', 5)
             self.llm_retry_times = self.config_data['llm'].get('retry_times', 3)
             self.llm_retry_delay = self.config_data['llm'].get('retry_delay', 2)
+            self.llm_repair_rounds = self.config_data['llm'].get('repair_rounds', 2)
+            self.llm_stream = self.config_data['llm'].get('stream', True)
+            self.llm_response_format = self.config_data['llm'].get('response_format', 'verbose')
+            self.llm_batch_poll_interval = self.config_data['llm'].get('batch_poll_interval', 30)
+            self.llm_batch_completion_window = self.config_data['llm'].get('batch_completion_window', '24h')
+            self.llm_cascade = self.config_data['llm'].get('cascade', False)
+            self.adaptive_concurrency = self.config_data['llm'].get('adaptive_concurrency', False)
+            self.llm_max_concurrency = self.config_data['llm'].get('max_concurrency', 20)
+            self.llm_cache_enabled = self.config_data['llm'].get('cache_enabled', True)
+            self.llm_cache_ttl_days = self.config_data['llm'].get('cache_ttl_days', 30)
+            self.adaptive_batch = self.config_data['llm'].get('adaptive_batch', False)
+            self.min_batch_size = self.config_data['llm'].get('min_batch_size', 3)
+            self.max_batch_size = self.config_data['llm'].get('max_batch_size', 30)
+            self.target_latency = self.config_data['llm'].get('target_latency', 30)
             
             # 图片配置
             self.img_concurrency = self.config_data['image'].get('concurrency', 10)
             self.img_retry_times = self.config_data['image'].get('retry_times', 2)
             self.img_retry_delay = self.config_data['image'].get('retry_delay', 1)
+            self.img_max_concurrency = self.config_data['image'].get('max_concurrency', 40)
+            self.img_store_enabled = self.config_data['image'].get('store_enabled', True)
+            self.img_hit_ttl_days = self.config_data['image'].get('hit_ttl_days', 90)
+            self.img_miss_ttl_days = self.config_data['image'].get('miss_ttl_days', 7)
+            self.img_batch_enabled = self.config_data['image'].get('batch_enabled', False)
+            self.img_batch_max_tags = self.config_data['image'].get('batch_max_tags', 20)
+            self.img_batch_limit = self.config_data['image'].get('batch_limit', 100)
+            self.img_batch_window = self.config_data['image'].get('batch_window', 0.05)
+            self.img_prefilter_enabled = self.config_data['image'].get('prefilter_enabled', False)
+            self.img_prefilter_batch = self.config_data['image'].get('prefilter_batch', 100)
+            self.img_solo_min_count = self.config_data['image'].get('solo_min_count', 5)
+            self.img_candidates = self.config_data['image'].get('candidates', 10)
+            self.img_target_aspect = self.config_data['image'].get('target_aspect', 1.5)
+            self.img_breaker_failures = self.config_data['image'].get('breaker_failures', 0)
+            self.img_breaker_cooldown = self.config_data['image'].get('breaker_cooldown', 30)
+            self.img_health_window = self.config_data['image'].get('health_window', 100)
             
             # 处理配置
             self.save_interval_batches = self.config_data['processing'].get('save_interval_batches', 5)
+            self.workers = self.config_data['processing'].get('workers', 10)
+            self.queue_size = self.config_data['processing'].get('queue_size', 20)
+            
+            # 限速配置
+            self.rate_limit = self.config_data.get('rate_limit', {})
+            
+            # LLM 端点池配置
+            self.llm_pool = self.config_data.get('llm_pool', {})
             
             # 路径配置
             self.input_url = self.config_data['paths'].get('input_url')
@@ -61,29 +100,101 @@ class Config:
             self.data_dir = os.path.join(self.base_dir, self.config_data['paths'].get('data_dir'))
             self.cached_source_file = os.path.join(self.base_dir, self.config_data['paths'].get('cached_source_file'))
             self.mapping_file = os.path.join(self.base_dir, self.config_data['paths'].get('mapping_file'))
+            self.llm_cache_file = os.path.join(self.base_dir, self.config_data['paths'].get('llm_cache_file', '../data/llm_cache.sqlite3'))
+            self.img_store_file = os.path.join(self.base_dir, self.config_data['paths'].get('image_store_file', '../data/image_store.sqlite3'))
+            self.tuning_state_file = os.path.join(self.base_dir, self.config_data['paths'].get('tuning_state_file', '../data/tuning_state.json'))
+            self.llm_batch_state_file = os.path.join(self.base_dir, self.config_data['paths'].get('llm_batch_state_file', '../data/llm_batch_state.json'))
         else:
             # 默认配置
             self.batch_size = 10
             self.llm_concurrency = 5
             self.llm_retry_times = 3
             self.llm_retry_delay = 2
+            self.llm_repair_rounds = 2
+            self.llm_stream = True
+            self.llm_response_format = 'verbose'
+            self.llm_batch_poll_interval = 30
+            self.llm_batch_completion_window = '24h'
+            self.llm_cascade = False
+            self.adaptive_concurrency = False
+            self.llm_max_concurrency = 20
+            self.llm_cache_enabled = True
+            self.llm_cache_ttl_days = 30
+            self.adaptive_batch = False
+            self.min_batch_size = 3
+            self.max_batch_size = 30
+            self.target_latency = 30
             self.img_concurrency = 10
             self.img_retry_times = 2
             self.img_retry_delay = 1
+            self.img_max_concurrency = 40
+            self.img_store_enabled = True
+            self.img_hit_ttl_days = 90
+            self.img_miss_ttl_days = 7
+            self.img_batch_enabled = False
+            self.img_batch_max_tags = 20
+            self.img_batch_limit = 100
+            self.img_batch_window = 0.05
+            self.img_prefilter_enabled = False
+            self.img_prefilter_batch = 100
+            self.img_solo_min_count = 5
+            self.img_candidates = 10
+            self.img_target_aspect = 1.5
+            self.img_breaker_failures = 0
+            self.img_breaker_cooldown = 30
+            self.img_health_window = 100
             self.save_interval_batches = 5
+            self.workers = 10
+            self.queue_size = 20
+            self.rate_limit = {
+                'default': {'rps': 0, 'burst': 1},
+                'hosts': {'safebooru.org': {'rps': 5, 'burst': 5}},
+                'max_retry_after': 120,
+            }
+            self.llm_pool = {}
             
             self.input_url = "https://raw.githubusercontent.com/DominikDoom/a1111-sd-webui-tagcomplete/refs/heads/main/tags/noob_characters-chants.json"
             self.output_file = os.path.join(self.base_dir, '..', 'output', 'noob_characters-chants-en-cn.json')
             self.debug_output_file = os.path.join(self.base_dir, '..', 'output', 'debug_output.json')
             self.data_dir = os.path.join(self.base_dir, '..', 'data')
-            self.cached_source_file = os.path.join(self.data_dir, 'noob_characters-chants.json')
+            self.cached_source_file = os.path.join(self.data_dir, 'noob_characters-chants.json.gz')
             self.mapping_file = os.path.join(self.base_dir, 'source_name_mapping.json')
+            self.llm_cache_file = os.path.join(self.data_dir, 'llm_cache.sqlite3')
+            self.img_store_file = os.path.join(self.data_dir, 'image_store.sqlite3')
+            self.tuning_state_file = os.path.join(self.data_dir, 'tuning_state.json')
+            self.llm_batch_state_file = os.path.join(self.data_dir, 'llm_batch_state.json')
     
     def _load_env_vars(self):
         """加载环境变量"""
         self.llm_api_url = os.getenv("LLM_API_URL")
         self.llm_api_key = os.getenv("LLM_API_KEY")
         self.llm_model = os.getenv("LLM_MODEL")
+        self.llm_batch_api_url = os.getenv("LLM_BATCH_API_URL")
+        
+        # 级联模式的强模型（URL/Key 未设置时与默认端点相同）
+        self.llm_strong_model = os.getenv("LLM_STRONG_MODEL")
+        self.llm_strong_api_url = os.getenv("LLM_STRONG_API_URL")
+        self.llm_strong_api_key = os.getenv("LLM_STRONG_API_KEY")
+        
+        # 模型层级（级联模式下用于区分统计），以及请求是否经过端点池
+        self.llm_tier = 'cheap' if self.llm_cascade else ''
+        self.llm_use_pool = True
+    
+    def strong_tier_config(self) -> 'Config':
+        """
+        级联模式中强模型使用的配置副本
+        
+        设置了 LLM_STRONG_API_URL 时直接请求该地址，不经过端点池；
+        否则经过端点池时只发往没有配置自己模型的端点（没有这样的端点时直接请求 LLM_API_URL）
+        """
+        strong = copy.copy(self)
+        strong.llm_model = self.llm_strong_model
+        strong.llm_api_url = self.llm_strong_api_url or self.llm_api_url
+        strong.llm_api_key = self.llm_strong_api_key or self.llm_api_key
+        strong.llm_tier = 'strong'
+        strong.llm_use_pool = not self.llm_strong_api_url
+        strong.llm_cascade = False
+        return strong
     
     def check_llm_config(self):
         """检查 LLM 配置完整性"""
@@ -98,3 +209,8 @@ class Config:
             print("\n❌ 错误：环境变量 LLM_API_KEY 未配置！")
             print("💡 提示：请设置系统环境变量 LLM_API_KEY。")
             sys.exit(1)
+        
+        # 级联模式需要强模型
+        if self.llm_cascade and not (self.llm_strong_model and self.llm_strong_model.strip()):
+            print("\n❌ 错误：已启用级联模式（llm.cascade），但环境变量 LLM_STRONG_MODEL 未配置！")
+            sys.exit(1)
@@ -3,30 +3,64 @@
 """
 
 import asyncio
+import gzip
 import json
 import os
 import random
+import shutil
 import aiohttp
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Iterator, AsyncIterator
 from .config import Config
 from .stats import Stats
-from .llm import translate_batch_task
+from .llm import translate_batch_task, translate_cascade, normalize_source_names
+from .llm_cache import TranslationCache, CACHED_FIELDS
+from .batch_sizer import AdaptiveBatchSizer
 from .image_source import ImageSourceManager
 from .safebooru import SafebooruImageSource
+from .roster import get_roster_registry, roster_record
+from .utils.file import iter_json_array
 
 
 #初始化图片源管理器
 _image_manager = ImageSourceManager()
 _image_manager.register_source(SafebooruImageSource())
 
+
+def get_image_manager() -> ImageSourceManager:
+    """获取图片源管理器单例"""
+    return _image_manager
+
 # 配置图片源规则（示例，可从配置文件加载）
-# 原神标签由 genshin_character_mapper 直接处理，不需要额外的图片源
+# 角色名册中的标签（原神、星铁等）由 pipeline_batch 直接使用官方图标，不需要额外的图片源
+
+
 
+def _open_cache(filepath: str):
+    """按文件头判断是否为 gzip 压缩，返回文本模式的文件对象"""
+    with open(filepath, 'rb') as f:
+        is_gzip = f.read(2) == b'\x1f\x8b'
+    if is_gzip:
+        return gzip.open(filepath, 'rt', encoding='utf-8')
+    return open(filepath, 'r', encoding='utf-8')
+
+
+def _extract_character_tags(data: Iterable[Dict]) -> Dict[str, Dict]:
+    """从 JSON 数组中提取 terms 为 "Character" 的数据，只保留流水线需要的字段"""
+    tags_dict = {}
+    for item in data:
+        if isinstance(item, dict) and item.get('name') and item.get('terms') == 'Character':
+            tags_dict[item['name']] = {
+                'color': item.get('color', 0),
+                'content': item.get('content', '')
+            }
+    return tags_dict
 
 
 def load_tags_from_file(filepath: str) -> Dict[str, Dict]:
     """
-    从本地文件加载角色标签数据
+    从本地文件加载角色标签数据（支持 gzip 压缩的缓存）
+    
+    逐条流式解析，不会把整个文件读入内存
     
     Args:
         filepath: 本地JSON文件路径
@@ -36,23 +70,10 @@ def load_tags_from_file(filepath: str) -> Dict[str, Dict]:
         如果加载失败返回空字典
     """
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # 从 JSON 数组中提取 terms 为 "Character" 的数据
-        if isinstance(data, list):
-            tags_dict = {}
-            for item in data:
-                if item.get('name') and item.get('terms') == 'Character':
-                    tags_dict[item['name']] = {
-                        'color': item.get('color', 0),
-                        'content': item.get('content', '')
-                    }
-            print(f"✅ 从缓存加载 {len(tags_dict)} 个角色标签")
-            return tags_dict
-        else:
-            print(f"⚠️ 警告: 缓存文件格式不正确")
-            return {}
+        with _open_cache(filepath) as f:
+            tags_dict = _extract_character_tags(iter_json_array(f))
+        print(f"✅ 从缓存加载 {len(tags_dict)} 个角色标签")
+        return tags_dict
     except FileNotFoundError:
         return {}
     except Exception as e:
@@ -60,10 +81,112 @@ def load_tags_from_file(filepath: str) -> Dict[str, Dict]:
         return {}
 
 
+def _load_fetch_meta(cache_file: str) -> Dict:
+    """读取缓存旁的校验信息（ETag / Last-Modified / 未完成下载的校验信息）"""
+    try:
+        with open(cache_file + '.meta.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_fetch_meta(cache_file: str, meta: Dict):
+    """保存缓存旁的校验信息"""
+    try:
+        with open(cache_file + '.meta.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"⚠️ 警告: 校验信息保存失败 - {e}")
+
+
+def _print_tag_diff(old_tags: Dict[str, Dict], new_tags: Dict[str, Dict], show: int = 10):
+    """打印上游数据新增/移除的角色标签"""
+    added = [tag for tag in new_tags if tag not in old_tags]
+    removed = [tag for tag in old_tags if tag not in new_tags]
+    
+    print(f"🔀 上游数据变化: 新增 {len(added)} 个，移除 {len(removed)} 个角色标签")
+    for label, tags in (('+', added), ('-', removed)):
+        for tag in tags[:show]:
+            print(f"   {label} {tag}")
+        if len(tags) > show:
+            print(f"   {label} ... 以及另外 {len(tags) - show} 个")
+
+
+async def _download_source(session: aiohttp.ClientSession, url: str, cache_file: str, meta: Dict) -> Optional[bool]:
+    """
+    条件下载上游文件到 cache_file.part，支持断点续传
+    
+    Returns:
+        True: 下载完成；False: 上游未变化（304）；None: 下载失败
+    """
+    part_file = cache_file + '.part'
+    headers = {}
+    
+    # 条件请求：本地缓存完整时才携带校验信息
+    if os.path.exists(cache_file):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    
+    # 断点续传：上次未完成的下载，校验信息不一致时服务器会返回完整的 200
+    part_size = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+    part_validator = meta.get('partial_etag') or meta.get('partial_last_modified')
+    if part_size and part_validator:
+        headers['Range'] = f'bytes={part_size}-'
+        headers['If-Range'] = part_validator
+        headers['Accept-Encoding'] = 'identity'
+    
+    async with session.get(url, headers=headers) as response:
+        if response.status == 304:
+            return False
+        
+        if response.status == 416:
+            # 续传范围无效，丢弃残留文件下次重新下载
+            os.remove(part_file)
+            meta.pop('partial_etag', None)
+            meta.pop('partial_last_modified', None)
+            _save_fetch_meta(cache_file, meta)
+            print(f"❌ 错误: 续传范围无效，已清理未完成的下载")
+            return None
+        
+        if response.status not in (200, 206):
+            print(f"❌ 错误: 无法获取数据，状态码: {response.status}")
+            return None
+        
+        if response.status == 206:
+            mode = 'ab'
+            print(f"⏩ 从 {part_size} 字节处续传")
+        else:
+            mode = 'wb'
+            # 先记录新文件的校验信息，中断后可以续传
+            meta['partial_etag'] = response.headers.get('ETag')
+            meta['partial_last_modified'] = response.headers.get('Last-Modified')
+            _save_fetch_meta(cache_file, meta)
+        
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        try:
+            with open(part_file, mode) as f:
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    f.write(chunk)
+        except Exception:
+            size = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+            print(f"⚠️ 下载中断，已保存 {size} 字节，下次运行将从断点续传")
+            raise
+    
+    return True
+
+
 async def fetch_tags_from_url(url: str, cache_file: Optional[str] = None) -> Dict[str, Dict]:
     """
     从指定 URL 获取角色标签数据，并可选地保存到缓存文件
     
+    提供缓存文件时：
+    - 携带 ETag / Last-Modified 发起条件请求，上游未变化时只需一次 304
+    - 下载写入 cache_file.part，中断后下次运行用 Range 续传
+    - 缓存以 gzip 压缩保存（cache_file 以 .gz 结尾时）
+    - 上游有变化时打印新增/移除的角色标签
+    
     Args:
         url: JSON 数据的 URL 地址
         cache_file: 可选的缓存文件路径，如果提供则保存原始数据到该文件
@@ -74,52 +197,84 @@ async def fetch_tags_from_url(url: str, cache_file: Optional[str] = None) -> Dic
         如果获取失败返回空字典
     """
     print(f"📥 正在从 URL 获取数据: {url}")
-    timeout = aiohttp.ClientTimeout(total=30)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30)
+    
+    if not cache_file:
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        print(f"❌ 错误: 无法获取数据，状态码: {response.status}")
+                        return {}
+                    
+                    # GitHub raw 文件返回 text/plain，需要忽略 Content-Type 检查
+                    data = await response.json(content_type=None)
+            
+            if isinstance(data, list):
+                tags_dict = _extract_character_tags(data)
+                print(f"✅ 成功获取 {len(tags_dict)} 个角色标签")
+                return tags_dict
+            print(f"❌ 错误: 未知的数据格式")
+            return {}
+        except Exception as e:
+            print(f"❌ 错误: 获取数据失败 - {e}")
+            return {}
+    
+    meta = _load_fetch_meta(cache_file)
     
     try:
         async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    print(f"❌ 错误: 无法获取数据，状态码: {response.status}")
-                    return {}
-                
-                # GitHub raw 文件返回 text/plain，需要忽略 Content-Type 检查
-                data = await response.json(content_type=None)
-                
-                # 如果提供了缓存文件路径，保存原始数据
-                if cache_file:
-                    try:
-                        # 确保目录存在
-                        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-                        with open(cache_file, 'w', encoding='utf-8') as f:
-                            json.dump(data, f, ensure_ascii=False, indent=2)
-                        print(f"💾 原始数据已缓存至: {cache_file}")
-                    except Exception as e:
-                        print(f"⚠️ 警告: 缓存文件保存失败 - {e}")
-                
-                # 从 JSON 数组中提取 terms 为 "Character" 的数据
-                if isinstance(data, list):
-                    # 构建字典: {name: {color, content}}
-                    tags_dict = {}
-                    for item in data:
-                        if item.get('name') and item.get('terms') == 'Character':
-                            tags_dict[item['name']] = {
-                                'color': item.get('color', 0),
-                                'content': item.get('content', '')
-                            }
-                    print(f"✅ 成功获取 {len(tags_dict)} 个角色标签")
-                    return tags_dict
-                elif isinstance(data, dict):
-                    # 如果是字典格式，返回空（不支持）
-                    print(f"⚠️ 警告: 数据为字典格式，请检查 URL")
-                    return {}
-                else:
-                    print(f"❌ 错误: 未知的数据格式")
-                    return {}
-                
+            downloaded = await _download_source(session, url, cache_file, meta)
     except Exception as e:
         print(f"❌ 错误: 获取数据失败 - {e}")
+        downloaded = None
+    
+    if downloaded is False:
+        print(f"✅ 上游数据未变化（304），使用本地缓存")
+        return load_tags_from_file(cache_file)
+    
+    if downloaded is None:
+        if os.path.exists(cache_file):
+            print(f"⚠️ 警告: 使用旧的本地缓存")
+            return load_tags_from_file(cache_file)
+        return {}
+    
+    # 校验新数据，确认可用后再替换旧缓存
+    part_file = cache_file + '.part'
+    new_tags = load_tags_from_file(part_file)
+    if not new_tags:
+        os.remove(part_file)
+        meta.pop('partial_etag', None)
+        meta.pop('partial_last_modified', None)
+        _save_fetch_meta(cache_file, meta)
+        print(f"❌ 错误: 下载的数据无效")
         return {}
+    
+    old_tags = load_tags_from_file(cache_file) if os.path.exists(cache_file) else {}
+    
+    try:
+        if cache_file.endswith('.gz'):
+            tmp_file = cache_file + '.tmp'
+            with open(part_file, 'rb') as src, gzip.open(tmp_file, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_file, cache_file)
+            os.remove(part_file)
+        else:
+            os.replace(part_file, cache_file)
+        
+        meta = {
+            'etag': meta.pop('partial_etag', None),
+            'last_modified': meta.pop('partial_last_modified', None),
+        }
+        _save_fetch_meta(cache_file, meta)
+        print(f"💾 原始数据已缓存至: {cache_file}")
+    except Exception as e:
+        print(f"⚠️ 警告: 缓存文件保存失败 - {e}")
+    
+    if old_tags:
+        _print_tag_diff(old_tags, new_tags)
+    print(f"✅ 成功获取 {len(new_tags)} 个角色标签")
+    return new_tags
 
 
 def apply_debug_filter(tags_dict: Dict[str, Dict], limit: int, random_sample: bool) -> Dict[str, Dict]:
@@ -161,13 +316,17 @@ async def pipeline_batch(
     sem_llm: asyncio.Semaphore,
     sem_img: asyncio.Semaphore,
     stats: Stats,
-    source_name_mapping: Optional[Dict]
+    source_name_mapping: Optional[Dict],
+    translation_cache: Optional[TranslationCache] = None,
+    batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    prefilter_task: Optional[asyncio.Task] = None
 ) -> List[Dict]:
     """
     单个批次的完整流水线：
-    1. 检查原神标签 -> 直接使用本地数据
-    2. 等待 LLM 信号量 -> 请求 LLM
-    3. 获取到 JSON -> 请求 Images (内部有 Image 信号量)
+    1. 查角色名册 -> 命中的标签直接使用官方译名和图标（不请求网络）
+    2. 同时发起 LLM 翻译和图片搜索（搜图只依赖 tag，不必等待翻译结果；
+       已由翻译缓存填充的条目跳过 LLM）
+    3. 按 tag 合并翻译结果和图片 URL
     4. 返回结果
     
     Args:
@@ -178,93 +337,318 @@ async def pipeline_batch(
         sem_img: 图片并发信号量
         stats: 统计对象
         source_name_mapping: 作品名称映射表
+        translation_cache: 可选的翻译缓存，LLM 成功的结果会写入缓存
+        batch_sizer: 可选的自适应批大小
+        prefilter_task: 可选的预筛选任务（由 stream_pipeline 为多个批次共同发起），搜图前等待其完成
     
     Returns:
         处理完成的数据列表
     """
-    # 导入工具函数和数据加载器
-    from .utils import is_genshin_tag
-    from .genshin_impact import get_data_loader as get_genshin_loader
-    from .honkai_starrail import get_data_loader as get_starrail_loader, is_honkai_starrail_tag
+    # 角色名册（原神、星铁、绝区零、鸣潮等官方角色数据）命中的标签直接使用官方译名和图标
+    registry = get_roster_registry()
     
-    # 获取数据加载器
-    genshin_loader = get_genshin_loader()
-    starrail_loader = get_starrail_loader()
-    
-    # 分离原神/星铁标签和普通标签
-    special_items = []  # 原神+星铁
+    special_items = []  # 名册命中且有图标
     normal_items = []
     
     for item in batch_data:
-        tag = item.get('tag', '')
-        
-        # 检查原神标签
-        if is_genshin_tag(tag):
-            char_data = genshin_loader.get_character_data(tag)
-            if char_data:
-                item['tag_cn'] = char_data['name_cn']
-                item['tag_en'] = char_data['name_en']
-                item['image_url'] = char_data['icon_url']
-                item['source_game'] = 'genshin_impact'
-                item['character_id'] = char_data['entry_page_id']
-                
-                special_items.append(item)
-                stats.llm_success_count += 1
-                stats.img_success_count += 1
-                print(f"✨ 原神角色: {tag} -> {char_data['name_cn']} ({char_data['name_en']})")
-            else:
-                normal_items.append(item)
-                print(f"⚠️ 原神标签未找到映射: {tag}")
+        char_data = registry.lookup(item.get('tag', ''))
+        if not char_data:
+            normal_items.append(item)
+            continue
         
-        # 检查星铁标签
-        elif is_honkai_starrail_tag(tag):
-            char_data = starrail_loader.get_character_data(tag)
-            if char_data:
-                item['tag_cn'] = char_data['name_cn']
-                item['tag_en'] = char_data['name_en']
-                item['image_url'] = char_data['icon_url']
-                item['source_game'] = 'honkai_starrail'
-                item['character_id'] = char_data['entry_page_id']
-                
-                special_items.append(item)
-                stats.llm_success_count += 1
-                stats.img_success_count += 1
-                print(f"✨ 星铁角色: {tag} -> {char_data['name_cn']} ({char_data['name_en']})")
-            else:
-                normal_items.append(item)
-                print(f"⚠️ 星铁标签未找到映射: {tag}")
+        stats.roster_hits += 1
+        if 'cn_name' not in item:
+            stats.llm_success += 1
+            stats.roster_llm_avoided += 1
+        item.update(roster_record(char_data))
+        item['source_en'], item['source_cn'] = normalize_source_names(
+            item['source_en'], item['source_cn'], source_name_mapping
+        )
         
-        # 普通标签
+        if item['image_url']:
+            special_items.append(item)
+            stats.img_success += 1
+            stats.roster_img_avoided += 1
         else:
+            # 名册没有图标：已有译名跳过 LLM，仍然搜图
             normal_items.append(item)
     
-    # 1. LLM 阶段 - 只处理普通标签
-    translated_items = []
-    if normal_items:
-        translated_items = await translate_batch_task(
-            session, normal_items, config, sem_llm, stats, source_name_mapping
+    if not normal_items:
+        return special_items
+    
+    # 预筛选：批量查询图片数量，无图的标签不再搜图，图片较少的标签不加 solo
+    # （流水线中由 stream_pipeline 跨批次统一发起，单独调用时只查本批次）
+    own_prefilter = None
+    if prefilter_task is None and config.img_prefilter_enabled:
+        prefilter_task = own_prefilter = asyncio.create_task(_image_manager.prefilter(
+            session, normal_items, sem_img,
+            config.img_retry_times, config.img_retry_delay, stats
+        ))
+    
+    # 使用图片源管理器搜图（支持多源和降级）
+    async def _search_image(item):
+        if prefilter_task:
+            # 共享的预筛选任务不随本批次的搜图任务取消
+            await asyncio.shield(prefilter_task)
+        return await _image_manager.search_image(
+            session, item['tag'], item, sem_img,
+            config.img_retry_times, config.img_retry_delay, stats
         )
     
-    # 2. 搜图阶段 - 使用图片源管理器（只处理普通标签，原神/星铁标签已有图）
-    async def _process_image(item):
+    # 1. 搜图阶段先行启动 - 只依赖 tag，与 LLM 请求重叠执行（只处理普通标签，名册命中的标签已有图）
+    image_tasks = {
+        item['tag']: asyncio.create_task(_search_image(item))
+        for item in normal_items
+    }
+    
+    # 按 tag 合并图片结果
+    async def _join_image(item):
         # 如果已经有图，直接返回
         if item.get('image_url') and str(item['image_url']).startswith('http'):
             return item
         
-        # 使用图片源管理器搜图（支持多源和降级）
-        img_url = await _image_manager.search_with_fallback(
-            session, item['tag'], item, sem_img, 
-            config.img_retry_times, config.img_retry_delay, stats
-        )
-        item['image_url'] = img_url
-        
+        # LLM 返回了批次外的 tag 时没有预先启动的搜图任务，单独补搜
+        task = image_tasks.pop(item.get('tag'), None)
+        result = await task if task else await _search_image(item)
+        # 图片源提供的缩略图/样图 URL 和宽高一并写入记录
+        item.update(result or {'image_url': None})
         return item
     
-    # 并发处理所有图片（只处理普通标签）
-    tasks = [_process_image(item) for item in translated_items]
-    final_normal_items = await asyncio.gather(*tasks) if tasks else []
+    # 流式模式下每个条目通过校验就开始合并图片结果，不等整批翻译完成
+    join_tasks = {}
     
-    # 3. 合并特殊标签（原神+星铁）和普通标签结果
-    final_items = special_items + final_normal_items
+    def _on_item(item):
+        join_tasks[item['tag']] = asyncio.create_task(_join_image(item))
+    
+    try:
+        # 2. LLM 阶段 - 只处理普通标签，翻译缓存命中的条目（已有 cn_name）直接使用
+        cached_items = [item for item in normal_items if 'cn_name' in item]
+        items_to_translate = [item for item in normal_items if 'cn_name' not in item]
+        
+        translated_items = cached_items
+        if items_to_translate:
+            # 级联模式：弱模型先翻译，不确定的条目再交给强模型
+            translate = translate_cascade if config.llm_cascade else translate_batch_task
+            translated_items = cached_items + await translate(
+                session, items_to_translate, config, sem_llm, stats, source_name_mapping,
+                translation_cache, batch_sizer, _on_item
+            )
+        
+        # 3. 等待所有条目的图片结果（未提前开始的条目此时开始合并）
+        final_normal_items = await asyncio.gather(*[
+            join_tasks.pop(item['tag'], None) or _join_image(item)
+            for item in translated_items
+        ])
+    finally:
+        # LLM 未返回的 tag 对应的搜图任务不再需要
+        for task in (*image_tasks.values(), *join_tasks.values()):
+            task.cancel()
+        if own_prefilter:
+            own_prefilter.cancel()
+    
+    # 4. 合并名册命中的标签和普通标签结果
+    final_items = special_items + list(final_normal_items)
     
     return final_items
+
+
+def iter_batches(items: Iterable[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    """
+    按批次大小惰性切分待处理数据
+    
+    Args:
+        items: 待处理数据（可以是生成器）
+        batch_size: 批处理大小
+    
+    Yields:
+        每个批次的数据列表
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_batches_with_cache(
+    items: Iterable[Dict],
+    batch_size: int,
+    translation_cache: Optional[TranslationCache],
+    stats: Stats,
+    source_name_mapping: Optional[Dict],
+    batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    lookup_size: int = 500
+) -> Iterator[List[Dict]]:
+    """
+    先查翻译缓存再分批：命中的条目直接填充翻译字段，与未命中的条目分开成批，
+    发给 LLM 的批次只包含真正未命中的标签
+    
+    Args:
+        items: 待处理数据（可以是生成器）
+        batch_size: 批处理大小（缓存命中的批次始终使用该值）
+        translation_cache: 翻译缓存，为 None 时所有条目都视为未命中
+        stats: 统计对象
+        source_name_mapping: 作品名称映射表（缓存结果按当前映射表重新规范化）
+        batch_sizer: 可选的自适应批大小，未命中批次开始时读取当前大小
+        lookup_size: 每次批量查询缓存的条目数
+    
+    Yields:
+        每个批次的数据列表
+    """
+    hits: List[Dict] = []
+    misses: List[Dict] = []
+    
+    def _miss_batch_size() -> int:
+        return batch_sizer.size if batch_sizer else batch_size
+    
+    miss_limit = _miss_batch_size()
+    
+    for chunk in iter_batches(items, lookup_size):
+        cached = translation_cache.get_many(item['tag'] for item in chunk) if translation_cache else {}
+        for item in chunk:
+            record = cached.get(item['tag'])
+            if record:
+                for field in CACHED_FIELDS:
+                    item[field] = record.get(field, '')
+                item['source_en'], item['source_cn'] = normalize_source_names(
+                    item['source_en'], item['source_cn'], source_name_mapping
+                )
+                stats.llm_cache_hit += 1
+                hits.append(item)
+            else:
+                misses.append(item)
+            
+            if len(hits) >= batch_size:
+                yield hits
+                hits = []
+            if len(misses) >= miss_limit:
+                yield misses
+                misses = []
+                miss_limit = _miss_batch_size()
+    
+    if hits:
+        yield hits
+    if misses:
+        yield misses
+
+
+async def stream_pipeline(
+    session: aiohttp.ClientSession,
+    batches: Iterable[List[Dict]],
+    config: Config,
+    sem_llm: asyncio.Semaphore,
+    sem_img: asyncio.Semaphore,
+    stats: Stats,
+    source_name_mapping: Optional[Dict],
+    workers: int,
+    queue_size: int,
+    translation_cache: Optional[TranslationCache] = None,
+    batch_sizer: Optional[AdaptiveBatchSizer] = None
+) -> AsyncIterator[List[Dict]]:
+    """
+    生产者/消费者流水线：固定数量的工作协程从有界队列中取批次处理，
+    结果按完成顺序逐批产出
+    
+    队列满时生产者等待，结果未被消费时工作协程等待，
+    因此内存中同时存在的批次数量与输入总量无关。
+    启用预筛选时生产者先缓冲批次，凑满 config.img_prefilter_batch 个需要搜图的标签后
+    发起一次批量预筛选，再把这些批次连同预筛选任务放入队列
+    
+    Args:
+        session: aiohttp 会话
+        batches: 批次生成器
+        config: 配置对象
+        sem_llm: LLM 并发信号量
+        sem_img: 图片并发信号量
+        stats: 统计对象
+        source_name_mapping: 作品名称映射表
+        workers: 工作协程数量
+        queue_size: 队列容量
+        translation_cache: 可选的翻译缓存
+        batch_sizer: 可选的自适应批大小
+    
+    Yields:
+        每个批次处理完成的数据列表
+    """
+    workers = max(1, workers)
+    in_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+    out_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+    done = object()
+    registry = get_roster_registry()
+    prefilter_tasks = set()
+    
+    def _needs_search(item: Dict) -> bool:
+        """条目是否需要搜图（名册中有图标的标签不搜图）"""
+        char_data = registry.lookup(item.get('tag', ''))
+        return not (char_data and char_data.get('icon_url'))
+    
+    async def _dispatch(buffered: List[List[Dict]]):
+        """为缓冲的批次发起一次预筛选，再把批次放入队列"""
+        items = [item for batch in buffered for item in batch if _needs_search(item)]
+        task = None
+        if items:
+            task = asyncio.create_task(_image_manager.prefilter(
+                session, items, sem_img, config.img_retry_times, config.img_retry_delay, stats
+            ))
+            prefilter_tasks.add(task)
+            task.add_done_callback(prefilter_tasks.discard)
+        for batch in buffered:
+            await in_queue.put((batch, task))
+    
+    async def _producer():
+        buffered = []
+        buffered_tags = 0
+        for batch in batches:
+            if not config.img_prefilter_enabled:
+                await in_queue.put((batch, None))
+                continue
+            buffered.append(batch)
+            buffered_tags += sum(1 for item in batch if _needs_search(item))
+            if buffered_tags >= config.img_prefilter_batch:
+                await _dispatch(buffered)
+                buffered = []
+                buffered_tags = 0
+        if buffered:
+            await _dispatch(buffered)
+        for _ in range(workers):
+            await in_queue.put(done)
+    
+    async def _worker():
+        while True:
+            entry = await in_queue.get()
+            if entry is done:
+                await out_queue.put(done)
+                return
+            batch, prefilter_task = entry
+            try:
+                result = await pipeline_batch(
+                    session, batch, config, sem_llm, sem_img, stats, source_name_mapping,
+                    translation_cache, batch_sizer, prefilter_task
+                )
+            except Exception as e:
+                # 交给消费端抛出，避免工作协程静默退出导致流水线卡死
+                await out_queue.put(e)
+                return
+            await out_queue.put(result)
+    
+    tasks = [asyncio.create_task(_producer())]
+    tasks += [asyncio.create_task(_worker()) for _ in range(workers)]
+    
+    try:
+        finished_workers = 0
+        while finished_workers < workers:
+            result = await out_queue.get()
+            if result is done:
+                finished_workers += 1
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                yield result
+    finally:
+        tasks += prefilter_tasks
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,43 +1,20 @@
 """
 原神角色数据加载器
-负责加载和管理角色数据
+基于统一的角色名册（roster.RosterRegistry）按标签查询原神角色数据
 """
 
-import json
-import os
 from typing import Optional, Dict
-from ..utils import extract_character_name_from_tag, normalize_name, is_genshin_tag
+from ..roster import get_roster_registry
+from ..utils import is_genshin_tag
 
 
 class GenshinCharacterDataLoader:
-    """原神角色数据加载器"""
+    """原神角色数据加载器（角色名册中 source 为 genshin_impact 的部分）"""
     
-    def __init__(self):
-        self.name_to_data = {}
-        self._load_data()
+    SOURCE = 'genshin_impact'
     
-    def _load_data(self):
-        """加载原神角色数据"""
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.normpath(os.path.join(current_dir, '..', '..', '..', '..'))
-        data_file = os.path.join(project_root, 'output', 'genshin_characters-en-cn.json')
-        
-        try:
-            with open(data_file, 'r', encoding='utf-8') as f:
-                characters = json.load(f)
-            
-            for char in characters:
-                name_en = char.get('name_en', '').strip()
-                if name_en:
-                    normalized_name = normalize_name(name_en)
-                    self.name_to_data[normalized_name] = char
-            
-            print(f"✅ 已加载 {len(self.name_to_data)} 个原神角色数据")
-        
-        except FileNotFoundError:
-            print(f"⚠️ 未找到原神角色数据文件: {data_file}")
-        except Exception as e:
-            print(f"⚠️ 加载原神角色数据失败: {e}")
+    def __init__(self):
+        self.registry = get_roster_registry()
     
     def get_character_data(self, tag: str) -> Optional[Dict]:
         """
@@ -52,14 +29,9 @@ class GenshinCharacterDataLoader:
         if not is_genshin_tag(tag):
             return None
         
-        char_name = extract_character_name_from_tag(tag)
-        if not char_name:
-            return None
-        
-        normalized_name = normalize_name(char_name)
-        char_data = self.name_to_data.get(normalized_name)
+        char_data = self.registry.lookup(tag)
         
-        if char_data:
+        if char_data and char_data.get('source') == self.SOURCE:
             return {
                 'entry_page_id': char_data.get('entry_page_id'),
                 'name_cn': char_data.get('name_cn'),
@@ -14,6 +14,9 @@ from .data_loader import GenshinCharacterDataLoader
 class GenshinImageSource(ImageSource):
     """原神图像源 - 从本地数据获取角色官方图标"""
     
+    # 本地数据，无需写入搜索结果存储
+    cacheable = False
+    
     def __init__(self):
         self.data_loader = GenshinCharacterDataLoader()
     
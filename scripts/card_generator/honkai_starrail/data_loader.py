@@ -1,48 +1,24 @@
 """
 星铁角色数据加载器
-负责加载和管理角色数据
+基于统一的角色名册（roster.RosterRegistry）按标签查询星铁角色数据
 """
 
-import json
-import os
 from typing import Optional, Dict
-from ..utils import extract_character_name_from_tag, normalize_name
+from ..roster import get_roster_registry
 
 
 def is_honkai_starrail_tag(tag: str) -> bool:
     """判断是否为星铁标签"""
-    return '_(honkai_impact)' in tag.lower()
+    return '_(honkai:_star_rail)' in tag.lower()
 
 
 class HonkaiStarRailDataLoader:
-    """星铁角色数据加载器"""
+    """星铁角色数据加载器（角色名册中 source 为 honkai_starrail 的部分）"""
     
-    def __init__(self):
-        self.name_to_data = {}
-        self._load_data()
+    SOURCE = 'honkai_starrail'
     
-    def _load_data(self):
-        """加载星铁角色数据"""
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.normpath(os.path.join(current_dir, '..', '..', '..', '..'))
-        data_file = os.path.join(project_root, 'output', 'honkai_starrail_characters-en-cn.json')
-        
-        try:
-            with open(data_file, 'r', encoding='utf-8') as f:
-                characters = json.load(f)
-            
-            for char in characters:
-                name_en = char.get('name_en', '').strip()
-                if name_en:
-                    normalized_name = normalize_name(name_en)
-                    self.name_to_data[normalized_name] = char
-            
-            print(f"✅ 已加载 {len(self.name_to_data)} 个星铁角色数据")
-        
-        except FileNotFoundError:
-            print(f"⚠️ 未找到星铁角色数据文件: {data_file}")
-        except Exception as e:
-            print(f"⚠️ 加载星铁角色数据失败: {e}")
+    def __init__(self):
+        self.registry = get_roster_registry()
     
     def get_character_data(self, tag: str) -> Optional[Dict]:
         """
@@ -57,14 +33,9 @@ class HonkaiStarRailDataLoader:
         if not is_honkai_starrail_tag(tag):
             return None
         
-        char_name = extract_character_name_from_tag(tag, 'honkai_impact')
-        if not char_name:
-            return None
-        
-        normalized_name = normalize_name(char_name)
-        char_data = self.name_to_data.get(normalized_name)
+        char_data = self.registry.lookup(tag)
         
-        if char_data:
+        if char_data and char_data.get('source') == self.SOURCE:
             return {
                 'entry_page_id': char_data.get('entry_page_id'),
                 'name_cn': char_data.get('name_cn'),
@@ -3,10 +3,15 @@
 提供图像源基类和管理器
 """
 
-from .base import ImageSource
+from .base import ImageSource, ImageSourceError, CircuitOpenError, IMAGE_META_FIELDS
 from .manager import ImageSourceManager
+from .store import ImageResultStore
 
 __all__ = [
     'ImageSource',
+    'ImageSourceError',
+    'CircuitOpenError',
+    'IMAGE_META_FIELDS',
     'ImageSourceManager',
+    'ImageResultStore',
 ]
@@ -6,16 +6,42 @@
 import asyncio
 import aiohttp
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from ..stats import Stats
 
 
+# 图片源可以随图片 URL 一起提供的字段（写入输出记录，前端用于加载缩略图并预留布局）
+IMAGE_META_FIELDS = ('image_preview_url', 'image_sample_url', 'image_width', 'image_height')
+
+
+class ImageSourceError(Exception):
+    """
+    图片源请求失败（网络错误、限流等）
+    与"确认没有图片"（search 返回 None）区分，失败的结果不会写入负缓存
+    """
+    pass
+
+
+class CircuitOpenError(ImageSourceError):
+    """
+    图片源已熔断，请求未发出
+    图片源实现遇到该异常时应直接抛出，不再重试
+    """
+    pass
+
+
 class ImageSource(ABC):
     """
     图片源抽象基类
     所有图片源实现都需要继承此类并实现 search 方法
     """
     
+    # 搜索结果是否写入持久化存储（本地数据源无需缓存）
+    cacheable: bool = True
+    
+    # 是否支持批量查询标签的图片数量（预筛选阶段使用）
+    supports_post_counts: bool = False
+    
     @abstractmethod
     async def search(
         self,
@@ -40,10 +66,52 @@ class ImageSource(ABC):
             stats: 统计对象
         
         Returns:
-            图片 URL，如果失败返回 None
+            图片 URL，确认没有图片时返回 None
+        
+        Raises:
+            ImageSourceError: 请求失败，无法确认是否有图片
         """
         pass
     
+    async def fetch_post_counts(
+        self,
+        session: aiohttp.ClientSession,
+        tags: List[str],
+        sem_img: asyncio.Semaphore,
+        retry_times: int,
+        retry_delay: int
+    ) -> Dict[str, int]:
+        """
+        批量查询标签的图片数量（supports_post_counts 为 True 的图片源实现）
+        
+        查到的数量由图片源自己保存，search 时据此跳过请求或调整查询方式
+        
+        Returns:
+            {tag: 图片数量}
+        
+        Raises:
+            ImageSourceError: 请求失败
+        """
+        return {}
+    
+    def pop_alternates(self, tag: str) -> List[str]:
+        """
+        取出最近一次搜索该标签时保存的备选图片（按优先级排序）
+        
+        Returns:
+            备选图片 URL 列表，不支持备选的图片源返回空列表
+        """
+        return []
+    
+    def pop_image_meta(self, tag: str) -> Dict:
+        """
+        取出最近一次搜索该标签选中图片的附加信息
+        
+        Returns:
+            IMAGE_META_FIELDS 中的字段（缩略图/样图 URL、原图宽高），不支持的图片源返回空字典
+        """
+        return {}
+    
     @abstractmethod
     def get_name(self) -> str:
         """返回图片源名称"""
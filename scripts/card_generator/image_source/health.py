@@ -0,0 +1,161 @@
+"""
+图片源健康状态
+按图片源统计最近请求的错误率和延迟，并实现熔断器：
+连续失败达到阈值后熔断（跳过该图片源），冷却时间过后放行一个探测请求，成功则恢复
+"""
+
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+from .base import CircuitOpenError
+
+
+class SourceHealth:
+    """单个图片源的健康状态和熔断器"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 30, window: int = 100):
+        """
+        Args:
+            name: 图片源名称
+            failure_threshold: 连续失败多少次后熔断，0 表示不熔断
+            cooldown: 熔断后多少秒放行探测请求
+            window: 统计错误率和延迟的最近请求数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        # 最近请求的结果（True 为成功）和成功请求的延迟
+        self.outcomes: Deque[bool] = deque(maxlen=max(1, window))
+        self.latencies: Deque[float] = deque(maxlen=max(1, window))
+
+        self.consecutive_failures = 0
+        self.open_until: Optional[float] = None
+        self.probing = False
+
+        self.requests = 0
+        self.failures = 0
+        self.opens = 0
+        self.skipped = 0
+
+    @property
+    def state(self) -> str:
+        """熔断器状态：closed（正常）、open（熔断中）、half_open（等待或正在探测）"""
+        if self.open_until is None:
+            return 'closed'
+        if self.probing or time.monotonic() >= self.open_until:
+            return 'half_open'
+        return 'open'
+
+    def is_open(self) -> bool:
+        """是否处于熔断中（不占用探测名额）"""
+        return self.state == 'open' or (self.state == 'half_open' and self.probing)
+
+    def allow(self) -> bool:
+        """
+        请求前调用：是否允许请求该图片源
+
+        熔断中返回 False；冷却结束后只放行一个探测请求，探测结果出来前其余请求仍然跳过
+        """
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open' and not self.probing:
+            self.probing = True
+            return True
+        self.skipped += 1
+        return False
+
+    def record_success(self, latency: float):
+        """记录一次成功请求（包括确认没有图片），探测成功时恢复"""
+        self.requests += 1
+        self.outcomes.append(True)
+        self.latencies.append(latency)
+        self.consecutive_failures = 0
+        if self.open_until is not None:
+            print(f"\n✅ 图片源 {self.name} 探测成功，恢复使用")
+        self.open_until = None
+        self.probing = False
+
+    def record_failure(self):
+        """记录一次失败请求，连续失败达到阈值或探测失败时熔断"""
+        self.requests += 1
+        self.failures += 1
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        if self.probing:
+            self.open_until = time.monotonic() + self.cooldown
+            self.probing = False
+            self.opens += 1
+            print(f"\n🔌 图片源 {self.name} 探测失败，继续熔断 {self.cooldown} 秒")
+        elif (
+            self.open_until is None and self.failure_threshold > 0
+            and self.consecutive_failures >= self.failure_threshold
+        ):
+            # 熔断后陆续失败的在途请求不重复熔断
+            self.open_until = time.monotonic() + self.cooldown
+            self.opens += 1
+            print(f"\n🔌 图片源 {self.name} 连续失败 {self.consecutive_failures} 次，熔断 {self.cooldown} 秒")
+
+    def release(self):
+        """请求被取消时调用：释放探测名额（不计入结果）"""
+        self.probing = False
+
+    @property
+    def error_rate(self) -> float:
+        """最近请求的错误率"""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """最近成功请求延迟的分位数，没有样本时返回 None"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def summary(self) -> Dict:
+        """返回健康状态摘要"""
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        return {
+            'state': self.state,
+            'requests': self.requests,
+            'failures': self.failures,
+            'error_rate': round(self.error_rate, 3),
+            'p50': round(p50, 2) if p50 is not None else None,
+            'p95': round(p95, 2) if p95 is not None else None,
+            'opens': self.opens,
+            'skipped': self.skipped,
+        }
+
+
+class BreakerGate:
+    """
+    带熔断检查的并发限制器包装
+
+    排队等待并发名额的请求在拿到名额后再检查一次熔断状态：
+    等待期间图片源已熔断时释放名额并抛出 CircuitOpenError，不再发出请求
+    """
+
+    def __init__(self, sem, health: SourceHealth, probe: bool = False):
+        """
+        Args:
+            sem: 图片源的并发限制器（asyncio.Semaphore 或 AIMDLimiter）
+            health: 图片源健康状态
+            probe: 是否为冷却结束后的探测请求（探测请求不检查）
+        """
+        self.sem = sem
+        self.health = health
+        self.probe = probe
+
+    async def __aenter__(self):
+        slot = await self.sem.__aenter__()
+        if not self.probe and self.health.is_open():
+            await self.sem.__aexit__(None, None, None)
+            raise CircuitOpenError(f"图片源 {self.health.name} 已熔断")
+        return slot
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return await self.sem.__aexit__(exc_type, exc, tb)
@@ -6,8 +6,12 @@
 import asyncio
 import aiohttp
 import re
-from typing import Dict, List, Optional, Callable
-from .base import ImageSource
+import time
+from typing import Dict, List, Optional, Callable, Pattern, Tuple
+from .base import ImageSource, CircuitOpenError
+from .store import ImageResultStore
+from .health import SourceHealth, BreakerGate
+from ..concurrency import LimiterRegistry
 from ..stats import Stats
 
 
@@ -25,12 +29,86 @@ class ImageSourceManager:
         # 匹配函数接收 (tag, item_data)，返回 bool
         self.rules: List[tuple[Callable[[str, Dict], bool], str]] = []
         
+        # 按类型索引的规则（值为 self.rules 中的序号），select_sources 不逐条调用匹配函数：
+        # 正则规则合并为交替表达式，作品来源规则按 source_en 查字典
+        self._pattern_rules: List[Tuple[int, Pattern]] = []
+        self._source_rules: Dict[str, List[int]] = {}
+        self._custom_rules: List[int] = []
+        self._combined_pattern: Optional[Pattern] = None
+        self._combined_built = False
+        # 正则规则都不向前查看（没有后行断言和单词边界）时，从作品后缀开始的匹配只取决于后缀本身
+        self._suffix_cacheable = False
+        
+        # 图片源名称 -> 图片源（同名时取先注册的），以及按 (作品后缀, source_en, 匹配的自定义规则) 缓存的选择结果
+        self._sources_by_name: Dict[str, ImageSource] = {}
+        self._selection_cache: Dict[Tuple, List[ImageSource]] = {}
+        
         # 默认图片源名称
         self.default_source_name: str = "Safebooru"
+        
+        # 搜索结果存储（可选），命中/未命中记录在有效期内不再请求网络
+        self.result_store: Optional[ImageResultStore] = None
+        
+        # 按图片源独立的自适应并发限制器（可选），未设置时所有图片源共用 sem_img
+        self.limiters: Optional[LimiterRegistry] = None
+        
+        # 按图片源的健康状态和熔断器（熔断中的图片源直接跳过）
+        self.health: Dict[str, SourceHealth] = {}
+        self.breaker_config: Dict = {'failure_threshold': 0, 'cooldown': 30, 'window': 100}
     
     def register_source(self, source: ImageSource):
         """注册一个图片源"""
         self.sources.append(source)
+        self._sources_changed()
+    
+    def replace_source(self, source: ImageSource):
+        """用同名的图片源替换已注册的图片源（保持原有优先级），不存在时注册"""
+        for index, registered in enumerate(self.sources):
+            if registered.get_name() == source.get_name():
+                self.sources[index] = source
+                self._sources_changed()
+                return
+        self.register_source(source)
+    
+    def _sources_changed(self):
+        """图片源变化后重建名称索引，清空选择缓存"""
+        self._sources_by_name = {}
+        for source in self.sources:
+            self._sources_by_name.setdefault(source.get_name(), source)
+        self._selection_cache.clear()
+    
+    def set_result_store(self, store: Optional[ImageResultStore]):
+        """设置搜索结果存储，传入 None 关闭"""
+        self.result_store = store
+    
+    def set_limiters(self, limiters: Optional[LimiterRegistry]):
+        """设置按图片源独立的并发限制器，传入 None 恢复共用 sem_img"""
+        self.limiters = limiters
+    
+    def set_breaker(self, failure_threshold: int, cooldown: float, window: int = 100):
+        """
+        设置熔断参数并清空已有的健康状态
+        
+        Args:
+            failure_threshold: 连续失败多少次后熔断，0 表示不熔断
+            cooldown: 熔断后多少秒放行探测请求
+            window: 统计错误率和延迟的最近请求数
+        """
+        self.breaker_config = {'failure_threshold': failure_threshold, 'cooldown': cooldown, 'window': window}
+        self.health.clear()
+    
+    def get_health(self, source: ImageSource) -> SourceHealth:
+        """获取（不存在时创建）图片源的健康状态"""
+        name = source.get_name()
+        health = self.health.get(name)
+        if health is None:
+            health = SourceHealth(name, **self.breaker_config)
+            self.health[name] = health
+        return health
+    
+    def health_summary(self) -> Dict[str, Dict]:
+        """返回所有图片源的健康状态摘要"""
+        return {name: health.summary() for name, health in self.health.items()}
     
     def add_rule(self, matcher: Callable[[str, Dict], bool], source_name: str):
         """
@@ -40,7 +118,9 @@ class ImageSourceManager:
             matcher: 匹配函数，接收 (tag, item_data)，返回是否匹配
             source_name: 匹配成功时使用的图片源名称
         """
+        self._custom_rules.append(len(self.rules))
         self.rules.append((matcher, source_name))
+        self._selection_cache.clear()
     
     def add_pattern_rule(self, pattern: str, source_name: str):
         """
@@ -55,7 +135,10 @@ class ImageSourceManager:
         """
         regex = re.compile(pattern)
         matcher = lambda tag, item_data: bool(regex.search(tag))
-        self.add_rule(matcher, source_name)
+        self._pattern_rules.append((len(self.rules), regex))
+        self.rules.append((matcher, source_name))
+        self._combined_built = False
+        self._selection_cache.clear()
     
     def add_source_rule(self, source_en: str, source_name: str):
         """
@@ -69,14 +152,99 @@ class ImageSourceManager:
             manager.add_source_rule('genshin_impact', 'Miyoushe')
         """
         matcher = lambda tag, item_data: item_data.get('source_en') == source_en
-        self.add_rule(matcher, source_name)
+        self._source_rules.setdefault(source_en, []).append(len(self.rules))
+        self.rules.append((matcher, source_name))
+        self._selection_cache.clear()
     
     def get_source_by_name(self, name: str) -> Optional[ImageSource]:
         """根据名称获取图片源"""
-        for source in self.sources:
-            if source.get_name() == name:
-                return source
-        return None
+        return self._sources_by_name.get(name)
+    
+    def _get_combined_pattern(self) -> Optional[Pattern]:
+        """
+        所有正则规则合并成的交替表达式 (?:模式1)|(?:模式2)|...（首次使用时编译）
+        
+        只用于快速判断是否有规则匹配：交替表达式在每个位置只报告第一个匹配的分支，
+        无法得到所有匹配的规则。规则本身含有反向引用或行内标志等无法合并的写法时返回 None，改为逐条匹配
+        """
+        if not self._combined_built:
+            self._combined_built = True
+            self._combined_pattern = None
+            # 合并后分组编号改变，反向引用会指向别的分组
+            if not any(re.search(r'\\\d|\(\?P=', regex.pattern) for _, regex in self._pattern_rules):
+                try:
+                    self._combined_pattern = re.compile('|'.join(
+                        f"(?:{regex.pattern})" for _, regex in self._pattern_rules
+                    ))
+                except re.error:
+                    pass
+            self._suffix_cacheable = self._combined_pattern is not None and not any(
+                re.search(r'\(\?<[=!]|\\[bB]', regex.pattern) for _, regex in self._pattern_rules
+            )
+        return self._combined_pattern
+    
+    def _match_patterns(self, tag: str, pos: int = 0) -> List[int]:
+        """
+        返回从 pos 开始匹配的正则规则序号，结果与逐条调用规则的匹配函数相同
+        
+        合并表达式没有匹配时所有正则规则都不匹配（只需一次正则搜索）；
+        有匹配时逐条确认匹配了哪些规则（同一标签、同一位置可能匹配多条）。
+        选择结果按后缀缓存，逐条确认只在缓存未命中时进行
+        """
+        combined = self._get_combined_pattern()
+        if combined is not None and not combined.search(tag, pos):
+            return []
+        return [index for index, regex in self._pattern_rules if regex.search(tag, pos)]
+    
+    def _suffix_key(self, tag: str) -> Optional[str]:
+        """
+        正则规则的匹配结果只取决于作品后缀时返回后缀（如 "_(genshin_impact)"），用作选择缓存的键
+        
+        没有正则规则匹配时返回空字符串；最左边的匹配从后缀之前开始（匹配涉及角色名）时返回 None，不缓存
+        """
+        if not self._pattern_rules:
+            return ''
+        combined = self._get_combined_pattern()
+        if not self._suffix_cacheable:
+            return None
+        match = combined.search(tag)
+        if match is None:
+            return ''
+        start = tag.rfind('_(') if tag.endswith(')') else -1
+        if start <= 0 or match.start() < start:
+            return None
+        return tag[start:]
+    
+    def _match_rules(self, tag: str, item_data: Dict, suffix: Optional[str] = None) -> Tuple[int, ...]:
+        """
+        返回匹配的规则序号（升序）
+        
+        suffix 为 _suffix_key 的结果时：空字符串表示没有正则规则匹配，否则正则规则只需在后缀中匹配
+        """
+        if suffix == '' or not self._pattern_rules:
+            matched = []
+        elif suffix:
+            matched = self._match_patterns(tag, len(tag) - len(suffix))
+        else:
+            matched = self._match_patterns(tag)
+        
+        source_en = item_data.get('source_en')
+        if isinstance(source_en, str):
+            matched.extend(self._source_rules.get(source_en, ()))
+        
+        matched.extend(self._match_custom(tag, item_data))
+        return tuple(sorted(matched))
+    
+    def _match_custom(self, tag: str, item_data: Dict) -> Tuple[int, ...]:
+        """返回匹配的自定义规则序号（匹配函数抛出异常时视为不匹配）"""
+        matched = []
+        for index in self._custom_rules:
+            try:
+                if self.rules[index][0](tag, item_data):
+                    matched.append(index)
+            except Exception:
+                pass
+        return tuple(matched)
     
     def select_sources(self, tag: str, item_data: Dict) -> List[ImageSource]:
         """
@@ -89,17 +257,33 @@ class ImageSourceManager:
         Returns:
             图片源列表（按优先级排序，包含降级选项）
         """
+        # 正则规则只匹配作品后缀时，选择结果只取决于 (后缀, source_en, 自定义规则)，命中缓存时不再逐个确认规则
+        suffix = self._suffix_key(tag)
+        key = None
+        if suffix is not None:
+            source_en = item_data.get('source_en')
+            key = (
+                suffix, source_en if isinstance(source_en, str) else None,
+                self._match_custom(tag, item_data), self.default_source_name
+            )
+            cached = self._selection_cache.get(key)
+            if cached is not None:
+                return list(cached)
+        
+        selection = self._build_selection(self._match_rules(tag, item_data, suffix))
+        if key is not None:
+            self._selection_cache[key] = selection
+        return list(selection)
+    
+    def _build_selection(self, matched: Tuple[int, ...]) -> List[ImageSource]:
+        """由匹配到的规则序号生成图片源列表"""
         selected_sources = []
         
         # 1. 根据规则匹配
-        for matcher, source_name in self.rules:
-            try:
-                if matcher(tag, item_data):
-                    source = self.get_source_by_name(source_name)
-                    if source and source not in selected_sources:
-                        selected_sources.append(source)
-            except Exception:
-                pass
+        for index in matched:
+            source = self.get_source_by_name(self.rules[index][1])
+            if source and source not in selected_sources:
+                selected_sources.append(source)
         
         # 2. 添加默认源作为降级选项
         default_source = self.get_source_by_name(self.default_source_name)
@@ -112,7 +296,52 @@ class ImageSourceManager:
         
         return selected_sources
     
-    async def search_with_fallback(
+    async def prefilter(
+        self,
+        session: aiohttp.ClientSession,
+        items: List[Dict],
+        sem_img: asyncio.Semaphore,
+        retry_times: int,
+        retry_delay: int,
+        stats: Stats
+    ):
+        """
+        搜图前的预筛选：对支持的图片源批量查询标签的图片数量
+        
+        图片数量为 0 的标签在搜图时直接视为无图（不请求网络，结果照常写入存储），
+        数量较少的标签搜图时不加 solo 限定。结果存储中已有记录的标签不再查询。
+        查询失败时忽略，搜图按原方式进行
+        
+        Args:
+            session: aiohttp 会话
+            items: 即将搜图的角色数据
+            sem_img: 图片并发信号量（设置了 limiters 时改用各图片源自己的限制器）
+            retry_times: 重试次数
+            retry_delay: 重试延迟（秒）
+            stats: 统计对象
+        """
+        for source in self.sources:
+            if not source.supports_post_counts or self.get_health(source).is_open():
+                continue
+            
+            store = self.result_store if source.cacheable else None
+            tags = [
+                item['tag'] for item in items
+                if source in self.select_sources(item['tag'], item)
+                and not (store and store.get(source.get_name(), item['tag'])[0])
+            ]
+            if not tags:
+                continue
+            
+            source_sem = self.limiters.get(source.get_name()) if self.limiters else sem_img
+            try:
+                counts = await source.fetch_post_counts(session, tags, source_sem, retry_times, retry_delay)
+            except Exception:
+                continue
+            stats.img_prefilter_tags += len(counts)
+            stats.img_prefilter_zero += sum(1 for count in counts.values() if count == 0)
+    
+    async def search_image(
         self,
         session: aiohttp.ClientSession,
         tag: str,
@@ -121,34 +350,80 @@ class ImageSourceManager:
         retry_times: int,
         retry_delay: int,
         stats: Stats
-    ) -> Optional[str]:
+    ) -> Optional[Dict]:
         """
         搜索图片（支持自动降级）
         
         按优先级尝试多个图片源，直到成功或全部失败
+        设置了结果存储时，先查存储：命中直接返回，未命中（负缓存）跳过该图片源
+        熔断中的图片源直接跳过（不写入存储），请求结果计入该图片源的健康状态
         
         Args:
             session: aiohttp 会话
             tag: 角色标签
             item_data: 角色数据
-            sem_img: 图片并发信号量
+            sem_img: 图片并发信号量（设置了 limiters 时改用各图片源自己的限制器）
             retry_times: 重试次数
             retry_delay: 重试延迟（秒）
             stats: 统计对象
         
         Returns:
-            图片 URL，如果失败返回 None
+            {"image_url": 原图 URL, 以及图片源提供的 IMAGE_META_FIELDS 字段}，如果失败返回 None
         """
         sources = self.select_sources(tag, item_data)
         
         for source in sources:
+            store = self.result_store if source.cacheable else None
+            
+            if store:
+                found, img_url = store.get(source.get_name(), tag)
+                if found:
+                    if img_url:
+                        stats.img_success += 1
+                        stats.img_store_hit += 1
+                        return {'image_url': img_url, **store.get_meta(source.get_name(), tag)}
+                    stats.img_fail += 1
+                    stats.img_store_negative += 1
+                    continue
+            
+            health = self.get_health(source)
+            if not health.allow():
+                stats.img_fail += 1
+                stats.img_breaker_skipped += 1
+                continue
+            
+            # 冷却结束后放行的探测请求
+            probe = health.probing
+            source_sem = self.limiters.get(source.get_name()) if self.limiters else sem_img
+            source_sem = BreakerGate(source_sem, health, probe)
+            
+            start = time.monotonic()
             try:
                 img_url = await source.search(
-                    session, tag, item_data, sem_img, retry_times, retry_delay, stats
+                    session, tag, item_data, source_sem, retry_times, retry_delay, stats
                 )
-                if img_url:
-                    return img_url
+            except asyncio.CancelledError:
+                if probe:
+                    health.release()
+                raise
+            except CircuitOpenError:
+                # 排队期间图片源已熔断，请求未发出
+                health.skipped += 1
+                stats.img_fail += 1
+                stats.img_breaker_skipped += 1
+                continue
             except Exception:
-                pass
+                # 请求失败不写入存储，下次仍会重试
+                health.record_failure()
+                continue
+            health.record_success(time.monotonic() - start)
+            
+            # 备选图片随结果一起保存，供之后替换失效或不合适的图片
+            alternates = source.pop_alternates(tag)
+            meta = source.pop_image_meta(tag)
+            if store:
+                store.put(source.get_name(), tag, img_url, alternates, meta)
+            if img_url:
+                return {'image_url': img_url, **meta}
         
         return None
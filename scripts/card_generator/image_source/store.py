@@ -0,0 +1,151 @@
+"""
+图片搜索结果存储
+按 (图片源名称, tag) 持久化搜索结果，包括命中和未命中（负缓存）。
+写入在事件循环中执行，累计 commit_every 行后才提交一次事务，避免每次搜图都等待磁盘
+"""
+
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class ImageResultStore:
+    """
+    图片搜索结果存储（SQLite）
+
+    - 命中：保存图片 URL，在 hit_ttl 内直接复用
+    - 未命中：保存空结果，在 miss_ttl 内跳过该图片源，不再请求网络
+    - 备选：命中时可同时保存其余候选图片的 URL
+    - 附加信息：命中时可同时保存缩略图/样图 URL 和原图宽高
+    """
+
+    def __init__(
+        self,
+        db_file: str,
+        hit_ttl_days: float = 90,
+        miss_ttl_days: float = 7,
+        commit_every: int = 200
+    ):
+        """
+        Args:
+            db_file: SQLite 数据库文件路径
+            hit_ttl_days: 命中结果有效期（天），0 表示永不过期
+            miss_ttl_days: 未命中结果有效期（天），0 表示不缓存未命中
+            commit_every: 累计写入多少行后提交一次事务（同一连接的查询能读到未提交的行，未提交的行在 close 时提交）
+        """
+        self.db_file = db_file
+        self.hit_ttl_seconds = hit_ttl_days * 86400 if hit_ttl_days and hit_ttl_days > 0 else 0
+        self.miss_ttl_seconds = miss_ttl_days * 86400 if miss_ttl_days and miss_ttl_days > 0 else 0
+        self.commit_every = max(1, commit_every)
+        self._uncommitted = 0
+
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self._conn = sqlite3.connect(db_file)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_results (
+                source TEXT NOT NULL,
+                tag TEXT NOT NULL,
+                image_url TEXT,
+                checked_at REAL NOT NULL,
+                alternates TEXT,
+                meta TEXT,
+                PRIMARY KEY (source, tag)
+            )
+            """
+        )
+        # 旧版本数据库没有 alternates、meta 列
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(image_results)")}
+        for column in ('alternates', 'meta'):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE image_results ADD COLUMN {column} TEXT")
+        self._conn.commit()
+
+    def get(self, source_name: str, tag: str) -> Tuple[bool, Optional[str]]:
+        """
+        查询搜索结果
+
+        Args:
+            source_name: 图片源名称
+            tag: 角色标签
+
+        Returns:
+            (是否有未过期的记录, 图片 URL)；记录为未命中时 URL 为 None
+        """
+        row = self._conn.execute(
+            "SELECT image_url, checked_at FROM image_results WHERE source = ? AND tag = ?",
+            (source_name, tag)
+        ).fetchone()
+        if not row:
+            return False, None
+
+        image_url, checked_at = row
+        age = time.time() - checked_at
+        if image_url:
+            if self.hit_ttl_seconds and age > self.hit_ttl_seconds:
+                return False, None
+            return True, image_url
+
+        if not self.miss_ttl_seconds or age > self.miss_ttl_seconds:
+            return False, None
+        return True, None
+
+    def get_meta(self, source_name: str, tag: str) -> Dict:
+        """
+        查询保存的图片附加信息
+
+        Returns:
+            附加信息字典，没有记录时为空字典
+        """
+        row = self._conn.execute(
+            "SELECT meta FROM image_results WHERE source = ? AND tag = ?",
+            (source_name, tag)
+        ).fetchone()
+        if not row or not row[0]:
+            return {}
+        return json.loads(row[0])
+
+    def put(
+        self,
+        source_name: str,
+        tag: str,
+        image_url: Optional[str],
+        alternates: Optional[List[str]] = None,
+        meta: Optional[Dict] = None
+    ):
+        """
+        保存搜索结果
+
+        Args:
+            source_name: 图片源名称
+            tag: 角色标签
+            image_url: 图片 URL，None 表示确认没有图片
+            alternates: 可选的备选图片 URL 列表
+            meta: 可选的图片附加信息（缩略图/样图 URL、原图宽高）
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO image_results (source, tag, image_url, checked_at, alternates, meta) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                source_name, tag, image_url, time.time(),
+                json.dumps(alternates) if alternates else None,
+                json.dumps(meta) if meta else None
+            )
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        """提交未提交的写入"""
+        if self._uncommitted:
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        """提交未提交的写入并关闭数据库连接"""
+        self.flush()
+        self._conn.close()
@@ -3,11 +3,116 @@ LLM 交互模块 - LLM API 调用和翻译逻辑
 """
 
 import asyncio
+import hashlib
 import json
+import time
 import aiohttp
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 from .stats import Stats
 from .config import Config
+from .llm_cache import TranslationCache
+from .batch_sizer import AdaptiveBatchSizer
+from .rate_limit import throttle, note_response, parse_retry_after
+from .llm_pool import LLMEndpoint, LLMEndpointPool, get_endpoint_pool
+from .llm_stream import IncrementalArrayParser, iter_sse_data
+
+
+SYSTEM_PROMPT = "You are a JSON generator helper."
+
+# 单次请求的输出 token 上限
+MAX_TOKENS = 65536
+
+# 括号处理规则（详细格式和紧凑格式共用）
+BRACKET_RULES = """    3. **括号处理规则**：
+       如果 tag 中包含括号，例如 character_(xxx)，请按以下规则处理：
+       
+       - 如果是**服装/形态/版本**描述（如 1st_costume, 2nd_costume, summer, winter, casual, maid, racing, idol 等）：
+         * 在 cn_name 中添加对应的中文描述，格式：角色名（描述）
+         * 在 en_name 中也保留括号，格式：Character Name (Description)
+         例如：inuyama_tamaki_(1st_costume) → cn_name: "犬山玉姬（第一套服装）", en_name: "Inuyama Tamaki (1st Costume)"
+       
+       - 如果是**作品名称**（用于区分同名角色，如 touhou, fate, pokemon 等）：
+         * cn_name 和 en_name **不包含括号和作品名**，只写角色名
+         * 将括号内的作品名提取到 source_cn 和 source_en
+         例如：ringo_(touhou) → cn_name: "铃瑚", en_name: "Ringo", source_cn: "东方Project", source_en: "Touhou Project"
+         例如：sakura_(cardcaptor_sakura) → cn_name: "小樱", en_name: "Sakura", source_cn: "魔卡少女樱", source_en: "Cardcaptor Sakura"
+
+
+"""
+
+# 翻译提示词模板，占位符: {count} 标签数量, {tags_str} 编号后的标签列表
+PROMPT_TEMPLATE = """
+    你是一个精通ACG文化的专家。请将以下 {count} 个 Danbooru Character Tags 翻译成 JSON 格式。
+
+    **要翻译的角色标签**：
+{tags_str}
+
+    **翻译要求**:
+    1. 必须返回 {count} 个对象，不能多也不能少
+    2. 每个对象必须包含以下字段：
+       - "tag": 原标签（从上面列表中选择，保持不变）
+       - "cn_name": 中文角色名（如果无法确定，留空）
+       - "cn_name_status": 中文名状态（官方译名/推断译名/未知）
+       - "en_name": 英文角色名（去掉下划线，首字母大写）
+       - "source_cn": 作品中文名（如果无法确定，留空）
+       - "source_en": 作品英文名
+       - "source_name_status": 作品名状态（官方译名/推断译名/未知）
+
+""" + BRACKET_RULES + """    4. 严禁使用 Markdown 代码块包裹，直接返回 JSON 数组
+
+    请翻译以上 {count} 个标签，确保返回数量正确。
+    """
+
+# 紧凑格式的列顺序（每行第一列为标签序号）
+COMPACT_COLUMNS = (
+    'cn_name',
+    'cn_name_status',
+    'en_name',
+    'source_cn',
+    'source_en',
+    'source_name_status',
+)
+
+# 紧凑格式中的名称状态代码
+STATUS_CODES = {
+    '官': '官方译名',
+    '推': '推断译名',
+    '未': '未知',
+}
+
+# 紧凑格式提示词模板：按序号返回定长数组，不重复 tag 和字段名，减少输出 token
+COMPACT_PROMPT_TEMPLATE = """
+    你是一个精通ACG文化的专家。请将以下 {count} 个 Danbooru Character Tags 翻译成紧凑的 JSON 表格。
+
+    **要翻译的角色标签**：
+{tags_str}
+
+    **翻译要求**:
+    1. 返回 {{"rows": [...]}}，必须包含 {count} 行，每个标签一行，不能多也不能少
+    2. 每行是一个数组，按以下顺序排列（不要输出表头，不要重复 tag）：
+       [序号, cn_name, cn_name_status, en_name, source_cn, source_en, source_name_status]
+       - 序号: 标签在上面列表中的编号（整数）
+       - cn_name: 中文角色名（如果无法确定，留空）
+       - cn_name_status / source_name_status: 名称状态，"官" 表示官方译名，"推" 表示推断译名，"未" 表示未知
+       - en_name: 英文角色名（去掉下划线，首字母大写）
+       - source_cn: 作品中文名（如果无法确定，留空）
+       - source_en: 作品英文名
+       例如：{{"rows": [[1, "铃瑚", "官", "Ringo", "东方Project", "Touhou Project", "官"]]}}
+
+""" + BRACKET_RULES.replace('{', '{{').replace('}', '}}') + """    4. 严禁使用 Markdown 代码块包裹，直接返回 JSON
+
+    请翻译以上 {count} 个标签，确保返回行数正确。
+    """
+
+def get_prompt_version(config: Config) -> str:
+    """
+    提示词版本：系统提示词、详细/紧凑格式模板或响应格式变化后，翻译缓存和未完成的批处理任务自动失效
+    
+    Args:
+        config: 配置对象（使用 llm_response_format）
+    """
+    source = '\n'.join((SYSTEM_PROMPT, PROMPT_TEMPLATE, COMPACT_PROMPT_TEMPLATE, config.llm_response_format))
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
 
 
 def load_source_name_mapping(mapping_file: str) -> Optional[Dict]:
@@ -86,11 +191,44 @@ def normalize_source_names(
     return normalized_en, normalized_cn
 
 
+def build_prompt(batch_data: List[Dict], config: Config) -> str:
+    """
+    为一组标签构造提示词（按 config.llm_response_format 选择详细或紧凑格式）
+    
+    Args:
+        batch_data: 包含 "tag" 字段的源数据列表
+        config: 配置对象
+    """
+    tags_str = '\n'.join([f"{i+1}. {item['tag']}" for i, item in enumerate(batch_data)])
+    template = COMPACT_PROMPT_TEMPLATE if config.llm_response_format == 'compact' else PROMPT_TEMPLATE
+    return template.format(count=len(batch_data), tags_str=tags_str)
+
+
+def build_request_body(prompt: str, config: Config) -> Dict:
+    """构造 chat/completions 请求体（实时请求和批处理任务共用）"""
+    return {
+        "model": config.llm_model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": MAX_TOKENS,
+        "thinking": {
+            "type": "disabled"
+        },
+        "temperature": 0.6,
+        "top_p": 0.95,
+        "response_format": {"type": "json_object"}
+    }
+
+
 async def call_llm_custom(
     session: aiohttp.ClientSession, 
     prompt: str,
     config: Config,
-    sem_llm: asyncio.Semaphore
+    sem_llm: asyncio.Semaphore,
+    response_info: Optional[Dict] = None,
+    stream_parser: Optional[IncrementalArrayParser] = None
 ) -> Optional[str]:
     """
     调用 LLM 接口获取元数据（带重试机制）
@@ -100,6 +238,11 @@ async def call_llm_custom(
         prompt: 提示词
         config: 配置对象
         sem_llm: LLM 并发信号量
+        response_info: 可选的字典，调用后填入最后一次请求的
+                       latency（秒）、finish_reason、usage，流式模式下还有 first_item_latency
+        stream_parser: 传入时使用流式响应（stream: true），输出逐段喂给该解析器
+    
+    配置了端点池（llm_pool）时请求由端点池路由，sem_llm 不再使用，改用各端点自己的并发限制
     
     Returns:
         LLM 返回的内容，失败返回 None
@@ -108,29 +251,38 @@ async def call_llm_custom(
         "Authorization": f"Bearer {config.llm_api_key}",
         "Content-Type": "application/json"
     }
-    data = {
-        "model": config.llm_model,
-        "messages": [
-            {"role": "system", "content": "You are a JSON generator helper."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 65536,
-        "thinking": {
-            "type": "disabled"
-        },
-        "temperature": 0.6,
-        "top_p": 0.95,
-        "response_format": {"type": "json_object"}
-    }
+    data = build_request_body(prompt, config)
+    if stream_parser is not None:
+        data["stream"] = True
+        data["stream_options"] = {"include_usage": True}
 
+    if response_info is None:
+        response_info = {}
+    
+    pool = get_endpoint_pool() if config.llm_use_pool else None
+    # 端点都配置了自己的模型时（如级联的强模型请求），不经过端点池
+    if pool is not None and pool.can_serve(data["model"]):
+        return await _call_pool(session, pool, data, config, response_info, stream_parser)
+    
     # 重试逻辑
     for attempt in range(config.llm_retry_times):
         try:
-            async with sem_llm:  # 使用信号量限制 LLM 并发
+            await throttle(config.llm_api_url)  # 按主机限速（先于并发名额）
+            async with sem_llm as slot:  # 限制 LLM 并发（自适应限制器会根据状态码调整上限）
+                start = time.perf_counter()
                 async with session.post(config.llm_api_url, headers=headers, json=data) as response:
+                    if slot:
+                        slot.report(response.status)
+                    note_response(config.llm_api_url, response.status, response.headers)
+                    if response.status == 200 and stream_parser is not None:
+                        return await _read_stream(response, stream_parser, response_info, start)
                     if response.status == 200:
                         result = await response.json()
-                        return result['choices'][0]['message']['content']
+                        choice = result['choices'][0]
+                        response_info['latency'] = time.perf_counter() - start
+                        response_info['finish_reason'] = choice.get('finish_reason')
+                        response_info['usage'] = result.get('usage') or {}
+                        return choice['message']['content']
                     else:
                         # 打印错误状态码，方便调试
                         if attempt == config.llm_retry_times - 1:
@@ -146,17 +298,454 @@ async def call_llm_custom(
     return None
 
 
+# LLM 返回条目的必需字段（均为字符串）
+REQUIRED_FIELDS = (
+    'tag',
+    'cn_name',
+    'cn_name_status',
+    'en_name',
+    'source_cn',
+    'source_en',
+    'source_name_status',
+)
+
+# 名称状态字段的合法取值
+NAME_STATUSES = ('官方译名', '推断译名', '未知')
+
+
+def default_item(item: Dict) -> Dict:
+    """
+    构造 LLM 未能翻译时的默认条目，防止整个批次丢失
+    
+    Args:
+        item: 包含 {"tag": str, "color": int, "content": str} 的源数据
+    """
+    return {
+        "tag": item['tag'],
+        "cn_name": "",
+        "cn_name_status": "",  # LLM错误时留空
+        "en_name": item['tag'],
+        "source_cn": "",
+        "source_en": "",
+        "source_name_status": "",  # LLM错误时留空
+        "color": item['color'],
+        "content": item['content']
+    }
+
+
+def extract_items(content: str) -> Optional[List]:
+    """
+    从 LLM 返回内容中提取条目列表
+    
+    兼容 LLM 可能返回 {"items": [...]} 或直接 [...] 的情况
+    
+    Returns:
+        条目列表，无法提取时返回 None
+    
+    Raises:
+        json.JSONDecodeError: 内容不是合法 JSON
+    """
+    clean_content = content.replace("```json", "").replace("```", "").strip()
+    result = json.loads(clean_content)
+    if isinstance(result, dict):
+        for val in result.values():
+            if isinstance(val, list):
+                return val
+        return None
+    if isinstance(result, list):
+        return result
+    return None
+
+
+def expand_row(row, batch_data: List[Dict]) -> Optional[Dict]:
+    """
+    把紧凑格式的一行还原为详细格式的条目
+    
+    Args:
+        row: [序号, cn_name, cn_name_status, en_name, source_cn, source_en, source_name_status]，
+             LLM 未按紧凑格式返回的对象原样返回
+        batch_data: 本次请求的源数据列表（序号从 1 开始对应）
+    
+    Returns:
+        还原后的条目，格式错误时返回 None
+    """
+    if isinstance(row, dict):
+        return row
+    if not isinstance(row, list) or len(row) != 1 + len(COMPACT_COLUMNS):
+        return None
+    
+    index = row[0]
+    if isinstance(index, str) and index.strip().isdigit():
+        index = int(index)
+    if not isinstance(index, int) or not 1 <= index <= len(batch_data):
+        return None
+    
+    item = {'tag': batch_data[index - 1]['tag']}
+    for field, value in zip(COMPACT_COLUMNS, row[1:]):
+        if field.endswith('_status'):
+            value = STATUS_CODES.get(value, value)
+        item[field] = value
+    return item
+
+
+def parse_items(content: str, batch_data: List[Dict]) -> Optional[List[Dict]]:
+    """
+    解析 LLM 返回内容为条目列表（实时模式和批处理模式共用）
+    
+    Args:
+        content: LLM 返回内容
+        batch_data: 本次请求的源数据列表（紧凑格式按序号还原）
+    
+    Returns:
+        条目列表（格式错误的行已丢弃），无法提取列表时返回 None
+    
+    Raises:
+        json.JSONDecodeError: 内容不是合法 JSON
+    """
+    items = extract_items(content)
+    if items is None:
+        return None
+    return [item for item in (expand_row(row, batch_data) for row in items) if item is not None]
+
+
+def usage_key(config: Config) -> str:
+    """token 统计的分组名：响应格式，级联模式下加上模型层级"""
+    if config.llm_tier:
+        return f"{config.llm_tier}/{config.llm_response_format}"
+    return config.llm_response_format
+
+
+def record_usage(stats: Stats, mode: str, response_info: Dict):
+    """按分组（响应格式/模型层级）累计请求次数和 token 用量"""
+    usage = stats.llm_token_usage.setdefault(mode, {
+        'requests': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'items': 0,
+    })
+    usage['requests'] += 1
+    tokens = response_info.get('usage') or {}
+    usage['prompt_tokens'] += tokens.get('prompt_tokens') or 0
+    usage['completion_tokens'] += tokens.get('completion_tokens') or 0
+
+
+def validate_item(item, requested_tags) -> bool:
+    """
+    校验 LLM 返回的单个条目
+    
+    - tag 属于本次请求
+    - 必需字段齐全且为字符串，en_name 非空
+    - 状态字段取值合法，且除"未知"外 cn_name 不能为空
+    
+    Args:
+        item: LLM 返回的条目
+        requested_tags: 本次请求的 tag 集合
+    """
+    if not isinstance(item, dict) or item.get('tag') not in requested_tags:
+        return False
+    if not all(isinstance(item.get(field), str) for field in REQUIRED_FIELDS):
+        return False
+    if not item['en_name'].strip():
+        return False
+    if item['cn_name_status'] not in NAME_STATUSES or item['source_name_status'] not in NAME_STATUSES:
+        return False
+    if item['cn_name_status'] != '未知' and not item['cn_name'].strip():
+        return False
+    return True
+
+
+async def request_translation(
+    session: aiohttp.ClientSession,
+    batch_data: List[Dict],
+    config: Config,
+    sem_llm: asyncio.Semaphore,
+    response_info: Optional[Dict] = None,
+    stream_parser: Optional[IncrementalArrayParser] = None
+) -> Optional[str]:
+    """
+    为一组标签构造提示词并请求 LLM
+    
+    Returns:
+        LLM 返回的内容，失败返回 None
+    """
+    prompt = build_prompt(batch_data, config)
+    return await call_llm_custom(session, prompt, config, sem_llm, response_info, stream_parser)
+
+
+async def _read_stream(
+    response: aiohttp.ClientResponse,
+    stream_parser: IncrementalArrayParser,
+    response_info: Dict,
+    start: float
+) -> str:
+    """
+    读取流式响应，把增量内容喂给解析器
+    
+    已收到内容后连接中断时不再重试（避免重复产出条目），返回已收到的部分，
+    finish_reason 记为 "interrupted"
+    """
+    finish_reason = None
+    usage = {}
+    try:
+        async for event in iter_sse_data(response):
+            if event.get('usage'):
+                usage = event['usage']
+            for choice in event.get('choices') or []:
+                delta = (choice.get('delta') or {}).get('content')
+                if delta:
+                    stream_parser.feed(delta)
+                    if stream_parser.items and 'first_item_latency' not in response_info:
+                        response_info['first_item_latency'] = time.perf_counter() - start
+                if choice.get('finish_reason'):
+                    finish_reason = choice['finish_reason']
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        if not stream_parser.chunks:
+            raise
+        finish_reason = 'interrupted'
+    
+    response_info['latency'] = time.perf_counter() - start
+    response_info['finish_reason'] = finish_reason
+    response_info['usage'] = usage
+    return stream_parser.text
+
+
+async def _pool_attempt(
+    session: aiohttp.ClientSession,
+    pool: LLMEndpointPool,
+    endpoint: LLMEndpoint,
+    data: Dict,
+    stream_parser: Optional[IncrementalArrayParser]
+) -> Optional[Tuple[str, Dict, Optional[IncrementalArrayParser]]]:
+    """
+    向指定端点发送一次请求（请求计数由 _start_attempt 释放）
+    
+    Returns:
+        (内容, 响应信息, 本次请求的流式解析器)，失败返回 None
+    """
+    headers = {
+        "Authorization": f"Bearer {endpoint.api_key}",
+        "Content-Type": "application/json"
+    }
+    model = pool.request_model(endpoint, data.get("model"))
+    if model != data.get("model"):
+        data = {**data, "model": model}
+    # 对冲请求各自使用独立的解析器，条目回调共用（重复条目由调用方去重）
+    parser = IncrementalArrayParser(stream_parser.on_item) if stream_parser is not None else None
+    info = {}
+    
+    try:
+        await endpoint.bucket.acquire()
+        await throttle(endpoint.url)
+        async with endpoint.limiter as slot:
+            start = time.perf_counter()
+            async with session.post(endpoint.url, headers=headers, json=data) as response:
+                if slot:
+                    slot.report(response.status)
+                if response.status in (429, 503):
+                    # 限流只暂停该端点（同一主机上的其他 Key 不受影响）
+                    delay = parse_retry_after(response.headers.get('Retry-After'))
+                    if delay is not None:
+                        endpoint.bucket.pause(delay)
+                if response.status != 200:
+                    endpoint.record_failure(pool.eject_after_failures, pool.eject_seconds)
+                    return None
+                
+                if parser is not None:
+                    content = await _read_stream(response, parser, info, start)
+                else:
+                    result = await response.json()
+                    choice = result['choices'][0]
+                    info['latency'] = time.perf_counter() - start
+                    info['finish_reason'] = choice.get('finish_reason')
+                    info['usage'] = result.get('usage') or {}
+                    content = choice['message']['content']
+        endpoint.record_success(info['latency'])
+        return content, info, parser
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        endpoint.record_failure(pool.eject_after_failures, pool.eject_seconds)
+        return None
+
+
+def _start_attempt(
+    session: aiohttp.ClientSession,
+    pool: LLMEndpointPool,
+    endpoint: LLMEndpoint,
+    data: Dict,
+    stream_parser: Optional[IncrementalArrayParser]
+) -> asyncio.Task:
+    """
+    创建向端点（已由 pool.pick 占用请求计数）发送请求的任务
+
+    请求计数在任务结束时的回调中释放：任务在开始执行前被取消时协程内的 finally 不会运行
+    """
+    task = asyncio.create_task(_pool_attempt(session, pool, endpoint, data, stream_parser))
+    task.add_done_callback(lambda _: endpoint.release())
+    return task
+
+
+async def _call_pool(
+    session: aiohttp.ClientSession,
+    pool: LLMEndpointPool,
+    data: Dict,
+    config: Config,
+    response_info: Dict,
+    stream_parser: Optional[IncrementalArrayParser]
+) -> Optional[str]:
+    """
+    通过端点池请求 LLM（带重试机制）
+    
+    请求发往负载最低的健康端点；耗时超过该端点历史延迟分位数时，
+    再向另一个端点发送同样的请求，先成功的结果生效，另一个请求被取消
+    """
+    for attempt in range(config.llm_retry_times):
+        primary = pool.pick(model=data.get("model"))
+        tasks = {_start_attempt(session, pool, primary, data, stream_parser): primary}
+        try:
+            delay = pool.hedge_delay(primary)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    secondary = pool.pick(exclude=primary, model=data.get("model"))
+                    if secondary is not None:
+                        primary.hedges += 1
+                        tasks[_start_attempt(session, pool, secondary, data, stream_parser)] = secondary
+            
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is None:
+                        continue
+                    content, info, parser = result
+                    endpoint = tasks[task]
+                    if endpoint is not primary:
+                        endpoint.hedge_wins += 1
+                    response_info.update(info)
+                    response_info['endpoint'] = endpoint.name
+                    if parser is not None:
+                        stream_parser.chunks = parser.chunks
+                        stream_parser.items = parser.items
+                    return content
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        if attempt == config.llm_retry_times - 1:
+            print(f"\n[LLM] 端点池请求失败 (已重试{attempt+1}次)")
+        else:
+            await asyncio.sleep(config.llm_retry_delay * (attempt + 1))  # 指数退避
+    
+    return None
+
+
+async def request_with_bisection(
+    session: aiohttp.ClientSession,
+    batch_data: List[Dict],
+    config: Config,
+    sem_llm: asyncio.Semaphore,
+    stats: Stats,
+    response_info: Optional[Dict] = None,
+    on_item: Optional[Callable[[Dict], None]] = None
+) -> Tuple[Optional[List], List[Dict]]:
+    """
+    请求 LLM 并提取条目；返回内容无法解析为 JSON 时将批次对半拆分递归重试，
+    直到定位出导致解析失败的单个标签并将其隔离
+    
+    流式模式（config.llm_stream）下每个条目闭合时立即回调 on_item；
+    响应被截断时保留已完整的条目，缺失部分交给补全轮次处理。
+    紧凑格式的行按本次请求的序号还原为详细格式的条目
+    
+    Args:
+        session: aiohttp 会话
+        batch_data: 要翻译的源数据列表
+        config: 配置对象
+        sem_llm: LLM 并发信号量
+        stats: 统计对象
+        response_info: 可选的字典，填入首次请求的 latency、finish_reason、usage
+        on_item: 可选的回调，流式模式下每收到一个完整条目调用一次
+    
+    Returns:
+        (条目列表, 被隔离的源数据列表)；接口重试后仍然失败时条目列表为 None
+    """
+    if response_info is None:
+        response_info = {}
+    
+    streamed = []
+    
+    def _on_element(element):
+        item = expand_row(element, batch_data)
+        if item is None:
+            return
+        streamed.append(item)
+        if on_item:
+            on_item(item)
+    
+    stream_parser = IncrementalArrayParser(_on_element) if config.llm_stream else None
+    content = await request_translation(session, batch_data, config, sem_llm, response_info, stream_parser)
+    if not content:
+        print("\n⚠️ LLM 返回内容为空")
+        return None, []
+    record_usage(stats, usage_key(config), response_info)
+    
+    try:
+        items = parse_items(content, batch_data)
+    except json.JSONDecodeError as e:
+        if streamed and response_info.get('finish_reason') in ('length', 'interrupted'):
+            print(f"\n⚠️ LLM 输出被截断，保留已完整的 {len(streamed)} 项")
+            return streamed, []
+        
+        # 流式模式下已收到的条目不再重新提交
+        streamed_tags = {item.get('tag') for item in streamed}
+        remaining = [item for item in batch_data if item['tag'] not in streamed_tags]
+        if not remaining:
+            return streamed, []
+        
+        if len(remaining) == 1:
+            tag = remaining[0]['tag']
+            print(f"\n🚫 LLM 数据解析异常: {e}，已隔离标签: {tag}")
+            stats.llm_quarantined.append(tag)
+            return streamed, remaining
+        
+        mid = len(remaining) // 2
+        print(f"\n✂️ LLM 数据解析异常: {e}，拆分为 {mid} + {len(remaining) - mid} 个标签重试")
+        stats.llm_bisections += 1
+        (left_items, left_bad), (right_items, right_bad) = await asyncio.gather(
+            request_with_bisection(session, remaining[:mid], config, sem_llm, stats, on_item=on_item),
+            request_with_bisection(session, remaining[mid:], config, sem_llm, stats, on_item=on_item)
+        )
+        if left_items is None and right_items is None and not streamed:
+            return None, left_bad + right_bad
+        return streamed + (left_items or []) + (right_items or []), left_bad + right_bad
+    
+    if items is None:
+        print("\n⚠️ 无法从 LLM 返回中提取列表数据")
+        return [], []
+    return items, []
+
+
 async def translate_batch_task(
     session: aiohttp.ClientSession, 
     batch_data: List[Dict],
     config: Config,
     sem_llm: asyncio.Semaphore,
     stats: Stats,
-    source_name_mapping: Optional[Dict]
+    source_name_mapping: Optional[Dict],
+    translation_cache: Optional[TranslationCache] = None,
+    batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    on_item: Optional[Callable[[Dict], None]] = None,
+    prefetched: Optional[str] = None
 ) -> List[Dict]:
     """
     LLM 翻译任务
     
+    首轮提交整批标签；返回中缺失或校验不通过的标签再以小批次重新提交，
+    最多 config.llm_repair_rounds 轮，仍未得到有效结果的标签使用默认值。
+    返回内容无法解析时对半拆分重试，定位并隔离导致解析失败的标签。
+    传入 prefetched 时首轮使用已取得的返回内容（批处理模式），不再请求 LLM
+    
     Args:
         session: aiohttp 会话
         batch_data: 包含 {"tag": str, "color": int, "content": str} 的列表
@@ -164,154 +753,224 @@ async def translate_batch_task(
         sem_llm: LLM 并发信号量
         stats: 统计对象
         source_name_mapping: 作品名称映射表
+        translation_cache: 可选的翻译缓存，成功的结果会写入缓存
+        batch_sizer: 可选的自适应批大小，记录本批次的完整率、延迟和截断情况
+        on_item: 可选的回调，每个条目通过校验时立即调用（流式模式下早于整批完成）
+        prefetched: 可选的首轮 LLM 返回内容，无法解析时所有标签进入补全轮次
     
     Returns:
-        翻译后的数据列表
+        翻译后的数据列表（与 batch_data 顺序一致）
     """
+    translated: Dict[str, Dict] = {}
+    pending = list(batch_data)
+    failed: List[Dict] = []
+    tag_to_data = {data['tag']: data for data in batch_data}
+    pending_tags = set(tag_to_data)
     
-    # 提取要翻译的 tag 列表
-    tags_to_translate = [item['tag'] for item in batch_data]
-    tags_str = '\n'.join([f"{i+1}. {tag}" for i, tag in enumerate(tags_to_translate)])
+    def _accept(item) -> bool:
+        """校验条目，通过后合并 color/content、规范化作品名称并回调（重复条目取第一个）"""
+        if not validate_item(item, pending_tags) or item['tag'] in translated:
+            return False
+        data = tag_to_data[item['tag']]
+        item['color'] = data['color']
+        item['content'] = data['content']
+        item['source_en'], item['source_cn'] = normalize_source_names(
+            item['source_en'], item['source_cn'], source_name_mapping
+        )
+        translated[item['tag']] = item
+        if on_item:
+            on_item(item)
+        return True
     
-    prompt = f"""
-    你是一个精通ACG文化的专家。请将以下 {len(batch_data)} 个 Danbooru Character Tags 翻译成 JSON 格式。
-
-    **要翻译的角色标签**：
-{tags_str}
-
-    **翻译要求**:
-    1. 必须返回 {len(batch_data)} 个对象，不能多也不能少
-    2. 每个对象必须包含以下字段：
-       - "tag": 原标签（从上面列表中选择，保持不变）
-       - "cn_name": 中文角色名（如果无法确定，留空）
-       - "cn_name_status": 中文名状态（官方译名/推断译名/未知）
-       - "en_name": 英文角色名（去掉下划线，首字母大写）
-       - "source_cn": 作品中文名（如果无法确定，留空）
-       - "source_en": 作品英文名
-       - "source_name_status": 作品名状态（官方译名/推断译名/未知）
+    for round_index in range(1 + max(0, config.llm_repair_rounds)):
+        if round_index > 0:
+            stats.llm_repair_requests += 1
+            print(f"\n🔁 补全第 {round_index} 轮: 重新提交 {len(pending)} 个缺失/无效标签")
+        
+        # 按 tag 对比请求与返回，只接受属于本轮请求且校验通过的条目
+        pending_tags = {item['tag'] for item in pending}
+        accepted_before = len(translated)
+        response_info = {}
+        if round_index == 0 and prefetched is not None:
+            # 首轮结果已由批处理任务取得（token 用量由调用方统计）
+            try:
+                items = parse_items(prefetched, pending) or []
+            except json.JSONDecodeError:
+                items = []
+            quarantined = []
+        else:
+            items, quarantined = await request_with_bisection(
+                session, pending, config, sem_llm, stats, response_info, _accept
+            )
+        for item in items or []:
+            _accept(item)
+        valid = len(translated) - accepted_before
+        usage = stats.llm_token_usage.get(usage_key(config))
+        if usage and response_info:
+            usage['items'] += valid
+        
+        if 'first_item_latency' in response_info:
+            stats.llm_stream_requests += 1
+            stats.llm_first_item_seconds += response_info['first_item_latency']
+            stats.llm_stream_seconds += response_info['latency']
+        
+        if round_index == 0:
+            # 只有首轮是按当前批大小提交的，补全小批次不参与批大小调整
+            if batch_sizer:
+                batch_sizer.record(
+                    len(pending), valid,
+                    response_info.get('latency', 0.0),
+                    response_info.get('finish_reason') == 'length',
+                    (response_info.get('usage') or {}).get('completion_tokens')
+                )
+        else:
+            stats.llm_repaired += valid
+        
+        # 被隔离的标签不再参与后续补全
+        quarantined_tags = {item['tag'] for item in quarantined}
+        pending = [item for item in pending if item['tag'] not in translated and item['tag'] not in quarantined_tags]
+        failed.extend(item for item in quarantined if item['tag'] not in translated)
+        if not pending or items is None:
+            # 全部完成，或接口重试后仍然失败（不再追加请求）
+            break
+    
+    failed.extend(pending)
+    if failed:
+        print(f"\n⚠️ 警告: {len(failed)}/{len(batch_data)} 个标签未得到有效翻译，使用默认值")
+    
+    results = [translated.get(data['tag']) or default_item(data) for data in batch_data]
+    
+    # 写入翻译缓存，下次运行无需再次请求
+    if translation_cache and translated:
+        try:
+            translation_cache.put_many(list(translated.values()))
+        except Exception as e:
+            print(f"\n⚠️ 翻译缓存写入失败: {e}")
+    
+    # 统计成功/失败的角色数量
+    stats.llm_success += len(translated)
+    stats.llm_fail += len(failed)
+    return results
 
-    3. **括号处理规则**：
-       如果 tag 中包含括号，例如 character_(xxx)，请按以下规则处理：
-       
-       - 如果是**服装/形态/版本**描述（如 1st_costume, 2nd_costume, summer, winter, casual, maid, racing, idol 等）：
-         * 在 cn_name 中添加对应的中文描述，格式：角色名（描述）
-         * 在 en_name 中也保留括号，格式：Character Name (Description)
-         例如：inuyama_tamaki_(1st_costume) → cn_name: "犬山玉姬（第一套服装）", en_name: "Inuyama Tamaki (1st Costume)"
-       
-       - 如果是**作品名称**（用于区分同名角色，如 touhou, fate, pokemon 等）：
-         * cn_name 和 en_name **不包含括号和作品名**，只写角色名
-         * 将括号内的作品名提取到 source_cn 和 source_en
-         例如：ringo_(touhou) → cn_name: "铃瑚", en_name: "Ringo", source_cn: "东方Project", source_en: "Touhou Project"
-         例如：sakura_(cardcaptor_sakura) → cn_name: "小樱", en_name: "Sakura", source_cn: "魔卡少女樱", source_en: "Cardcaptor Sakura"
 
+def needs_escalation(item: Dict) -> bool:
+    """级联模式下条目是否需要交给强模型：未知、中文名为空或校验不通过"""
+    return (
+        not validate_item(item, {item.get('tag')})
+        or item['cn_name_status'] == '未知'
+        or not item['cn_name'].strip()
+    )
 
-    4. 严禁使用 Markdown 代码块包裹，直接返回 JSON 数组
 
-    请翻译以上 {len(batch_data)} 个标签，确保返回数量正确。
+def merge_tier_results(cheap: Dict, strong: Dict) -> Dict:
     """
+    合并两个层级对同一标签的翻译结果
     
-    content = await call_llm_custom(session, prompt, config, sem_llm)
+    强模型结果有效时以其为准，其中为空的名称字段用弱模型的有效结果补齐（连同对应的状态）；
+    强模型结果无效时保留弱模型结果
+    """
+    if not validate_item(strong, {strong.get('tag')}):
+        return cheap
+    if not validate_item(cheap, {cheap.get('tag')}):
+        return strong
     
-    # 构造默认返回值，防止 LLM 挂了导致整个批次丢失
-    default_res = [
-        {
-            "tag": item['tag'], 
-            "cn_name": "", 
-            "cn_name_status": "",  # LLM错误时留空
-            "en_name": item['tag'], 
-            "source_cn": "", 
-            "source_en": "",
-            "source_name_status": "",  # LLM错误时留空
-            "color": item['color'],
-            "content": item['content']
-        } 
-        for item in batch_data
-    ]
+    merged = dict(strong)
+    for field, status_field in (('cn_name', 'cn_name_status'), ('source_cn', 'source_name_status')):
+        if not merged[field].strip() and cheap[field].strip():
+            merged[field] = cheap[field]
+            merged[status_field] = cheap[status_field]
+    if not merged['source_en'].strip():
+        merged['source_en'] = cheap['source_en']
+    return merged
 
-    if not content:
-        print("\n⚠️ LLM 返回内容为空")
-        stats.llm_fail += len(batch_data)
-        return default_res
 
-    try:
-        clean_content = content.replace("```json", "").replace("```", "").strip()
-        result = json.loads(clean_content)
-        
-        # 兼容 LLM 可能返回 {"items": [...]} 或直接 [...] 的情况
-        items = None
-        if isinstance(result, dict):
-            for val in result.values():
-                if isinstance(val, list): 
-                    items = val
-                    break
-        elif isinstance(result, list):
-            items = result
-        
-        if not items:
-            print("\n⚠️ 无法从 LLM 返回中提取列表数据")
-            stats.llm_fail += len(batch_data)
-            return default_res
-        
-        # 验证并处理 LLM 返回数量问题
-        if len(items) != len(batch_data):
-            if len(items) > len(batch_data):
-                # 返回数量过多，截断
-                print(f"\n⚠️ 警告: LLM 返回 {len(items)} 项，超过批次大小 {len(batch_data)}，截断多余项")
-                items = items[:len(batch_data)]
-            else:
-                # 返回数量不足
-                missing_count = len(batch_data) - len(items)
-                print(f"\n⚠️ 警告: LLM 返回 {len(items)} 项，缺少 {missing_count} 项")
-                
-                # 如果缺失过多（超过50%），认为失败
-                if len(items) < len(batch_data) * 0.5:
-                    print(f"  → 返回数量太少，标记为失败")
-                    stats.llm_fail += len(batch_data)
-                    return default_res
-                else:
-                    # 只缺少一点，补充默认值
-                    print(f"  → 补充缺失的 {missing_count} 项")
-                    
-                    # 获取已返回的 tag
-                    returned_tags = {item.get('tag') for item in items}
-                    
-                    # 为缺失的条目添加默认值
-                    for item in batch_data:
-                        if item['tag'] not in returned_tags:
-                            items.append({
-                                "tag": item['tag'],
-                                "cn_name": "",
-                                "cn_name_status": "",
-                                "en_name": item['tag'],
-                                "source_cn": "",
-                                "source_en": "",
-                                "color": item['color'],
-                                "content": item['content']
-                            })
-                    
-                    # 部分成功，部分失败
-                    stats.llm_success += len(items) - missing_count
-                    stats.llm_fail += missing_count
-        
-        # 将 color 和 content 字段合并到 LLM 返回的结果中
-        tag_to_data = {item['tag']: item for item in batch_data}
-        for item in items:
-            tag = item.get('tag')
-            if tag and tag in tag_to_data:
-                item['color'] = tag_to_data[tag]['color']
-                item['content'] = tag_to_data[tag]['content']
-            
-            # 规范化作品名称
-            source_en = item.get('source_en', '')
-            source_cn = item.get('source_cn', '')
-            normalized_en, normalized_cn = normalize_source_names(source_en, source_cn, source_name_mapping)
-            item['source_en'] = normalized_en
-            item['source_cn'] = normalized_cn
-        
-        # 统计成功的角色数量
-        stats.llm_success += len(items)
-        return items
-    except Exception as e:
-        print(f"\n❌ LLM 数据解析异常: {e}")
-        stats.llm_fail += len(batch_data)
-        return default_res
+async def translate_cascade(
+    session: aiohttp.ClientSession,
+    batch_data: List[Dict],
+    config: Config,
+    sem_llm: asyncio.Semaphore,
+    stats: Stats,
+    source_name_mapping: Optional[Dict],
+    translation_cache: Optional[TranslationCache] = None,
+    batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    on_item: Optional[Callable[[Dict], None]] = None
+) -> List[Dict]:
+    """
+    级联翻译：弱模型（LLM_MODEL）先翻译整批，未知、中文名为空或校验不通过的条目
+    再组成小批次交给强模型（LLM_STRONG_MODEL），结果按标签合并回同一条记录
+    
+    只缓存通过校验的最终结果：弱模型确定（不需要升级）的条目，以及强模型结果通过校验后合并的条目；
+    等待升级的弱模型结果和强模型结果无效时保留的弱模型结果不写入缓存，否则下次运行命中缓存后不再升级。
+    缓存键为翻译缓存的 (tag, LLM_MODEL, 提示词版本)
+    
+    参数与 translate_batch_task 相同
+    
+    Returns:
+        翻译后的数据列表（与 batch_data 顺序一致）
+    """
+    def _on_cheap(item):
+        # 弱模型已确定的条目立即进入后续阶段，需要升级的条目等强模型结果
+        if on_item and not needs_escalation(item):
+            on_item(item)
+    
+    def _cache(items):
+        if translation_cache and items:
+            try:
+                translation_cache.put_many(items)
+            except Exception as e:
+                print(f"\n⚠️ 翻译缓存写入失败: {e}")
+    
+    start = time.perf_counter()
+    cheap_results = await translate_batch_task(
+        session, batch_data, config, sem_llm, stats, source_name_mapping,
+        None, batch_sizer, _on_cheap
+    )
+    cheap_tier = stats.llm_tiers.setdefault('cheap', {'items': 0, 'seconds': 0.0})
+    cheap_tier['items'] += len(batch_data)
+    cheap_tier['seconds'] += time.perf_counter() - start
+    
+    escalate = [data for data, item in zip(batch_data, cheap_results) if needs_escalation(item)]
+    # 弱模型确定的条目已是最终结果（needs_escalation 包含校验不通过的情况）
+    _cache([item for item in cheap_results if not needs_escalation(item)])
+    if not escalate:
+        return cheap_results
+    
+    start = time.perf_counter()
+    strong_results = await translate_batch_task(
+        session, escalate, config.strong_tier_config(), sem_llm, stats, source_name_mapping
+    )
+    strong_tier = stats.llm_tiers.setdefault('strong', {'items': 0, 'seconds': 0.0})
+    strong_tier['items'] += len(escalate)
+    strong_tier['seconds'] += time.perf_counter() - start
+    
+    # 成功/失败按最终结果统计：撤销强模型的计数，弱模型失败而强模型成功的条目改记为成功
+    strong_by_tag = {item['tag']: item for item in strong_results}
+    strong_valid = sum(1 for item in strong_results if validate_item(item, {item['tag']}))
+    stats.llm_success -= strong_valid
+    stats.llm_fail -= len(strong_results) - strong_valid
+    
+    results = []
+    merged_items = []
+    for item in cheap_results:
+        strong = strong_by_tag.get(item['tag'])
+        if strong is None:
+            results.append(item)
+            continue
+        merged = merge_tier_results(item, strong)
+        if merged is not item and not validate_item(item, {item['tag']}):
+            stats.llm_success += 1
+            stats.llm_fail -= 1
+        if merged is not item:
+            merged_items.append(merged)
+            # 强模型同样返回"未知"时不算改进
+            if not needs_escalation(merged):
+                stats.llm_escalation_improved += 1
+        if on_item:
+            on_item(merged)
+        results.append(merged)
+    
+    # 只写入强模型结果通过校验后合并的条目（按 LLM_MODEL + 提示词版本为键）；
+    # 强模型结果无效时保留的弱模型结果不写入，下次运行仍会升级
+    _cache(merged_items)
+    
+    return results
@@ -0,0 +1,398 @@
+"""
+LLM 批处理模块 - 通过 OpenAI 兼容的批处理接口（/files、/batches）离线翻译
+
+全量重建时把所有提示词写入 JSONL 提交文件，上传后创建批处理任务并轮询，
+完成后按实时模式相同的解析、校验和规范化流程写入翻译缓存，
+之后的流水线直接命中缓存，只做搜图；批处理未能翻译的标签由实时模式补齐。
+
+任务状态保存在状态文件中，中断后再次运行会继续轮询同一个任务，不会重复提交
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .config import Config
+from .stats import Stats
+from .llm import (
+    get_prompt_version,
+    build_prompt,
+    build_request_body,
+    validate_item,
+    record_usage,
+    translate_batch_task,
+)
+from .llm_cache import TranslationCache
+from .rate_limit import throttle, note_response
+from .data_processor import iter_batches
+
+
+# 批处理任务的终止状态
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# 下载结果文件时单次读取的超时秒数
+DOWNLOAD_READ_TIMEOUT = 90
+
+
+def get_batch_api_base(config: Config) -> str:
+    """批处理接口根地址：LLM_BATCH_API_URL，未设置时由 LLM_API_URL 去掉 /chat/completions 得到"""
+    if config.llm_batch_api_url:
+        return config.llm_batch_api_url.rstrip('/')
+    return config.llm_api_url.rstrip('/').rsplit('/chat/completions', 1)[0]
+
+
+def get_batch_input_file(state_file: str) -> str:
+    """批处理提交文件路径（与状态文件同目录）"""
+    return os.path.splitext(state_file)[0] + '_input.jsonl'
+
+
+def load_batch_state(state_file: str) -> Optional[Dict]:
+    """读取未完成的批处理任务状态，不存在或无效时返回 None"""
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ 批处理任务状态无效，忽略: {e}")
+        return None
+
+
+def save_batch_state(state_file: str, state: Dict):
+    """原子写入批处理任务状态"""
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_file, state_file)
+
+
+def get_batch_output_file(state_file: str) -> str:
+    """批处理结果文件的本地路径（与状态文件同目录）"""
+    return os.path.splitext(state_file)[0] + '_output.jsonl'
+
+
+def clear_batch_state(state_file: str):
+    """删除批处理任务状态、提交文件和结果文件"""
+    for path in (state_file, get_batch_input_file(state_file), get_batch_output_file(state_file)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def render_batch_file(
+    items: Iterable[Dict],
+    config: Config,
+    batch_size: int,
+    input_file: str
+) -> Dict[str, List[str]]:
+    """
+    把待翻译标签按批渲染为 JSONL 提交文件
+
+    Args:
+        items: 包含 "tag" 字段的源数据（可以是生成器）
+        config: 配置对象
+        batch_size: 每个请求包含的标签数量
+        input_file: 提交文件路径
+
+    Returns:
+        {custom_id: 该请求的标签列表}（紧凑格式按序号还原时需要）
+    """
+    endpoint = urlparse(config.llm_api_url).path
+    requests = {}
+    os.makedirs(os.path.dirname(input_file), exist_ok=True)
+    with open(input_file, 'w', encoding='utf-8') as f:
+        for index, batch in enumerate(iter_batches(items, batch_size)):
+            custom_id = f"batch-{index}"
+            requests[custom_id] = [item['tag'] for item in batch]
+            line = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": endpoint,
+                "body": build_request_body(build_prompt(batch, config), config),
+            }
+            f.write(json.dumps(line, ensure_ascii=False) + '\n')
+    return requests
+
+
+async def _api_request(
+    session: aiohttp.ClientSession,
+    config: Config,
+    method: str,
+    path: str,
+    **kwargs
+):
+    """
+    请求批处理接口
+
+    Returns:
+        JSON 响应
+
+    Raises:
+        aiohttp.ClientResponseError: 非 2xx 响应
+    """
+    url = f"{get_batch_api_base(config)}{path}"
+    headers = {"Authorization": f"Bearer {config.llm_api_key}"}
+    await throttle(url)
+    async with session.request(method, url, headers=headers, **kwargs) as resp:
+        note_response(url, resp.status, resp.headers)
+        resp.raise_for_status()
+        return await resp.json()
+
+
+async def submit_batch_job(
+    session: aiohttp.ClientSession,
+    config: Config,
+    input_file: str
+) -> Dict:
+    """
+    上传提交文件并创建批处理任务
+
+    Returns:
+        批处理任务对象（包含 id、status、input_file_id）
+    """
+    with open(input_file, 'rb') as f:
+        form = aiohttp.FormData()
+        form.add_field('purpose', 'batch')
+        form.add_field('file', f, filename=os.path.basename(input_file), content_type='application/jsonl')
+        uploaded = await _api_request(session, config, 'POST', '/files', data=form)
+    print(f"📤 已上传批处理提交文件: {uploaded['id']}")
+
+    return await _api_request(session, config, 'POST', '/batches', json={
+        "input_file_id": uploaded['id'],
+        "endpoint": urlparse(config.llm_api_url).path,
+        "completion_window": config.llm_batch_completion_window,
+    })
+
+
+async def wait_batch_job(
+    session: aiohttp.ClientSession,
+    config: Config,
+    state: Dict,
+    state_file: str
+) -> Dict:
+    """
+    轮询批处理任务直到终止状态，每次轮询后更新状态文件
+
+    轮询请求失败时只打印警告并继续等待
+
+    Returns:
+        终止状态的批处理任务对象
+    """
+    last_status = None
+    while True:
+        try:
+            job = await _api_request(session, config, 'GET', f"/batches/{state['batch_id']}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"⚠️ 查询批处理任务失败: {e}，{config.llm_batch_poll_interval} 秒后重试")
+            await asyncio.sleep(config.llm_batch_poll_interval)
+            continue
+
+        status = job.get('status')
+        counts = job.get('request_counts') or {}
+        if status != last_status:
+            print(f"⏳ 批处理任务 {state['batch_id']}: {status}"
+                  f"（完成 {counts.get('completed', 0)}/{counts.get('total', len(state['requests']))}，"
+                  f"失败 {counts.get('failed', 0)}）")
+            last_status = status
+        state['status'] = status
+        save_batch_state(state_file, state)
+
+        if status in TERMINAL_STATUSES:
+            return job
+        await asyncio.sleep(config.llm_batch_poll_interval)
+
+
+async def download_batch_output(
+    session: aiohttp.ClientSession,
+    config: Config,
+    file_id: str,
+    output_file: str
+):
+    """
+    流式下载批处理结果文件到本地（不把整个文件读入内存）
+
+    结果文件可能很大，下载不受会话总超时限制，只限制单次读取的等待时间
+    """
+    url = f"{get_batch_api_base(config)}/files/{file_id}/content"
+    headers = {"Authorization": f"Bearer {config.llm_api_key}"}
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=DOWNLOAD_READ_TIMEOUT)
+    tmp_file = output_file + '.tmp'
+    await throttle(url)
+    async with session.get(url, headers=headers, timeout=timeout) as resp:
+        note_response(url, resp.status, resp.headers)
+        resp.raise_for_status()
+        with open(tmp_file, 'wb') as f:
+            async for chunk in resp.content.iter_chunked(65536):
+                f.write(chunk)
+    os.replace(tmp_file, output_file)
+
+
+def iter_batch_output(output_file: str) -> Iterator[Tuple[str, Optional[str], Dict]]:
+    """
+    逐行读取批处理结果文件
+
+    Yields:
+        (custom_id, LLM 返回内容, 响应体)；请求失败或响应格式错误时内容为 None
+    """
+    with open(output_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            response = record.get('response') or {}
+            body = response.get('body') or {}
+            content = None
+            if response.get('status_code') == 200:
+                try:
+                    content = body['choices'][0]['message']['content']
+                except (KeyError, IndexError, TypeError):
+                    pass
+            yield record.get('custom_id'), content, body
+
+
+async def ingest_batch_output(
+    session: aiohttp.ClientSession,
+    output_file: str,
+    requests: Dict[str, List[str]],
+    config: Config,
+    sem_llm: asyncio.Semaphore,
+    translation_cache: TranslationCache,
+    source_name_mapping: Optional[Dict],
+    stats: Stats
+) -> Tuple[int, int]:
+    """
+    逐行读取批处理结果，按实时模式相同的流程（translate_batch_task）解析、校验、去重、规范化后写入翻译缓存
+
+    每个请求的返回内容作为首轮结果，缺失或无效的标签照常进入补全轮次（实时请求）；
+    请求失败的标签不写入缓存，由之后的流水线以实时模式翻译
+
+    Args:
+        session: aiohttp 会话
+        output_file: 已下载的结果文件（JSONL）
+        requests: {custom_id: 标签列表}
+        config: 配置对象
+        sem_llm: LLM 并发信号量（补全轮次使用）
+        translation_cache: 翻译缓存
+        source_name_mapping: 作品名称映射表
+        stats: 统计对象
+
+    Returns:
+        (写入缓存的条目数, 未得到有效翻译的标签数)
+    """
+    mode = f"batch/{config.llm_response_format}"
+    answered = set()
+    tasks = set()
+
+    async def _ingest(tags: List[str], content: str):
+        batch_data = [{'tag': tag, 'color': None, 'content': ''} for tag in tags]
+        results = await translate_batch_task(
+            session, batch_data, config, sem_llm, stats, source_name_mapping,
+            translation_cache, prefetched=content
+        )
+        valid = [item['tag'] for item in results if validate_item(item, set(tags))]
+        # 批处理结果只写入缓存，成功/失败由之后的流水线统计
+        stats.llm_success -= len(valid)
+        stats.llm_fail -= len(results) - len(valid)
+        stats.llm_token_usage[mode]['items'] += len(valid)
+        answered.update(valid)
+
+    for custom_id, content, body in iter_batch_output(output_file):
+        tags = requests.get(custom_id)
+        if not tags or content is None:
+            continue
+        record_usage(stats, mode, body)
+        tasks.add(asyncio.create_task(_ingest(tags, content)))
+        if len(tasks) >= max(1, config.llm_concurrency) * 2:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+
+    if tasks:
+        await asyncio.gather(*tasks)
+
+    total = sum(len(tags) for tags in requests.values())
+    return len(answered), total - len(answered)
+
+
+async def run_batch_job(
+    session: aiohttp.ClientSession,
+    items: Iterable[Dict],
+    config: Config,
+    sem_llm: asyncio.Semaphore,
+    translation_cache: TranslationCache,
+    source_name_mapping: Optional[Dict],
+    stats: Stats,
+    batch_size: int
+) -> bool:
+    """
+    批处理模式主流程：提交（或继续上次未完成的）批处理任务，等待完成后写入翻译缓存
+
+    Args:
+        session: aiohttp 会话
+        items: 需要翻译的源数据（只需 "tag" 字段），继续上次任务时忽略
+        config: 配置对象
+        sem_llm: LLM 并发信号量（补全轮次使用）
+        translation_cache: 翻译缓存
+        source_name_mapping: 作品名称映射表
+        stats: 统计对象
+        batch_size: 每个请求包含的标签数量
+
+    Returns:
+        是否得到了结果（任务失败且没有任何输出时返回 False）
+    """
+    state_file = config.llm_batch_state_file
+    state = load_batch_state(state_file)
+
+    prompt_version = get_prompt_version(config)
+    if state and (state.get('model') != config.llm_model or state.get('prompt_version') != prompt_version):
+        print(f"⚠️ 上次的批处理任务 {state.get('batch_id')} 使用了不同的模型或提示词版本，不再继续")
+        state = None
+
+    if state:
+        print(f"🔁 继续上次的批处理任务: {state['batch_id']}（{len(state['requests'])} 个请求）")
+    else:
+        input_file = get_batch_input_file(state_file)
+        requests = render_batch_file(items, config, batch_size, input_file)
+        if not requests:
+            print("💾 所有标签均已在翻译缓存中，无需提交批处理任务")
+            return True
+        print(f"📝 已生成批处理提交文件: {input_file}（{len(requests)} 个请求）")
+
+        job = await submit_batch_job(session, config, input_file)
+        state = {
+            'batch_id': job['id'],
+            'status': job.get('status'),
+            'model': config.llm_model,
+            'prompt_version': prompt_version,
+            'created_at': time.time(),
+            'requests': requests,
+        }
+        save_batch_state(state_file, state)
+        print(f"🚀 已创建批处理任务: {job['id']}")
+
+    job = await wait_batch_job(session, config, state, state_file)
+
+    ingested, failed = 0, sum(len(tags) for tags in state['requests'].values())
+    if job.get('output_file_id'):
+        # 任务过期或被取消时也可能有部分结果
+        output_file = get_batch_output_file(state_file)
+        await download_batch_output(session, config, job['output_file_id'], output_file)
+        ingested, failed = await ingest_batch_output(
+            session, output_file, state['requests'], config, sem_llm,
+            translation_cache, source_name_mapping, stats
+        )
+
+    stats.llm_batch_ingested += ingested
+    stats.llm_batch_failed += failed
+    print(f"📥 批处理任务 {state['batch_id']} {job.get('status')}: 写入缓存 {ingested} 个，未翻译 {failed} 个")
+
+    clear_batch_state(state_file)
+    return ingested > 0 or job.get('status') == 'completed'
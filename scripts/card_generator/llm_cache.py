@@ -0,0 +1,144 @@
+"""
+LLM 翻译缓存模块 - 基于 SQLite 的持久化翻译结果缓存
+
+缓存键为 (tag, 模型, 提示词版本)，提示词模板、响应格式或模型变化后旧结果自动失效。
+写入在事件循环中执行，累计 commit_every 行后才提交一次事务，避免每个批次都等待磁盘
+"""
+
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+# 缓存中保存的 LLM 字段（color/content 来自源数据，不进入缓存）
+CACHED_FIELDS = (
+    'cn_name',
+    'cn_name_status',
+    'en_name',
+    'source_cn',
+    'source_en',
+    'source_name_status',
+)
+
+
+class TranslationCache:
+    """LLM 翻译结果缓存"""
+
+    def __init__(
+        self,
+        db_file: str,
+        model: Optional[str],
+        prompt_version: str,
+        ttl_days: float = 0,
+        commit_every: int = 200
+    ):
+        """
+        Args:
+            db_file: SQLite 数据库文件路径
+            model: LLM 模型名称
+            prompt_version: 提示词版本（模板和响应格式的哈希）
+            ttl_days: 缓存有效期（天），0 表示永不过期
+            commit_every: 累计写入多少行后提交一次事务（未提交的行在 close 时提交）
+        """
+        self.db_file = db_file
+        self.model = model or ''
+        self.prompt_version = prompt_version
+        self.ttl_seconds = ttl_days * 86400 if ttl_days and ttl_days > 0 else 0
+        self.commit_every = max(1, commit_every)
+        self._uncommitted = 0
+
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self._conn = sqlite3.connect(db_file)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                tag TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (tag, model, prompt_version)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get_many(self, tags: Iterable[str]) -> Dict[str, Dict]:
+        """
+        批量查询缓存
+
+        Args:
+            tags: 角色标签列表
+
+        Returns:
+            {tag: 翻译字段字典}，只包含命中且未过期的条目
+        """
+        tags = list(tags)
+        if not tags:
+            return {}
+
+        min_time = time.time() - self.ttl_seconds if self.ttl_seconds else 0
+        results = {}
+
+        # SQLite 单条语句的参数数量有限制，分段查询
+        for i in range(0, len(tags), 500):
+            chunk = tags[i : i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._conn.execute(
+                f"""
+                SELECT tag, result FROM translations
+                WHERE model = ? AND prompt_version = ? AND updated_at >= ?
+                AND tag IN ({placeholders})
+                """,
+                [self.model, self.prompt_version, min_time, *chunk]
+            )
+            for tag, result in rows:
+                try:
+                    results[tag] = json.loads(result)
+                except json.JSONDecodeError:
+                    continue
+
+        return results
+
+    def put_many(self, items: List[Dict]):
+        """
+        写入翻译结果（只缓存 cn_name 非空的条目，未能翻译的条目下次仍会请求 LLM）
+
+        Args:
+            items: LLM 返回并规范化后的数据列表
+        """
+        now = time.time()
+        rows = []
+        for item in items:
+            tag = item.get('tag')
+            cn_name = item.get('cn_name')
+            if not tag or not cn_name or not str(cn_name).strip():
+                continue
+            result = {field: item.get(field, '') for field in CACHED_FIELDS}
+            rows.append((tag, self.model, self.prompt_version, json.dumps(result, ensure_ascii=False), now))
+
+        if not rows:
+            return
+
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        self._uncommitted += len(rows)
+        if self._uncommitted >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        """提交未提交的写入"""
+        if self._uncommitted:
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        """提交未提交的写入并关闭数据库连接"""
+        self.flush()
+        self._conn.close()
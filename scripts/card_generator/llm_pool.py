@@ -0,0 +1,294 @@
+"""
+LLM 端点池模块 - 多端点（多个 Key / 服务商）负载均衡、对冲请求和故障端点临时移除
+
+每个端点有独立的并发限制和请求速率；请求路由到负载最低的健康端点，
+请求耗时超过该端点历史延迟的指定分位数时，向另一个端点发送重复请求（对冲），先完成者生效。
+连续失败的端点在一段时间内不参与路由
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from .concurrency import AIMDLimiter
+from .rate_limit import TokenBucket
+
+
+class LLMEndpoint:
+    """单个 LLM 端点及其健康状态"""
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        api_key: str,
+        model: Optional[str],
+        concurrency: int,
+        max_concurrency: int,
+        rps: float = 0,
+        burst: int = 1,
+        adaptive: bool = True
+    ):
+        """
+        Args:
+            name: 端点名称（用于统计和日志）
+            url: chat/completions 接口地址
+            api_key: API Key
+            model: 模型名称，None 时使用 LLM_MODEL
+            concurrency: 并发数（自适应时为初始值）
+            max_concurrency: 自适应并发上限
+            rps: 每秒请求数，0 表示不限速
+            burst: 允许的突发请求数
+            adaptive: 是否使用 AIMD 自适应并发
+        """
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.limiter = (
+            AIMDLimiter(name, self.concurrency, 1, max(self.concurrency, max_concurrency))
+            if adaptive else asyncio.Semaphore(self.concurrency)
+        )
+        self.bucket = TokenBucket(name, rps, burst)
+
+        # 已分配但未完成的请求数（包括排队等待并发名额的），用于负载均衡
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.latencies: Deque[float] = deque(maxlen=200)
+
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.ejections = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def load(self) -> float:
+        """当前负载（分配的请求数 / 并发上限）"""
+        limit = self.limiter.current_limit if isinstance(self.limiter, AIMDLimiter) else self.concurrency
+        return self.in_flight / max(1, limit)
+
+    def is_healthy(self, now: float) -> bool:
+        """端点当前是否参与路由"""
+        return now >= self.ejected_until
+
+    def latency_percentile(self, percentile: float, min_samples: int) -> Optional[float]:
+        """历史成功请求延迟的分位数，样本不足时返回 None"""
+        if len(self.latencies) < max(1, min_samples):
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+    def release(self):
+        """请求结束（包括开始执行前被取消）时释放 pick 占用的请求计数"""
+        self.in_flight -= 1
+
+    def record_success(self, latency: float):
+        """记录一次成功请求"""
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.latencies.append(latency)
+
+    def record_failure(self, eject_after: int, eject_seconds: float):
+        """记录一次失败请求，连续失败达到阈值时临时移除"""
+        self.failures += 1
+        now = time.monotonic()
+        if not self.is_healthy(now):
+            # 移除前已发出的请求陆续失败，不重复移除
+            return
+        self.consecutive_failures += 1
+        if eject_after > 0 and self.consecutive_failures >= eject_after:
+            self.ejected_until = now + eject_seconds
+            self.consecutive_failures = 0
+            self.ejections += 1
+            print(f"\n🚫 LLM 端点 {self.name} 连续失败 {eject_after} 次，暂停使用 {eject_seconds} 秒")
+
+    def summary(self) -> Dict:
+        """返回端点状态摘要"""
+        p50 = self.latency_percentile(50, 1)
+        p95 = self.latency_percentile(95, 1)
+        return {
+            'requests': self.requests,
+            'successes': self.successes,
+            'failures': self.failures,
+            'ejections': self.ejections,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'p50': round(p50, 2) if p50 is not None else None,
+            'p95': round(p95, 2) if p95 is not None else None,
+        }
+
+
+class LLMEndpointPool:
+    """LLM 端点池"""
+
+    def __init__(
+        self,
+        endpoints: List[LLMEndpoint],
+        hedge_percentile: float = 0,
+        hedge_min_samples: int = 20,
+        eject_after_failures: int = 3,
+        eject_seconds: float = 60,
+        default_model: Optional[str] = None
+    ):
+        """
+        Args:
+            endpoints: 端点列表
+            hedge_percentile: 请求耗时超过该分位数时发送对冲请求，0 表示不对冲
+            hedge_min_samples: 端点至少有多少个延迟样本后才启用对冲
+            eject_after_failures: 连续失败多少次后临时移除端点，0 表示不移除
+            eject_seconds: 临时移除的时长（秒）
+            default_model: 默认模型（LLM_MODEL），只有请求该模型时才换成端点自己的模型
+        """
+        self.endpoints = endpoints
+        self.default_model = default_model
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+
+    def serves(self, endpoint: LLMEndpoint, model: Optional[str]) -> bool:
+        """端点能否处理请求该模型的请求（配置了自己模型的端点只处理默认模型的请求）"""
+        return not endpoint.model or model == self.default_model
+
+    def can_serve(self, model: Optional[str]) -> bool:
+        """是否有端点能处理请求该模型的请求"""
+        return any(self.serves(ep, model) for ep in self.endpoints)
+
+    def request_model(self, endpoint: LLMEndpoint, model: Optional[str]) -> Optional[str]:
+        """发往端点的模型名：请求默认模型时换成端点自己的模型，其他模型（如级联的强模型）保持不变"""
+        if endpoint.model and model == self.default_model:
+            return endpoint.model
+        return model
+
+    def pick(
+        self,
+        exclude: Optional[LLMEndpoint] = None,
+        model: Optional[str] = None
+    ) -> Optional[LLMEndpoint]:
+        """
+        选择负载最低的健康端点并占用一个请求计数（请求结束后调用方需调用 endpoint.release()）
+
+        同一时刻发起的多个请求依次选择，占用计数保证它们分散到不同端点
+
+        Args:
+            exclude: 排除的端点（对冲请求不发往同一个端点）
+            model: 请求的模型，只在能处理该模型的端点中选择
+
+        Returns:
+            端点；所有端点都被移除时返回最早恢复的端点，没有可选的端点时返回 None
+        """
+        candidates = [ep for ep in self.endpoints if ep is not exclude and self.serves(ep, model)]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        healthy = [ep for ep in candidates if ep.is_healthy(now)]
+        if healthy:
+            endpoint = min(healthy, key=lambda ep: (ep.load, ep.in_flight))
+        elif exclude is None:
+            endpoint = min(candidates, key=lambda ep: ep.ejected_until)
+        else:
+            return None
+        endpoint.in_flight += 1
+        endpoint.requests += 1
+        return endpoint
+
+    def hedge_delay(self, endpoint: LLMEndpoint) -> Optional[float]:
+        """发送对冲请求前的等待时间，不对冲时返回 None"""
+        if self.hedge_percentile <= 0 or len(self.endpoints) < 2:
+            return None
+        return endpoint.latency_percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    def summary(self) -> Dict[str, Dict]:
+        """返回所有端点的状态摘要"""
+        return {ep.name: ep.summary() for ep in self.endpoints}
+
+
+def build_endpoint_pool(
+    config,
+    initial_concurrency: int,
+    adaptive: bool
+) -> Optional[LLMEndpointPool]:
+    """
+    根据 config.json 的 llm_pool 段创建端点池
+
+    默认端点（LLM_API_URL/LLM_API_KEY/LLM_MODEL）排在第一位（include_default 为 false 时不加入），
+    其余端点的 API Key 从 api_key_env 指定的环境变量读取，不写在配置文件中。
+    环境变量未配置或为空时，只有地址与 LLM_API_URL 相同的端点沿用 LLM_API_KEY，
+    其他端点跳过（不把默认端点的 Key 发给别的服务商）
+
+    Args:
+        config: 配置对象
+        initial_concurrency: 默认端点的并发数
+        adaptive: 是否使用 AIMD 自适应并发
+
+    Returns:
+        端点池；没有配置额外端点（或额外端点都被跳过）时返回 None（使用单端点模式）
+    """
+    pool_config = config.llm_pool or {}
+    entries = pool_config.get('endpoints') or []
+    if not entries:
+        return None
+
+    endpoints = []
+    if pool_config.get('include_default', True):
+        endpoints.append(LLMEndpoint(
+            'default', config.llm_api_url, config.llm_api_key, None,
+            initial_concurrency, config.llm_max_concurrency, adaptive=adaptive
+        ))
+
+    extra = 0
+    for index, entry in enumerate(entries):
+        name = entry.get('name') or f"endpoint-{index + 1}"
+        env_name = entry.get('api_key_env') or ''
+        api_key = os.getenv(env_name, '') if env_name else ''
+        if not api_key:
+            if entry['url'] != config.llm_api_url:
+                print(f"⚠️ LLM 端点 {name} 的 API Key 环境变量（api_key_env: {env_name or '未配置'}）为空，已跳过")
+                continue
+            api_key = config.llm_api_key
+        extra += 1
+        endpoints.append(LLMEndpoint(
+            name,
+            entry['url'],
+            api_key,
+            entry.get('model'),
+            entry.get('concurrency', initial_concurrency),
+            entry.get('max_concurrency', config.llm_max_concurrency),
+            entry.get('rps', 0),
+            entry.get('burst', 1),
+            adaptive
+        ))
+
+    if not extra:
+        return None
+
+    return LLMEndpointPool(
+        endpoints,
+        pool_config.get('hedge_percentile', 0),
+        pool_config.get('hedge_min_samples', 20),
+        pool_config.get('eject_after_failures', 3),
+        pool_config.get('eject_seconds', 60),
+        config.llm_model
+    )
+
+
+# 全局端点池（未设置时使用单端点模式）
+_endpoint_pool: Optional[LLMEndpointPool] = None
+
+
+def set_endpoint_pool(pool: Optional[LLMEndpointPool]):
+    """设置全局端点池，传入 None 恢复单端点模式"""
+    global _endpoint_pool
+    _endpoint_pool = pool
+
+
+def get_endpoint_pool() -> Optional[LLMEndpointPool]:
+    """获取全局端点池"""
+    return _endpoint_pool
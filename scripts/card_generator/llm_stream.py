@@ -0,0 +1,121 @@
+"""
+LLM 流式响应模块 - SSE 事件读取和 JSON 数组条目的增量提取
+
+流式模式下每个角色对象的右花括号一到达就解析并回调，
+下游阶段无需等待整个响应生成完毕；响应被截断时已完整的条目仍然可用
+"""
+
+import json
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import aiohttp
+
+
+class IncrementalArrayParser:
+    """
+    增量 JSON 数组条目提取器
+
+    逐段喂入 LLM 输出文本，在第一个 JSON 数组（顶层数组或 {"items": [...]} 中的数组）内，
+    每当一个对象或数组元素（紧凑格式的行）闭合就解析并产出。Markdown 代码块标记等数组外的内容会被忽略
+    """
+
+    def __init__(self, on_item: Optional[Callable[[Dict], None]] = None):
+        """
+        Args:
+            on_item: 可选的回调，每解析出一个完整元素调用一次
+        """
+        self.on_item = on_item
+        self.items: List = []
+        self.chunks: List[str] = []
+
+        self._obj: List[str] = []
+        self._depth = 0
+        self._array_depth: Optional[int] = None
+        self._in_string = False
+        self._escape = False
+        self._done = False
+
+    @property
+    def text(self) -> str:
+        """目前为止收到的完整文本"""
+        return ''.join(self.chunks)
+
+    def feed(self, chunk: str) -> List:
+        """
+        喂入一段文本
+
+        Returns:
+            本段文本中闭合的元素列表
+        """
+        self.chunks.append(chunk)
+        out = []
+        for ch in chunk:
+            if self._done:
+                break
+            if self._array_depth is not None and self._depth > self._array_depth:
+                self._obj.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '[{':
+                if self._array_depth is None:
+                    if ch == '[':
+                        self._array_depth = self._depth + 1
+                elif self._depth == self._array_depth:
+                    # 数组元素开始
+                    self._obj = [ch]
+                self._depth += 1
+            elif ch in ']}':
+                self._depth -= 1
+                if self._array_depth is None:
+                    continue
+                if self._depth == self._array_depth and self._obj:
+                    # 数组元素闭合
+                    try:
+                        value = json.loads(''.join(self._obj))
+                    except json.JSONDecodeError:
+                        value = None
+                    if isinstance(value, (dict, list)):
+                        out.append(value)
+                    self._obj = []
+                elif self._depth < self._array_depth:
+                    # 数组结束，之后的内容不再处理
+                    self._done = True
+
+        for item in out:
+            self.items.append(item)
+            if self.on_item:
+                self.on_item(item)
+        return out
+
+
+async def iter_sse_data(response: aiohttp.ClientResponse) -> AsyncIterator[Dict]:
+    """
+    读取 OpenAI 兼容接口的 SSE 流，逐个产出 data 事件的 JSON 内容
+
+    Args:
+        response: aiohttp 响应对象
+
+    Yields:
+        每个 data 事件解析后的字典（遇到 [DONE] 时结束）
+    """
+    async for raw_line in response.content:
+        line = raw_line.decode('utf-8').strip()
+        if not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            continue
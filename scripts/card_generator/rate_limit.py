@@ -0,0 +1,168 @@
+"""
+限速模块 - 按主机的令牌桶限速，支持 Retry-After
+
+所有图片源和 LLM 客户端在发请求前调用 throttle(url)，收到响应后调用 note_response(url, response)。
+收到带 Retry-After 的 429/503 时暂停整个主机的令牌桶，而不只是当前协程
+"""
+
+import asyncio
+import email.utils
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """令牌桶限速器"""
+
+    def __init__(self, host: str, rps: float, burst: int = 1):
+        """
+        Args:
+            host: 主机名
+            rps: 每秒请求数，0 表示不限速（仍然遵守 Retry-After 暂停）
+            burst: 桶容量（允许的突发请求数）
+        """
+        self.host = host
+        self.rps = rps
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.paused_until = 0.0
+
+        self.requests = 0
+        self.waited_seconds = 0.0
+        self.pauses = 0
+
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        if self.rps > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rps)
+        self._updated = now
+
+    async def acquire(self):
+        """等待一个令牌（按到达顺序排队）"""
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                if self.rps <= 0:
+                    break
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rps)
+        self.requests += 1
+        self.waited_seconds += time.monotonic() - start
+
+    def pause(self, seconds: float):
+        """暂停整个主机的请求"""
+        until = time.monotonic() + seconds
+        if until > self.paused_until:
+            self.paused_until = until
+            self.pauses += 1
+            # 暂停期间不积累令牌，恢复后不会立即突发
+            self.tokens = 0.0
+            self._updated = until
+
+    def summary(self) -> Dict:
+        """返回限速状态摘要"""
+        return {
+            'rps': self.rps,
+            'burst': self.burst,
+            'requests': self.requests,
+            'waited_seconds': round(self.waited_seconds, 1),
+            'pauses': self.pauses,
+        }
+
+
+# 全局限速配置与令牌桶（按主机）
+_default_limit: Dict = {'rps': 0, 'burst': 1}
+_host_limits: Dict[str, Dict] = {}
+_max_retry_after: float = 120
+_buckets: Dict[str, TokenBucket] = {}
+
+
+def configure_rate_limits(rate_limit_config: Optional[Dict]):
+    """
+    加载限速配置（config.json 中的 rate_limit 段），并清空已有的令牌桶
+
+    Args:
+        rate_limit_config: {"default": {"rps", "burst"}, "hosts": {host: {"rps", "burst"}}, "max_retry_after": 秒}
+    """
+    global _default_limit, _host_limits, _max_retry_after
+    rate_limit_config = rate_limit_config or {}
+    _default_limit = rate_limit_config.get('default', {'rps': 0, 'burst': 1})
+    _host_limits = {host.lower(): limit for host, limit in rate_limit_config.get('hosts', {}).items()}
+    _max_retry_after = rate_limit_config.get('max_retry_after', 120)
+    _buckets.clear()
+
+
+def get_rate_limiter(host: str) -> TokenBucket:
+    """获取（不存在时创建）主机的令牌桶"""
+    host = host.lower()
+    bucket = _buckets.get(host)
+    if bucket is None:
+        limit = _host_limits.get(host, _default_limit)
+        bucket = TokenBucket(host, limit.get('rps', 0), limit.get('burst', 1))
+        _buckets[host] = bucket
+    return bucket
+
+
+async def throttle(url: str):
+    """请求前调用：等待该 URL 所在主机的令牌"""
+    await get_rate_limiter(urlparse(url).netloc).acquire()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 头（秒数或 HTTP 日期）
+
+    Returns:
+        需要等待的秒数，无法解析时返回 None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_time = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_time is None:
+        return None
+    return max(0.0, retry_time.timestamp() - time.time())
+
+
+def note_response(url: str, status: int, headers) -> Optional[float]:
+    """
+    收到响应后调用：429/503 带 Retry-After 时暂停整个主机
+
+    Args:
+        url: 请求 URL
+        status: HTTP 状态码
+        headers: 响应头
+
+    Returns:
+        暂停的秒数，未暂停时返回 None
+    """
+    if status not in (429, 503):
+        return None
+    delay = parse_retry_after(headers.get('Retry-After'))
+    if delay is None:
+        return None
+    delay = min(delay, _max_retry_after)
+    get_rate_limiter(urlparse(url).netloc).pause(delay)
+    return delay
+
+
+def rate_limit_summary() -> Dict[str, Dict]:
+    """返回所有主机的限速状态摘要"""
+    return {host: bucket.summary() for host, bucket in _buckets.items()}
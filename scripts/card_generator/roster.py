@@ -0,0 +1,140 @@
+"""
+角色名册模块 - 统一加载各游戏的官方角色数据
+
+读取 output 目录下所有 *_characters-en-cn.json（原神、星铁、绝区零、鸣潮等 wiki 同步脚本的输出），
+按标签精确匹配，或按标准化角色名 + 作品后缀匹配。
+命中的标签直接使用官方中英文名和图标，不请求 LLM 和图片源
+"""
+
+import glob
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+from .utils import split_tag_suffix, normalize_tag_name
+
+
+# 名册文件名格式
+ROSTER_PATTERN = '*_characters-en-cn.json'
+
+# 默认名册目录（项目的 output 目录）
+DEFAULT_ROSTER_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'output'))
+
+# 名册中的作品标识（source 字段）对应的英文作品名，与 LLM 翻译结果的 source_en 保持一致
+SOURCE_TITLES = {
+    'genshin_impact': 'Genshin Impact',
+    'honkai_starrail': 'Honkai: Star Rail',
+    'zenless_zone_zero': 'Zenless Zone Zero',
+    'wuthering_waves': 'Wuthering Waves',
+}
+
+
+class RosterRegistry:
+    """角色名册：按标签和（标准化角色名, 作品后缀）索引所有游戏的官方角色数据"""
+
+    def __init__(self, roster_dir: str = DEFAULT_ROSTER_DIR):
+        """
+        Args:
+            roster_dir: 名册文件所在目录
+        """
+        self.roster_dir = roster_dir
+        self.by_tag: Dict[str, Dict] = {}
+        self.by_name: Dict[Tuple[str, str], Dict] = {}
+        # 各名册文件加载的角色数 {作品标识: 数量}
+        self.rosters: Dict[str, int] = {}
+        self._load()
+
+    def _load(self):
+        """加载目录下所有名册文件"""
+        for data_file in sorted(glob.glob(os.path.join(self.roster_dir, ROSTER_PATTERN))):
+            try:
+                with open(data_file, 'r', encoding='utf-8') as f:
+                    characters = json.load(f)
+            except Exception as e:
+                print(f"⚠️ 加载角色名册失败: {data_file} ({e})")
+                continue
+
+            loaded = 0
+            for char in characters:
+                tag = str(char.get('tag') or '').strip().lower()
+                if not tag or not char.get('name_cn'):
+                    continue
+                name, suffix = split_tag_suffix(tag)
+                self.by_tag.setdefault(tag, char)
+                self.by_name.setdefault((normalize_tag_name(name), suffix), char)
+                if char.get('name_en'):
+                    self.by_name.setdefault((normalize_tag_name(char['name_en']), suffix), char)
+                loaded += 1
+
+            source = characters[0].get('source') if characters else None
+            self.rosters[source or os.path.basename(data_file)] = loaded
+
+        if self.rosters:
+            counts = ', '.join(f"{source} {count}" for source, count in self.rosters.items())
+            print(f"📚 已加载角色名册: {counts}")
+        else:
+            print(f"⚠️ 未找到角色名册文件: {os.path.join(self.roster_dir, ROSTER_PATTERN)}")
+
+    def lookup(self, tag: str) -> Optional[Dict]:
+        """
+        查找标签对应的官方角色数据（不请求网络）
+
+        先按标签精确匹配，再按标准化角色名 + 作品后缀匹配（如 hu_tao_(genshin_impact) 与名册中的 "Hu Tao"）
+
+        Args:
+            tag: 角色标签
+
+        Returns:
+            名册中的角色数据（tag, name_cn, name_en, source, source_cn, icon_url 等），没有时返回 None
+        """
+        tag = tag.strip().lower()
+        char = self.by_tag.get(tag)
+        if char is None:
+            name, suffix = split_tag_suffix(tag)
+            if suffix:
+                char = self.by_name.get((normalize_tag_name(name), suffix))
+        return char
+
+    def __len__(self) -> int:
+        return len(self.by_tag)
+
+
+def roster_record(char: Dict) -> Dict:
+    """
+    由名册角色数据生成输出记录的翻译和图片字段（与 LLM 翻译结果的字段一致）
+
+    Args:
+        char: 名册中的角色数据
+
+    Returns:
+        cn_name, en_name, source_cn, source_en 等字段，以及图标 URL、作品标识和 wiki 条目 ID
+    """
+    source = char.get('source') or ''
+    return {
+        'cn_name': char['name_cn'],
+        'cn_name_status': '官方译名',
+        'en_name': char.get('name_en') or '',
+        'source_cn': char.get('source_cn') or '',
+        'source_en': SOURCE_TITLES.get(source, source.replace('_', ' ').title()),
+        'source_name_status': '官方译名' if char.get('source_cn') else '未知',
+        'image_url': char.get('icon_url') or None,
+        'source_game': source,
+        'character_id': char.get('entry_page_id'),
+    }
+
+
+# 全局单例（首次使用时加载）
+_registry: Optional[RosterRegistry] = None
+
+
+def get_roster_registry(roster_dir: Optional[str] = None) -> RosterRegistry:
+    """
+    获取角色名册单例
+
+    Args:
+        roster_dir: 名册目录，仅首次调用时生效，默认为项目的 output 目录
+    """
+    global _registry
+    if _registry is None:
+        _registry = RosterRegistry(roster_dir or DEFAULT_ROSTER_DIR)
+    return _registry
@@ -4,5 +4,6 @@ Safebooru 图片源模块
 """
 
 from .image_source import SafebooruImageSource
+from .batched import BatchedSafebooruImageSource
 
-__all__ = ['SafebooruImageSource']
+__all__ = ['SafebooruImageSource', 'BatchedSafebooruImageSource']
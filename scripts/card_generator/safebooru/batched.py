@@ -0,0 +1,202 @@
+"""
+Safebooru 批量图片源
+把同时等待搜图的多个标签合并为一个 OR 查询（{a ~ b ~ c}，查询条件与单标签查询一致），
+按返回的每个 post 的 tags 字段把图片归属到对应标签。
+返回结果没有被 limit 截断时，没有匹配到的标签确认没有图片，不再单独查询；
+结果被截断时没有匹配到（或候选不完整）的标签再单独查询
+"""
+
+import asyncio
+import aiohttp
+from typing import Dict, List, Optional, Set, Tuple
+from ..image_source import ImageSourceError, CircuitOpenError
+from ..stats import Stats
+from .image_source import SafebooruImageSource, build_post_url
+
+
+# 含有这些字符的标签会破坏 OR 查询语法，只做单独查询
+_UNBATCHABLE_CHARS = set(' {}~')
+
+
+class BatchedSafebooruImageSource(SafebooruImageSource):
+    """
+    Safebooru 批量图片源
+
+    search 把标签加入等待队列，凑满 max_tags 个或等待 window 秒后合并为一个请求。
+    名称与 SafebooruImageSource 相同，规则、结果存储和并发限制器无需改动
+    """
+
+    def __init__(
+        self,
+        max_tags: int = 20,
+        limit: int = 100,
+        window: float = 0.05,
+        solo_min_count: int = 5,
+        count_batch: int = 100,
+        candidates: int = 10,
+        target_aspect: float = 1.5
+    ):
+        """
+        Args:
+            max_tags: 每个合并查询最多包含的标签数
+            limit: 合并查询返回的 post 数量上限
+            window: 等待更多标签加入的时间（秒）
+            solo_min_count, count_batch, candidates, target_aspect: 见 SafebooruImageSource
+        """
+        super().__init__(solo_min_count, count_batch, candidates, target_aspect)
+        self.max_tags = max(1, max_tags)
+        self.limit = max(1, limit)
+        self.window = window
+
+        # 等待合并查询的 (tag, future)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._group_tasks: Set[asyncio.Task] = set()
+
+    async def search(
+        self,
+        session: aiohttp.ClientSession,
+        tag: str,
+        item_data: Dict,
+        sem_img: asyncio.Semaphore,
+        retry_times: int,
+        retry_delay: int,
+        stats: Stats
+    ) -> Optional[str]:
+        """
+        Safebooru 搜图（合并查询）
+
+        合并查询命中时直接返回；确认没有图片时返回 None（由图片源管理器记为无图）；
+        结果被截断或合并查询失败时退回单标签查询（SafebooruImageSource.search）。
+        预筛选查到图片数量为 0 或较少（不加 solo 查询）的标签不参与合并
+        """
+        count = self.post_counts.get(tag)
+        if (
+            self.max_tags < 2 or _UNBATCHABLE_CHARS & set(tag)
+            or (count is not None and count < self.solo_min_count)
+        ):
+            return await super().search(session, tag, item_data, sem_img, retry_times, retry_delay, stats)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((tag, future))
+        args = (session, sem_img, retry_times, retry_delay, stats)
+        if len(self._pending) >= self.max_tags:
+            self._start_group(args)
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later(args))
+
+        img_url = await future
+        if img_url is not None:
+            self.post_counts.pop(tag, None)
+            stats.img_batch_resolved += 1
+            if img_url:
+                stats.img_success += 1
+                return img_url
+            stats.img_fail += 1
+            return None
+
+        stats.img_batch_fallback += 1
+        return await super().search(session, tag, item_data, sem_img, retry_times, retry_delay, stats)
+
+    def _start_group(self, args: Tuple):
+        """取出队列头部最多 max_tags 个标签，发起一个合并查询"""
+        group = self._pending[:self.max_tags]
+        del self._pending[:self.max_tags]
+        task = asyncio.create_task(self._resolve_group([tag for tag, _ in group], *args))
+        self._group_tasks.add(task)
+        task.add_done_callback(self._group_tasks.discard)
+        # 在回调中分发结果：任务在开始执行前被取消时等待的标签也能收到结果
+        task.add_done_callback(lambda t: self._settle(group, t))
+
+    @staticmethod
+    def _settle(group: List[Tuple[str, asyncio.Future]], task: asyncio.Task):
+        """
+        合并查询结束（包括失败和被取消）时把结果分发给等待的标签
+
+        等待的标签收到图片 URL，确认没有图片时收到空字符串，需要退回单标签查询时收到 None；
+        图片源熔断时收到 CircuitOpenError（不当作无图）
+        """
+        results: Dict[str, str] = {}
+        error = None
+        if not task.cancelled():
+            error = task.exception()
+            if error is None:
+                results = task.result()
+        for tag, future in group:
+            if future.done():
+                continue
+            if isinstance(error, CircuitOpenError):
+                future.set_exception(CircuitOpenError(str(error)))
+            else:
+                future.set_result(results.get(tag))
+
+    async def _flush_later(self, args: Tuple):
+        """等待 window 秒后把队列中剩余的标签全部发出"""
+        flushed = False
+        try:
+            await asyncio.sleep(self.window)
+            flushed = True
+        finally:
+            self._flush_task = None
+            if not flushed:
+                # 被取消时队列中的标签不再合并，全部退回单标签查询
+                pending, self._pending = self._pending, []
+                for _, future in pending:
+                    if not future.done():
+                        future.set_result(None)
+        while self._pending:
+            self._start_group(args)
+
+    async def _resolve_group(
+        self,
+        tags: List[str],
+        session: aiohttp.ClientSession,
+        sem_img: asyncio.Semaphore,
+        retry_times: int,
+        retry_delay: int,
+        stats: Stats
+    ) -> Dict[str, str]:
+        """
+        执行一个合并查询，按标签选图
+
+        查询条件与单标签查询一致（candidates 大于 1 时不加 solo，在本地排序），
+        每个标签取包含该标签的最新 candidates 个 post，与单标签查询得到的候选相同，因此选中的图片也相同。
+        返回结果没有被 limit 截断时，没有匹配到的标签在相同查询条件下没有图片，记为空字符串；
+        被截断时，没有匹配到或候选不足 candidates 个的标签可能不完整，退回单标签查询
+
+        Returns:
+            {tag: 图片 URL，确认没有图片时为空字符串}，未包含的标签由调用方退回单标签查询
+
+        Raises:
+            CircuitOpenError: 图片源已熔断
+        """
+        results: Dict[str, str] = {}
+        try:
+            query = tags[0] if len(tags) == 1 else f"{{{' ~ '.join(tags)}}}"
+            if self.candidates == 1:
+                query += " solo"
+            stats.img_batch_requests += 1
+            posts = await self.fetch_posts(
+                session, build_post_url(query, self.limit), sem_img, retry_times, retry_delay
+            )
+            matched: Dict[str, List[Dict]] = {}
+            wanted = set(tags)
+            for post in posts:
+                for tag in wanted.intersection(str(post.get('tags', '')).split()):
+                    matched.setdefault(tag, []).append(post)
+                    if len(matched[tag]) >= self.candidates:
+                        wanted.discard(tag)
+                if not wanted:
+                    break
+            truncated = len(posts) >= self.limit
+            for tag in tags:
+                tag_posts = matched.get(tag, [])
+                if truncated and len(tag_posts) < self.candidates:
+                    continue
+                results[tag] = self.choose(tag, tag_posts, stats) or ''
+        except CircuitOpenError:
+            raise
+        except (ImageSourceError, KeyError, TypeError):
+            # 合并查询失败或返回异常数据时全部退回单标签查询
+            pass
+        return results
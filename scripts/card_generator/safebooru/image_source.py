@@ -4,54 +4,333 @@ Safebooru 图片源实现
 """
 
 import asyncio
+import json
+import math
+import os
 import aiohttp
-from typing import Dict, Optional
-from ..image_source import ImageSource
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+from urllib.parse import quote_plus
+from ..image_source import ImageSource, ImageSourceError, CircuitOpenError
+from ..rate_limit import throttle, note_response
 from ..stats import Stats
 
 
+# 图片地址格式（原图、缩略图、样图；缩略图和样图统一为 jpg）
+IMAGE_URL = "https://safebooru.org/images/{directory}/{image}"
+PREVIEW_URL = "https://safebooru.org/thumbnails/{directory}/thumbnail_{stem}.jpg"
+SAMPLE_URL = "https://safebooru.org/samples/{directory}/sample_{stem}.jpg"
+
+
+def build_post_url(tags: str, limit: int) -> str:
+    """构造 Safebooru post 接口的查询 URL（tags 为空格分隔的查询表达式）"""
+    return f"https://safebooru.org/index.php?page=dapi&s=post&q=index&tags={quote_plus(tags, safe='(){}~')}&limit={limit}&json=1"
+
+
+def build_tag_url(names: List[str]) -> str:
+    """构造 Safebooru tag 接口的查询 URL（一次查询多个标签）"""
+    return f"https://safebooru.org/index.php?page=dapi&s=tag&q=index&names={quote_plus(' '.join(names), safe='()')}&limit={len(names)}&json=1"
+
+
+def post_image_url(post: Dict) -> str:
+    """由 post 数据得到图片地址"""
+    return IMAGE_URL.format(directory=post['directory'], image=post['image'])
+
+
+def post_image_meta(post: Dict) -> Dict:
+    """
+    由 post 数据得到缩略图/样图 URL 和原图宽高（IMAGE_META_FIELDS）
+    
+    接口返回了 preview_url/sample_url 时直接使用，否则按目录和文件名拼接；
+    没有样图（原图较小）时不包含 image_sample_url
+    """
+    stem = os.path.splitext(post['image'])[0]
+    meta = {
+        'image_preview_url': post.get('preview_url') or PREVIEW_URL.format(directory=post['directory'], stem=stem),
+    }
+    if post.get('sample_url') and post['sample_url'] != post.get('file_url'):
+        meta['image_sample_url'] = post['sample_url']
+    elif post.get('sample') in (True, 1, '1', 'true'):
+        meta['image_sample_url'] = SAMPLE_URL.format(directory=post['directory'], stem=stem)
+    try:
+        meta['image_width'] = int(post['width'])
+        meta['image_height'] = int(post['height'])
+    except (KeyError, TypeError, ValueError):
+        pass
+    return meta
+
+
+def is_solo_post(post: Dict) -> bool:
+    """post 是否带有 solo 标签"""
+    return 'solo' in str(post.get('tags', '')).split()
+
+
+def rank_posts(posts: List[Dict], target_aspect: float = 1.5) -> List[Dict]:
+    """
+    按卡片适用程度排序：solo 优先，其次评分高，最后宽高比（高/宽）接近卡片比例
+    
+    Args:
+        posts: post 列表
+        target_aspect: 卡片的高宽比（卡片为 2:3 竖图时为 1.5）
+    
+    Returns:
+        排序后的 post 列表
+    """
+    def _key(post):
+        try:
+            score = float(post.get('score') or 0)
+        except (TypeError, ValueError):
+            score = 0.0
+        try:
+            aspect_gap = abs(math.log(float(post['height']) / float(post['width']) / target_aspect))
+        except (KeyError, TypeError, ValueError, ZeroDivisionError):
+            aspect_gap = math.inf
+        return (not is_solo_post(post), -score, aspect_gap)
+    return sorted(posts, key=_key)
+
+
+def parse_tag_counts(text: str) -> Dict[str, int]:
+    """
+    解析 tag 接口的响应（JSON 数组或 XML <tags><tag name=".." count=".."/></tags>）
+    
+    Returns:
+        {标签名: 图片数量}
+    
+    Raises:
+        ValueError: 响应无法解析
+    """
+    text = text.strip()
+    if not text:
+        return {}
+    if text[0] in '[{':
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get('tag') or data.get('tags') or []
+        entries = data if isinstance(data, list) else []
+    else:
+        try:
+            entries = [tag.attrib for tag in ET.fromstring(text).iter('tag')]
+        except ET.ParseError as e:
+            raise ValueError(str(e))
+    return {
+        str(entry['name']).lower(): int(entry.get('count', 0))
+        for entry in entries
+        if isinstance(entry, dict) and entry.get('name') is not None
+    }
+
+
 class SafebooruImageSource(ImageSource):
     """Safebooru 图片源实现"""
     
+    supports_post_counts = True
+    
+    def __init__(
+        self,
+        solo_min_count: int = 5,
+        count_batch: int = 100,
+        candidates: int = 10,
+        target_aspect: float = 1.5
+    ):
+        """
+        Args:
+            solo_min_count: 图片数量低于此值的标签搜图时不加 solo 限定（candidates 为 1 时使用）
+            count_batch: 每次查询图片数量的标签数
+            candidates: 每次搜图取回的候选图片数，大于 1 时不加 solo 限定、在本地排序选图
+            target_aspect: 卡片的高宽比，本地排序时优先接近该比例的图片
+        """
+        self.solo_min_count = solo_min_count
+        self.count_batch = max(1, count_batch)
+        self.candidates = max(1, candidates)
+        self.target_aspect = target_aspect
+        
+        # 预筛选查到的图片数量 {tag: count}，搜图时取出
+        self.post_counts: Dict[str, int] = {}
+        
+        # 最近一次搜图的备选图片 {tag: [url, ...]} 和选中图片的附加信息 {tag: meta}，由图片源管理器取出
+        self.alternates: Dict[str, List[str]] = {}
+        self.image_meta: Dict[str, Dict] = {}
+    
+    def pop_alternates(self, tag: str) -> List[str]:
+        return self.alternates.pop(tag, [])
+    
+    def pop_image_meta(self, tag: str) -> Dict:
+        return self.image_meta.pop(tag, {})
+    
+    def choose(self, tag: str, posts: List[Dict], stats: Stats) -> Optional[str]:
+        """
+        从候选 post 中选图：排序后取第一张，其余作为备选保存
+        
+        Returns:
+            图片 URL，没有候选时返回 None
+        """
+        ranked = rank_posts(posts, self.target_aspect)
+        if not ranked:
+            return None
+        if not is_solo_post(ranked[0]):
+            stats.img_nonsolo += 1
+        if len(ranked) > 1:
+            self.alternates[tag] = [post_image_url(post) for post in ranked[1:]]
+            stats.img_alternates += len(ranked) - 1
+        self.image_meta[tag] = post_image_meta(ranked[0])
+        return post_image_url(ranked[0])
+    
     def get_name(self) -> str:
         return "Safebooru"
     
-    async def search(
+    async def fetch_text(
         self,
         session: aiohttp.ClientSession,
-        tag: str,
-        item_data: Dict,
+        url: str,
         sem_img: asyncio.Semaphore,
         retry_times: int,
-        retry_delay: int,
-        stats: Stats
-    ) -> Optional[str]:
+        retry_delay: int
+    ) -> str:
         """
-        Safebooru 搜图（带重试机制）
+        请求 Safebooru 接口（带重试机制）
         
-        搜索策略：使用 tag + "solo" 限定单人图
-        返回格式：https://safebooru.org/images/{directory}/{image}
+        每次请求前按主机限速，429/503 带 Retry-After 时暂停整个主机
+        
+        Args:
+            session: aiohttp 会话
+            url: 查询 URL
+            sem_img: 图片并发信号量
+            retry_times: 重试次数
+            retry_delay: 重试延迟（秒）
+        
+        Returns:
+            响应文本
+        
+        Raises:
+            ImageSourceError: 所有尝试都失败
         """
-        url = f"https://safebooru.org/index.php?page=dapi&s=post&q=index&tags={tag}+solo&limit=1&json=1"
+        last_error = None
         
         # 重试逻辑
         for attempt in range(retry_times):
             try:
-                # 使用全局信号量限制图片并发
-                async with sem_img:
+                # 先等待限速令牌再占用并发名额，避免名额空等
+                await throttle(url)
+                # 使用并发限制器限制图片并发（自适应限制器会根据状态码调整上限）
+                async with sem_img as slot:
                     async with session.get(url) as resp:
+                        if slot:
+                            slot.report(resp.status)
+                        note_response(url, resp.status, resp.headers)
                         if resp.status == 200:
-                            data = await resp.json(content_type=None)
-                            if data and isinstance(data, list) and len(data) > 0:
-                                img = data[0]
-                                stats.img_success += 1
-                                return f"https://safebooru.org/images/{img['directory']}/{img['image']}"
-            except Exception:
-                pass
+                            return await resp.text()
+                        last_error = f"HTTP {resp.status}"
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                last_error = e
             
             # 如果不是最后一次尝试，等待后重试
             if attempt < retry_times - 1:
                 await asyncio.sleep(retry_delay)
         
+        raise ImageSourceError(str(last_error))
+    
+    async def fetch_posts(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        sem_img: asyncio.Semaphore,
+        retry_times: int,
+        retry_delay: int
+    ) -> List[Dict]:
+        """
+        请求 post 接口
+        
+        Returns:
+            post 列表，没有结果时为空列表
+        
+        Raises:
+            ImageSourceError: 所有尝试都失败或响应无法解析
+        """
+        text = await self.fetch_text(session, url, sem_img, retry_times, retry_delay)
+        # 无结果时 Safebooru 返回空响应体
+        try:
+            data = json.loads(text) if text.strip() else []
+        except json.JSONDecodeError as e:
+            raise ImageSourceError(f"响应无法解析: {e}")
+        return data if isinstance(data, list) else []
+    
+    async def fetch_post_counts(
+        self,
+        session: aiohttp.ClientSession,
+        tags: List[str],
+        sem_img: asyncio.Semaphore,
+        retry_times: int,
+        retry_delay: int
+    ) -> Dict[str, int]:
+        """
+        通过 tag 接口批量查询图片数量，每次请求 count_batch 个标签
+        
+        请求成功但响应中没有的标签在 Safebooru 上不存在，数量记为 0；
+        某一批请求失败时跳过该批（这些标签按原方式搜图）
+        
+        Returns:
+            {tag: 图片数量}
+        """
+        counts = {}
+        for start in range(0, len(tags), self.count_batch):
+            names = tags[start:start + self.count_batch]
+            try:
+                text = await self.fetch_text(session, build_tag_url(names), sem_img, retry_times, retry_delay)
+                found = parse_tag_counts(text)
+            except (ImageSourceError, ValueError, TypeError):
+                continue
+            for tag in names:
+                counts[tag] = found.get(tag.lower(), 0)
+        self.post_counts.update(counts)
+        return counts
+    
+    async def search(
+        self,
+        session: aiohttp.ClientSession,
+        tag: str,
+        item_data: Dict,
+        sem_img: asyncio.Semaphore,
+        retry_times: int,
+        retry_delay: int,
+        stats: Stats
+    ) -> Optional[str]:
+        """
+        Safebooru 搜图（带重试机制）
+        
+        搜索策略：candidates 大于 1 时一次取回 candidates 张图片（不加 solo 限定），
+        在本地按 solo > 评分 > 宽高比排序，一次请求同时得到"最合适的单人图"和"任意一张图"，
+        其余候选作为备选保存；candidates 为 1 时使用 tag + "solo" 限定单人图，
+        预筛选查到的图片数量低于 solo_min_count 时不加 solo。
+        预筛选查到的图片数量为 0 时不请求网络直接返回 None
+        返回格式：https://safebooru.org/images/{directory}/{image}
+        
+        接口正常返回空结果时视为确认没有图片，直接返回 None（不再重试）；
+        所有尝试都失败时抛出 ImageSourceError
+        """
+        count = self.post_counts.pop(tag, None)
+        if count == 0:
+            stats.img_fail += 1
+            return None
+        if self.candidates > 1:
+            url = build_post_url(tag, self.candidates)
+        elif count is not None and count < self.solo_min_count:
+            stats.img_prefilter_nonsolo += 1
+            url = build_post_url(tag, 1)
+        else:
+            url = build_post_url(f"{tag} solo", 1)
+        
+        try:
+            posts = await self.fetch_posts(session, url, sem_img, retry_times, retry_delay)
+        except CircuitOpenError:
+            raise
+        except ImageSourceError as e:
+            stats.img_fail += 1
+            raise ImageSourceError(f"Safebooru 请求失败: {tag} ({e})")
+        
+        img_url = self.choose(tag, posts, stats)
+        if img_url:
+            stats.img_success += 1
+            return img_url
         stats.img_fail += 1
         return None
@@ -10,10 +10,88 @@ class Stats:
     def __init__(self):
         self.llm_success = 0
         self.llm_fail = 0
+        self.llm_cache_hit = 0
+        self.llm_batch_ingested = 0
+        self.llm_batch_failed = 0
+        self.llm_repair_requests = 0
+        self.llm_repaired = 0
+        self.llm_bisections = 0
+        self.llm_quarantined = []
+        
+        # 流式响应：首个条目到达耗时与完整响应耗时（累计秒数）
+        self.llm_stream_requests = 0
+        self.llm_first_item_seconds = 0.0
+        self.llm_stream_seconds = 0.0
+        
+        # 按响应格式（verbose/compact）累计的请求次数、token 用量和有效条目数
+        self.llm_token_usage = {}
+        
+        # 级联模式：各模型层级处理的条目数和耗时，强模型改进的条目数
+        self.llm_tiers = {}
+        self.llm_escalation_improved = 0
+        
+        # 自适应批大小（运行结束时由 AdaptiveBatchSizer 填入）
+        self.batch_size_summary = None
+        self.batch_size_decisions = []
         self.img_success = 0
         self.img_fail = 0
+        self.img_store_hit = 0
+        self.img_store_negative = 0
+        
+        # Safebooru 合并查询：请求数、直接命中的标签数、退回单标签查询的标签数
+        self.img_batch_requests = 0
+        self.img_batch_resolved = 0
+        self.img_batch_fallback = 0
+        
+        # 预筛选：查到图片数量的标签数、数量为 0 直接判定无图的标签数、不加 solo 查询的标签数
+        self.img_prefilter_tags = 0
+        self.img_prefilter_zero = 0
+        self.img_prefilter_nonsolo = 0
+        
+        # 本地排序选图：选中非 solo 图片的标签数、保存的备选图片数
+        self.img_nonsolo = 0
+        self.img_alternates = 0
         self.total_processed = 0
         self.start_time = time.time()
+        
+        # 角色名册：命中的标签数、免去的 LLM 翻译条数和搜图次数
+        self.roster_hits = 0
+        self.roster_llm_avoided = 0
+        self.roster_img_avoided = 0
+        
+        # 自适应并发限制器（运行结束时填入，{名称: 摘要}）
+        self.limiter_summary = {}
+        
+        # LLM 端点池（运行结束时填入，{端点: 摘要}）
+        self.llm_endpoint_summary = {}
+        
+        # 图片源健康状态（错误率、延迟、熔断器），熔断期间跳过的搜图次数
+        self.img_source_health = {}
+        self.img_breaker_skipped = 0
+        
+        # 按主机限速（运行结束时填入，{主机: 摘要}）
+        self.rate_limit_summary = {}
+        
+        # 快照写入（后台线程）
+        self.snapshot_writes = 0
+        self.snapshot_coalesced = 0
+        self.snapshot_seconds = 0.0
+        self.snapshot_last_seconds = 0.0
+        self.snapshot_max_seconds = 0.0
+    
+    def _print_tiers(self):
+        """打印级联模式各层级的处理量，并估算弱模型拦下的条目节省的强模型耗时和 token"""
+        cheap = self.llm_tiers.get('cheap', {'items': 0, 'seconds': 0.0})
+        strong = self.llm_tiers.get('strong', {'items': 0, 'seconds': 0.0})
+        print(f"   🪜 级联: 弱模型 {cheap['items']} 个（{cheap['seconds']:.1f} 秒）"
+              f" | 升级强模型 {strong['items']} 个（{strong['seconds']:.1f} 秒），改进 {self.llm_escalation_improved} 个")
+        
+        kept = cheap['items'] - strong['items']
+        strong_tokens = sum(u['completion_tokens'] for mode, u in self.llm_token_usage.items() if mode.startswith('strong/'))
+        if strong['items'] > 0 and kept > 0:
+            seconds_saved = strong['seconds'] / strong['items'] * kept
+            tokens_saved = strong_tokens / strong['items'] * kept
+            print(f"      约节省强模型耗时 {seconds_saved:.1f} 秒、输出 {tokens_saved:.0f} tokens（按强模型每条平均值估算）")
     
     def print_summary(self):
         """打印统计摘要报告"""
@@ -28,12 +106,73 @@ class Stats:
         print(f"🎯 总处理: {self.total_processed} 个角色")
         if duration > 0:
             print(f"⚡ 平均速度: {self.total_processed / duration:.2f} 个/秒")
+        if self.roster_hits:
+            print(f"📚 角色名册命中: {self.roster_hits} 个（免去 LLM 翻译 {self.roster_llm_avoided} 条、搜图 {self.roster_img_avoided} 次）")
         print(f"\n🤖 LLM 翻译:")
         if llm_total > 0:
             print(f"   ✅ 成功: {self.llm_success}/{llm_total} ({self.llm_success/llm_total*100:.1f}%)")
             print(f"   ❌ 失败: {self.llm_fail}/{llm_total} ({self.llm_fail/llm_total*100:.1f}%)")
+        if self.llm_cache_hit > 0:
+            print(f"   💾 缓存命中: {self.llm_cache_hit}（未请求 LLM）")
+        if self.llm_batch_ingested or self.llm_batch_failed:
+            print(f"   📥 批处理任务: 写入缓存 {self.llm_batch_ingested} | 未翻译 {self.llm_batch_failed}（由实时模式补齐）")
+        if self.llm_repair_requests > 0:
+            print(f"   🔁 补全请求: {self.llm_repair_requests} 次，补回 {self.llm_repaired} 个")
+        if self.llm_bisections > 0:
+            print(f"   ✂️  解析失败拆分: {self.llm_bisections} 次，隔离标签 {len(self.llm_quarantined)} 个")
+            for tag in self.llm_quarantined[:10]:
+                print(f"      🚫 {tag}")
+        if self.llm_stream_requests > 0:
+            first = self.llm_first_item_seconds / self.llm_stream_requests
+            full = self.llm_stream_seconds / self.llm_stream_requests
+            print(f"   ⚡ 流式响应: 首条结果平均 {first:.1f} 秒 | 完整响应平均 {full:.1f} 秒")
+        for mode, u in self.llm_token_usage.items():
+            per_item = f"{u['completion_tokens'] / u['items']:.1f}" if u['items'] else "-"
+            print(f"   🔢 Token（{mode}）: 请求 {u['requests']} 次 | 输入 {u['prompt_tokens']} | 输出 {u['completion_tokens']} | 每条输出 {per_item}")
+        if self.llm_tiers:
+            self._print_tiers()
+        if self.batch_size_summary:
+            s = self.batch_size_summary
+            print(f"   📦 批大小: {s['initial']} → {s['final']}（增大 {s['grow']} 次，减小 {s['shrink']} 次）")
+            for d in self.batch_size_decisions[-5:]:
+                print(f"      {d['from']} → {d['to']}: {d['reason']}")
         print(f"\n🖼️  图片搜索:")
         if img_total > 0:
             print(f"   ✅ 成功: {self.img_success}/{img_total} ({self.img_success/img_total*100:.1f}%)")
             print(f"   ❌ 失败: {self.img_fail}/{img_total} ({self.img_fail/img_total*100:.1f}%)")
+        if self.img_store_hit or self.img_store_negative:
+            print(f"   💾 结果存储: 命中 {self.img_store_hit} | 已知无图跳过 {self.img_store_negative}（未请求网络）")
+        if self.img_prefilter_tags:
+            print(f"   🔎 预筛选: 查询 {self.img_prefilter_tags} 个标签 | 无图跳过 {self.img_prefilter_zero}"
+                  f" | 图片较少不加 solo {self.img_prefilter_nonsolo}")
+        if self.img_nonsolo or self.img_alternates:
+            print(f"   🏅 候选排序: 没有单人图改用其他图片 {self.img_nonsolo} 个 | 保存备选 {self.img_alternates} 张")
+        if self.img_batch_requests:
+            print(f"   📦 合并查询: {self.img_batch_requests} 次请求解决 {self.img_batch_resolved} 个标签（含确认无图）"
+                  f" | 退回单标签查询 {self.img_batch_fallback} 个")
+        if self.limiter_summary:
+            print(f"\n🚦 自适应并发:")
+            for name, s in self.limiter_summary.items():
+                print(f"   {name}: 当前 {s['limit']} | 最高 {s['peak']} | 最低 {s['low']} | 减小 {s['decreases']} 次")
+        if self.llm_endpoint_summary:
+            print(f"\n🔀 LLM 端点池:")
+            for name, s in self.llm_endpoint_summary.items():
+                print(f"   {name}: 请求 {s['requests']} | 成功 {s['successes']} | 失败 {s['failures']} | 移除 {s['ejections']} 次"
+                      f" | 对冲 {s['hedges']} 次（备用端点胜出 {s['hedge_wins']}）| 延迟 p50 {s['p50']}s p95 {s['p95']}s")
+        if self.img_source_health:
+            print(f"\n🩺 图片源健康状态:")
+            states = {'closed': '正常', 'open': '熔断中', 'half_open': '待探测'}
+            for name, s in self.img_source_health.items():
+                print(f"   {name}: {states.get(s['state'], s['state'])} | 请求 {s['requests']} | 失败 {s['failures']}"
+                      f"（最近错误率 {s['error_rate']*100:.0f}%）| 延迟 p50 {s['p50']}s p95 {s['p95']}s"
+                      f" | 熔断 {s['opens']} 次，跳过 {s['skipped']} 次")
+        if self.rate_limit_summary:
+            print(f"\n⏳ 按主机限速:")
+            for host, s in self.rate_limit_summary.items():
+                rps = f"{s['rps']}/秒" if s['rps'] > 0 else "不限"
+                print(f"   {host}: {rps} | 请求 {s['requests']} 次 | 累计等待 {s['waited_seconds']} 秒 | Retry-After 暂停 {s['pauses']} 次")
+        if self.snapshot_writes > 0:
+            print(f"\n💾 快照写入:")
+            print(f"   📝 写入: {self.snapshot_writes} 次 | 合并跳过: {self.snapshot_coalesced} 次")
+            print(f"   ⏱️  耗时: 平均 {self.snapshot_seconds/self.snapshot_writes:.2f} 秒 | 最长 {self.snapshot_max_seconds:.2f} 秒")
         print("="*50)
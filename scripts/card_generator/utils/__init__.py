@@ -7,13 +7,21 @@ from .common import (
     is_genshin_tag,
     extract_character_name_from_tag,
     normalize_name,
+    split_tag_suffix,
+    normalize_tag_name,
 )
 
 from .file import (
-    ensure_dir,
-    safe_filename,
-    load_json,
-    save_json,
+    iter_json_array,
+    save_data,
+    SnapshotWriter,
+    load_history_data,
+    load_tuning_state,
+    save_tuning_state,
+    get_journal_file,
+    ResultJournal,
+    replay_journal,
+    compact_journal,
 )
 
 __all__ = [
@@ -21,10 +29,18 @@ __all__ = [
     'is_genshin_tag',
     'extract_character_name_from_tag',
     'normalize_name',
+    'split_tag_suffix',
+    'normalize_tag_name',
     
     # 文件工具
-    'ensure_dir',
-    'safe_filename',
-    'load_json',
-    'save_json',
+    'iter_json_array',
+    'save_data',
+    'SnapshotWriter',
+    'load_history_data',
+    'load_tuning_state',
+    'save_tuning_state',
+    'get_journal_file',
+    'ResultJournal',
+    'replay_journal',
+    'compact_journal',
 ]
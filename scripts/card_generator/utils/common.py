@@ -3,7 +3,7 @@
 """
 
 import re
-from typing import Optional
+from typing import Optional, Tuple
 
 
 def is_genshin_tag(tag: str) -> bool:
@@ -32,3 +32,24 @@ def extract_character_name_from_tag(tag: str, game_suffix: str = 'genshin_impact
 def normalize_name(name: str) -> str:
     """标准化名称（转小写，去空格）"""
     return name.strip().lower()
+
+
+def split_tag_suffix(tag: str) -> Tuple[str, str]:
+    """
+    拆分标签的角色名和作品后缀
+
+    Args:
+        tag: 标签，如 "hu_tao_(genshin_impact)"
+
+    Returns:
+        (角色名, 作品后缀)，如 ("hu_tao", "genshin_impact")；没有后缀时后缀为空字符串
+    """
+    match = re.match(r'^(.+?)_\(([^()]+)\)$', tag.strip().lower())
+    if match:
+        return match.group(1), match.group(2)
+    return tag.strip().lower(), ''
+
+
+def normalize_tag_name(name: str) -> str:
+    """标准化角色名用于标签匹配（转小写，空格和下划线统一为单个下划线），如 "Hu Tao" 与 "hu_tao" 相同"""
+    return re.sub(r'[\s_]+', '_', name.strip().lower()).strip('_')
@@ -1,33 +1,373 @@
 """
-文件操作模块 - JSON 文件读写
+文件操作模块 - JSON 文件读写、流式数组解析、后台快照写入、结果日志（JSONL）追加与回放
 """
 
 import json
 import os
-from typing import List, Dict, Tuple, Set
+import re
+import threading
+import time
+from typing import List, Dict, Tuple, Set, Iterator, Optional, TextIO, Any
 
 
-def save_data(data: List[Dict], output_file: str):
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_json_array(f: TextIO, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    增量解析 JSON 数组，逐个产出数组元素
+    
+    只在内存中保留当前读取窗口，峰值内存与单个元素大小相关，而不是整个文件
+    
+    Args:
+        f: 文本模式的文件对象
+        chunk_size: 每次读取的字符数
+    
+    Yields:
+        数组中的每个元素
+    
+    Raises:
+        ValueError: 文件不是 JSON 数组或格式错误
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    
+    def _skip_ws() -> bool:
+        """跳过空白，需要时继续读取；返回是否还有内容"""
+        nonlocal buf, pos, eof
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf) or eof:
+                return pos < len(buf)
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+    
+    if not _skip_ws() or buf[pos] != '[':
+        raise ValueError("JSON 顶层不是数组")
+    pos += 1
+    
+    if _skip_ws() and buf[pos] == ']':
+        return
+    
+    while True:
+        if not _skip_ws():
+            raise ValueError("JSON 数组未结束")
+        
+        # 解析一个元素；窗口内数据不完整时继续读取
+        # 解析结果后面不是分隔符时也继续读取，避免把被截断的数字（如 "1.5e"）当作完整的值
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                if eof or (end < len(buf) and buf[end] in ' \t\n\r,]'):
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+        
+        pos = end
+        yield value
+        
+        if not _skip_ws():
+            raise ValueError("JSON 数组未结束")
+        if buf[pos] == ']':
+            return
+        if buf[pos] != ',':
+            raise ValueError(f"JSON 数组元素之间缺少逗号（位置 {pos}）")
+        pos += 1
+
+
+def save_data(data: List[Dict], output_file: str) -> bool:
     """
     保存数据到 JSON 文件
     
+    先写入同目录下的临时文件，再用 os.replace 原子替换，
+    写入中途崩溃不会留下半个 JSON 文件
+    
     Args:
         data: 要保存的数据列表
         output_file: 输出文件路径
+    
+    Returns:
+        是否保存成功
     """
+    tmp_file = output_file + '.tmp'
     try:
         # 确保目录存在
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        with open(output_file, 'w', encoding='utf-8') as f:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, output_file)
+        return True
     except Exception as e:
         print(f"⚠️ 保存失败: {e}")
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+        return False
+
+
+class SnapshotWriter:
+    """
+    后台快照写入线程
+    
+    事件循环只提交快照，不等待磁盘；写入尚未开始时的多次提交会合并，
+    只写入最新的一份
+    """
+    
+    def __init__(self, output_file: str, stats=None):
+        """
+        Args:
+            output_file: 输出文件路径
+            stats: 可选的统计对象，用于记录写入次数和耗时
+        """
+        self.output_file = output_file
+        self.stats = stats
+        self.last_ok = True
+        self._pending: Optional[List[Dict]] = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+        self._thread.start()
+    
+    def submit(self, data: List[Dict]):
+        """
+        提交快照（立即返回）
+        
+        Args:
+            data: 当前完整数据列表（内部做浅拷贝，调用方可继续修改原列表）
+        """
+        snapshot = list(data)
+        with self._cond:
+            if self._pending is not None and self.stats:
+                self.stats.snapshot_coalesced += 1
+            self._pending = snapshot
+            self._cond.notify()
+    
+    def close(self) -> bool:
+        """
+        写完最后一份快照并停止线程（阻塞，事件循环中应通过 asyncio.to_thread 调用）
+        
+        Returns:
+            最后一次写入是否成功
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        return self.last_ok
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                data, self._pending = self._pending, None
+            
+            start = time.perf_counter()
+            self.last_ok = save_data(data, self.output_file)
+            duration = time.perf_counter() - start
+            
+            if self.stats:
+                self.stats.snapshot_writes += 1
+                self.stats.snapshot_seconds += duration
+                self.stats.snapshot_last_seconds = duration
+                self.stats.snapshot_max_seconds = max(self.stats.snapshot_max_seconds, duration)
+
+
+def load_tuning_state(state_file: str) -> Dict:
+    """
+    读取上次运行调优得到的参数（如自适应批大小）
+    
+    Args:
+        state_file: 状态文件路径
+    
+    Returns:
+        状态字典，文件不存在或损坏时返回空字典
+    """
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except Exception:
+        return {}
+
+
+def save_tuning_state(state_file: str, updates: Dict) -> bool:
+    """
+    合并更新调优参数并保存
+    
+    Args:
+        state_file: 状态文件路径
+        updates: 要更新的键值
+    
+    Returns:
+        是否保存成功
+    """
+    state = load_tuning_state(state_file)
+    state.update(updates)
+    state['updated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return save_data(state, state_file)
+
+
+def get_journal_file(output_file: str) -> str:
+    """
+    获取输出文件对应的结果日志路径
+    
+    Args:
+        output_file: 输出文件路径，如 noob_characters-chants-en-cn.json
+    
+    Returns:
+        日志文件路径，如 noob_characters-chants-en-cn.journal.jsonl
+    """
+    return os.path.splitext(output_file)[0] + '.journal.jsonl'
+
+
+class ResultJournal:
+    """
+    只追加的结果日志（JSONL）
+    
+    每个批次完成后立即追加并 fsync，进程崩溃或 Ctrl-C 时最多丢失正在写入的那一批；
+    下次启动时由 load_history_data 回放到快照之上。
+    append 返回（fsync 完成）后这一批记录才算已持久化；在事件循环中通过 asyncio.to_thread 调用，
+    同一时刻只能有一个 append 在执行
+    """
+    
+    def __init__(self, journal_file: str):
+        self.journal_file = journal_file
+        self._file = None
+    
+    def open(self):
+        """打开日志文件（追加模式）"""
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+            self._file = open(self.journal_file, 'a', encoding='utf-8')
+        return self
+    
+    def append(self, records: List[Dict]):
+        """
+        追加记录并落盘（阻塞直到 fsync 完成）
+        
+        Args:
+            records: 处理完成的数据列表
+        """
+        if not records:
+            return
+        self.open()
+        lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        self._file.write(lines)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+    
+    def close(self):
+        """关闭日志文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def clear(self):
+        """关闭并删除日志文件（内容已合并进快照后调用）"""
+        self.close()
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+
+def replay_journal(journal_file: str) -> Iterator[Dict]:
+    """
+    逐行读取结果日志
+    
+    崩溃时最后一行可能只写了一半，无法解析的行直接跳过
+    
+    Args:
+        journal_file: 日志文件路径
+    
+    Yields:
+        日志中的每条记录
+    """
+    if not os.path.exists(journal_file):
+        return
+    with open(journal_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict):
+                yield record
+
+
+def _load_merged_records(output_file: str) -> Tuple[List[Dict], int]:
+    """
+    读取快照并回放日志，同一 tag 以日志中最新的记录为准
+    
+    Returns:
+        (合并后的记录列表, 回放的日志记录数)
+    """
+    records: Dict[str, Dict] = {}
+    
+    if os.path.exists(output_file):
+        try:
+            with open(output_file, 'r', encoding='utf-8') as f:
+                for item in iter_json_array(f):
+                    tag = item.get('tag')
+                    if tag:
+                        records[tag] = item
+        except Exception:
+            pass
+    
+    replayed = 0
+    for item in replay_journal(get_journal_file(output_file)):
+        tag = item.get('tag')
+        if tag:
+            records[tag] = item
+            replayed += 1
+    
+    return list(records.values()), replayed
+
+
+def compact_journal(output_file: str) -> int:
+    """
+    将结果日志合并进正式输出文件，并删除日志
+    
+    Args:
+        output_file: 输出文件路径
+    
+    Returns:
+        合并的日志记录数
+    """
+    journal_file = get_journal_file(output_file)
+    if not os.path.exists(journal_file):
+        return 0
+    
+    records, replayed = _load_merged_records(output_file)
+    if save_data(records, output_file):
+        os.remove(journal_file)
+    return replayed
 
 
 def load_history_data(output_file: str, debug_mode: bool = False) -> Tuple[List[Dict], Set[str], Set[str]]:
     """
     加载历史数据，区分完整和不完整的数据
     
+    未合并的结果日志会回放到快照之上，上次中断前已完成的记录不会重复处理
+    
     Args:
         output_file: 历史数据文件路径
         debug_mode: 是否为 debug 模式（debug 模式忽略历史数据）
@@ -44,30 +384,27 @@ def load_history_data(output_file: str, debug_mode: bool = False) -> Tuple[List[
         print("🐛 Debug 模式：忽略历史数据，重新处理所有角色")
         return complete_data, incomplete_tags, existing_tags
     
-    # 读取历史数据
-    if os.path.exists(output_file):
-        try:
-            with open(output_file, 'r', encoding='utf-8') as f:
-                history_data = json.load(f)
-            for item in history_data:
-                tag = item.get('tag')
-                cn_name = item.get('cn_name')
-                image_url = item.get('image_url')
-                
-                if tag:
-                    existing_tags.add(tag)
-                    
-                    # 检查数据是否完整
-                    is_complete = (
-                        cn_name and str(cn_name).strip() and 
-                        image_url and str(image_url).startswith('http')
-                    )
-                    
-                    if is_complete:
-                        complete_data.append(item)  # 完整数据保留
-                    else:
-                        incomplete_tags.add(tag)    # 不完整数据标记为待处理
-        except Exception:
-            pass
+    # 读取历史数据（快照 + 上次运行未合并的日志）
+    history_data, replayed = _load_merged_records(output_file)
+    if replayed:
+        print(f"📜 已从结果日志恢复 {replayed} 条记录")
+    
+    for item in history_data:
+        tag = item.get('tag')
+        cn_name = item.get('cn_name')
+        image_url = item.get('image_url')
+        
+        existing_tags.add(tag)
+        
+        # 检查数据是否完整
+        is_complete = (
+            cn_name and str(cn_name).strip() and 
+            image_url and str(image_url).startswith('http')
+        )
+        
+        if is_complete:
+            complete_data.append(item)  # 完整数据保留
+        else:
+            incomplete_tags.add(tag)    # 不完整数据标记为待处理
     
     return complete_data, incomplete_tags, existing_tags
@@ -1,4 +1,5 @@
 import asyncio
+import gzip
 import json
 import os
 import aiohttp
@@ -49,6 +50,8 @@ if CONFIG:
     
     # 处理配置
     SAVE_INTERVAL_BATCHES = CONFIG['processing'].get('save_interval_batches', 5)
+    WORKERS = CONFIG['processing'].get('workers', 10)
+    QUEUE_SIZE = CONFIG['processing'].get('queue_size', 20)
     
     # 路径配置
     INPUT_URL = CONFIG['paths'].get('input_url')
@@ -67,6 +70,8 @@ else:
     IMG_RETRY_TIMES = 2
     IMG_RETRY_DELAY = 1
     SAVE_INTERVAL_BATCHES = 5
+    WORKERS = 10
+    QUEUE_SIZE = 20
     
     INPUT_URL = "https://raw.githubusercontent.com/DominikDoom/a1111-sd-webui-tagcomplete/refs/heads/main/tags/noob_characters-chants.json"
     OUTPUT_FILE = os.path.join(BASE_DIR, '..', 'output', 'noob_characters-chants-en-cn.json')
@@ -467,6 +472,57 @@ async def pipeline_batch(session: aiohttp.ClientSession, batch_data: List[Dict])
     
     return final_items
 
+async def stream_pipeline(session: aiohttp.ClientSession, batches, workers: int):
+    """
+    生产者/消费者流水线：固定数量的工作协程从有界队列中取批次处理，
+    结果按完成顺序逐批产出，内存中同时存在的批次数量与输入总量无关
+    
+    Args:
+        batches: 批次生成器
+        workers: 工作协程数量
+    """
+    workers = max(1, workers)
+    in_queue = asyncio.Queue(maxsize=max(1, QUEUE_SIZE))
+    out_queue = asyncio.Queue(maxsize=max(1, QUEUE_SIZE))
+    done = object()
+    
+    async def _producer():
+        for batch in batches:
+            await in_queue.put(batch)
+        for _ in range(workers):
+            await in_queue.put(done)
+    
+    async def _worker():
+        while True:
+            batch = await in_queue.get()
+            if batch is done:
+                await out_queue.put(done)
+                return
+            try:
+                result = await pipeline_batch(session, batch)
+            except Exception as e:
+                await out_queue.put(e)
+                return
+            await out_queue.put(result)
+    
+    tasks = [asyncio.create_task(_producer())]
+    tasks += [asyncio.create_task(_worker()) for _ in range(workers)]
+    
+    try:
+        finished_workers = 0
+        while finished_workers < workers:
+            result = await out_queue.get()
+            if result is done:
+                finished_workers += 1
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
 def save_data(data: List[Dict], output_file: str = None):
     """辅助函数：保存数据到磁盘
     
@@ -509,7 +565,11 @@ def load_tags_from_file(filepath: str) -> Dict[str, Dict]:
         如果加载失败返回空字典
     """
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
+        # 缓存可能是 gzip 压缩的（与 main.py 共用 config.json 中的缓存路径）
+        with open(filepath, 'rb') as f:
+            is_gzip = f.read(2) == b'\x1f\x8b'
+        opener = gzip.open if is_gzip else open
+        with opener(filepath, 'rt', encoding='utf-8') as f:
             data = json.load(f)
         
         # 从 JSON 数组中提取 terms 为 "Character" 的数据
@@ -575,8 +635,9 @@ async def fetch_tags_from_url(url: str, cache_file: str = None) -> Dict[str, Dic
                     try:
                         # 确保目录存在
                         os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-                        with open(cache_file, 'w', encoding='utf-8') as f:
-                            json.dump(data, f, ensure_ascii=False, indent=2)
+                        opener = gzip.open if cache_file.endswith('.gz') else open
+                        with opener(cache_file, 'wt', encoding='utf-8') as f:
+                            json.dump(data, f, ensure_ascii=False)
                         print(f"💾 原始数据已缓存至: {cache_file}")
                     except Exception as e:
                         print(f"⚠️ 警告: 缓存文件保存失败 - {e}")
@@ -670,6 +731,8 @@ def parse_args():
                         help=f'LLM 并发数（默认: {LLM_CONCURRENCY}）')
     parser.add_argument('--img-concurrency', type=int, default=IMG_CONCURRENCY,
                         help=f'图片搜索并发数（默认: {IMG_CONCURRENCY}）')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help=f'流水线工作协程数（默认: {WORKERS}）')
     
     # 批处理配置
     parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
@@ -776,32 +839,31 @@ async def main():
     # 构建待处理的数据列表（两部分数据）
     # 1. 远程新增的 tag（本地不存在）
     # 2. 本地已有但不完整的 tag（需重新处理）
-    data_to_process = [
-        {"tag": tag, "color": info["color"], "content": info["content"]}
-        for tag, info in tags_dict.items()
+    pending_tags = [
+        tag for tag in tags_dict
         if tag not in existing_tags or tag in incomplete_tags
     ]
 
-    if not data_to_process:
+    if not pending_tags:
         print("🎉 所有数据均已完整，无需处理！")
         return
 
-    print(f"🔥 本次需处理: {len(data_to_process)} 个角色")
+    print(f"🔥 本次需处理: {len(pending_tags)} 个角色")
 
     # 3. 创建任务队列
     # 使用同一个 ClientSession 可以复用 TCP 连接，显著提升 SSL 握手速度
     timeout = aiohttp.ClientTimeout(total=90) # 给整个链路更长的宽容度
     async with aiohttp.ClientSession(timeout=timeout) as session:
         
-        # 将所有待处理数据分组
-        batches = [data_to_process[i : i + args.batch_size] for i in range(0, len(data_to_process), args.batch_size)]
-        
-        tasks = []
-        for batch in batches:
-            # 创建所有批次的协程任务
-            # 注意：它们不会立刻全部执行，而是会被信号量(Semaphore)卡住
-            task = asyncio.create_task(pipeline_batch(session, batch))
-            tasks.append(task)
+        # 按需生成批次，由固定数量的工作协程从有界队列中消费
+        # 注意：不再一次性为所有批次创建任务，内存占用与输入总量无关
+        batches = (
+            [
+                {"tag": tag, "color": tags_dict[tag]["color"], "content": tags_dict[tag]["content"]}
+                for tag in pending_tags[i : i + args.batch_size]
+            ]
+            for i in range(0, len(pending_tags), args.batch_size)
+        )
         
         # 4. 异步执行并显示进度
         # current_data 用于在内存中累积数据（只保留完整的旧数据）
@@ -809,11 +871,10 @@ async def main():
         finished_batches = 0
         
         # 使用角色数量而不是批次数量来显示进度
-        total_characters = len(data_to_process)
+        total_characters = len(pending_tags)
         pbar = tqdm(total=total_characters, desc="🚀 处理中", unit="角色")
         
-        for coro in asyncio.as_completed(tasks):
-            batch_result = await coro
+        async for batch_result in stream_pipeline(session, batches, args.workers):
             current_data.extend(batch_result)
             finished_batches += 1
             stats.total_processed += len(batch_result)
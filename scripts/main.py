@@ -8,6 +8,7 @@ import asyncio
 import argparse
 import os
 import sys
+from urllib.parse import urlparse
 import aiohttp
 from dotenv import load_dotenv
 from tqdm.asyncio import tqdm
@@ -15,13 +16,32 @@ from tqdm.asyncio import tqdm
 # 导入自定义模块
 from card_generator.config import Config
 from card_generator.stats import Stats
-from card_generator.file_utils import save_data, load_history_data
-from card_generator.llm import load_source_name_mapping
+from card_generator.utils.file import (
+    SnapshotWriter,
+    load_history_data,
+    get_journal_file,
+    ResultJournal,
+    compact_journal,
+    load_tuning_state,
+    save_tuning_state
+)
+from card_generator.llm import load_source_name_mapping, get_prompt_version, MAX_TOKENS
+from card_generator.batch_sizer import AdaptiveBatchSizer
+from card_generator.concurrency import LimiterRegistry
+from card_generator.rate_limit import configure_rate_limits, rate_limit_summary
+from card_generator.llm_cache import TranslationCache
+from card_generator.llm_batch import run_batch_job
+from card_generator.llm_pool import build_endpoint_pool, set_endpoint_pool
+from card_generator.image_source import ImageResultStore
+from card_generator.safebooru import SafebooruImageSource, BatchedSafebooruImageSource
+from card_generator.roster import get_roster_registry
 from card_generator.data_processor import (
     load_tags_from_file,
     fetch_tags_from_url,
     apply_debug_filter,
-    pipeline_batch
+    iter_batches_with_cache,
+    stream_pipeline,
+    get_image_manager
 )
 
 # 加载环境变量
@@ -46,6 +66,9 @@ def parse_args(config: Config):
   
   # 自定义并发数
   python %(prog)s --llm-concurrency 10 --img-concurrency 20
+  
+  # 全量重建：通过批处理接口离线翻译
+  python %(prog)s --llm-mode batch
         ''')
     
     # 数据处理选项
@@ -57,16 +80,43 @@ def parse_args(config: Config):
                         help='强制从 URL 重新拉取源数据（忽略本地缓存）')
     parser.add_argument('--debug', action='store_true',
                         help='Debug 模式：忽略历史数据，输出到 debug_output.json，不影响正式文件')
+    parser.add_argument('--compact', action='store_true',
+                        help='只将上次中断留下的结果日志合并进正式文件，然后退出')
     
     # 并发控制
     parser.add_argument('--llm-concurrency', type=int, default=config.llm_concurrency,
                         help=f'LLM 并发数（默认: {config.llm_concurrency}）')
     parser.add_argument('--img-concurrency', type=int, default=config.img_concurrency,
                         help=f'图片搜索并发数（默认: {config.img_concurrency}）')
+    parser.add_argument('--no-adaptive-concurrency', action='store_true',
+                        help='使用固定并发数，不根据限流/错误/延迟自动调整')
+    parser.add_argument('--workers', type=int, default=config.workers,
+                        help=f'流水线工作协程数（默认: {config.workers}）')
+    
+    # LLM 请求方式
+    parser.add_argument('--llm-mode', choices=['interactive', 'batch'], default='interactive',
+                        help='interactive: 实时请求；batch: 先通过批处理接口（/files、/batches）离线翻译所有未缓存的标签，'
+                             '结果写入翻译缓存后再进行搜图，中断后再次运行会继续同一个任务（默认: interactive）')
     
     # 批处理配置
-    parser.add_argument('--batch-size', type=int, default=config.batch_size,
-                        help=f'批处理大小（默认: {config.batch_size}）')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help=f'初始批处理大小（默认: 上次运行调优的结果，没有时为 {config.batch_size}）')
+    parser.add_argument('--no-adaptive-batch', action='store_true',
+                        help='固定批大小，不根据 LLM 响应自动调整')
+    
+    # 翻译缓存
+    parser.add_argument('--no-llm-cache', action='store_true',
+                        help='不读取翻译缓存（新结果仍会写入缓存）')
+    parser.add_argument('--llm-cache-ttl', type=float, default=config.llm_cache_ttl_days,
+                        help=f'翻译缓存有效期，单位天，0 表示永不过期（默认: {config.llm_cache_ttl_days}）')
+    
+    # 图片搜索结果存储
+    parser.add_argument('--no-image-store', action='store_true',
+                        help='不使用图片搜索结果存储（所有标签重新请求图片源）')
+    parser.add_argument('--image-miss-ttl', type=float, default=config.img_miss_ttl_days,
+                        help=f'无图结果的有效期，单位天，期内跳过该标签的搜索，0 表示不缓存无图结果（默认: {config.img_miss_ttl_days}）')
+    parser.add_argument('--no-image-batch', action='store_true',
+                        help='不合并 Safebooru 查询（每个标签单独请求）')
     
     return parser.parse_args()
 
@@ -80,15 +130,51 @@ async def main():
     # 解析命令行参数
     args = parse_args(config)
     
+    # 只合并结果日志
+    if args.compact:
+        merged = compact_journal(config.output_file)
+        print(f"📜 已合并 {merged} 条日志记录至 {config.output_file}")
+        return
+    
     # 检查 LLM 配置
     config.check_llm_config()
     
     # 加载作品名称映射表
     source_name_mapping = load_source_name_mapping(config.mapping_file)
     
-    # 初始化信号量
+    # 按主机限速（令牌桶），所有图片源和 LLM 请求共用
+    configure_rate_limits(config.rate_limit)
+    
+    # 初始化并发限制：默认使用固定并发数（命令行 --llm-concurrency / --img-concurrency）；
+    # config.json 中 llm.adaptive_concurrency 设为 true 时改用 AIMD 自适应限制器
+    # （LLM 按主机、图片按图片源各自独立，命令行并发数作为初始值，--no-adaptive-concurrency 可临时关闭）
     sem_llm = asyncio.Semaphore(args.llm_concurrency)
     sem_img = asyncio.Semaphore(args.img_concurrency)
+    llm_limiters = img_limiters = None
+    if config.adaptive_concurrency and not args.no_adaptive_concurrency:
+        llm_limiters = LimiterRegistry(args.llm_concurrency, 1, max(args.llm_concurrency, config.llm_max_concurrency))
+        img_limiters = LimiterRegistry(args.img_concurrency, 1, max(args.img_concurrency, config.img_max_concurrency))
+        sem_llm = llm_limiters.get(urlparse(config.llm_api_url).netloc or 'llm')
+        get_image_manager().set_limiters(img_limiters)
+    
+    # LLM 端点池：config.json 中配置了额外端点时，请求按负载分配到各端点（各自独立的并发和速率）
+    endpoint_pool = build_endpoint_pool(
+        config, args.llm_concurrency,
+        config.adaptive_concurrency and not args.no_adaptive_concurrency
+    )
+    set_endpoint_pool(endpoint_pool)
+    if endpoint_pool:
+        print(f"🔀 LLM 端点池: {', '.join(ep.name for ep in endpoint_pool.endpoints)}")
+    
+    # 批大小：命令行 > 上次调优结果 > 配置文件
+    tuning_state = load_tuning_state(config.tuning_state_file)
+    batch_size = args.batch_size or tuning_state.get('llm_batch_size') or config.batch_size
+    batch_sizer = None
+    if config.adaptive_batch and not args.no_adaptive_batch:
+        batch_sizer = AdaptiveBatchSizer(
+            batch_size, config.min_batch_size, config.max_batch_size,
+            config.target_latency, max_output_tokens=MAX_TOKENS
+        )
     
     # 1. 读取输入数据（优先使用缓存，除非强制更新）
     tags_dict = {}
@@ -129,52 +215,125 @@ async def main():
         print("  3. 每次运行清空上次的 debug 结果")
         print("="*60 + "\n")
     
-    print(f"⚡ 并发配置: LLM x {args.llm_concurrency} | Image x {args.img_concurrency}")
+    print(f"⚡ 并发配置: LLM x {args.llm_concurrency} | Image x {args.img_concurrency} | Worker x {args.workers}")
+    print(f"📦 批大小: {batch_size}{'（自适应）' if batch_sizer else ''}")
     print(f"🔄 重试配置: LLM {config.llm_retry_times}次 | Image {config.img_retry_times}次")
 
     # 2. 读取历史数据
     complete_data, incomplete_tags, existing_tags = load_history_data(
         config.output_file, args.debug
     )
+    
+    # 结果日志：每批完成即追加落盘，中断后下次启动自动回放
+    output_file = config.debug_output_file if args.debug else config.output_file
+    journal = ResultJournal(get_journal_file(output_file))
+    if args.debug:
+        # Debug 模式每次运行清空上次的结果
+        journal.clear()
 
-    # 构建待处理的数据列表
-    data_to_process = [
-        {"tag": tag, "color": info["color"], "content": info["content"]}
-        for tag, info in tags_dict.items()
+    # 待处理的 tag：远程新增的 + 本地不完整的
+    pending_tags = [
+        tag for tag in tags_dict
         if tag not in existing_tags or tag in incomplete_tags
     ]
 
-    if not data_to_process:
+    if not pending_tags:
         print("🎉 所有数据均已完整，无需处理！")
         return
 
-    print(f"🔥 本次需处理: {len(data_to_process)} 个角色")
+    print(f"🔥 本次需处理: {len(pending_tags)} 个角色")
 
-    # 3. 创建任务队列
+    # 3. 流式任务队列：批次按需生成，由固定数量的工作协程消费
     timeout = aiohttp.ClientTimeout(total=90)
+    # 快照在后台线程写入，事件循环不等待磁盘
+    snapshot_writer = SnapshotWriter(output_file, stats)
+    
+    # 翻译缓存：命中的标签在分批前直接填充，不再请求 LLM
+    translation_cache = None
+    if config.llm_cache_enabled:
+        translation_cache = TranslationCache(
+            config.llm_cache_file, config.llm_model, get_prompt_version(config), args.llm_cache_ttl
+        )
+        print(f"💾 翻译缓存: {config.llm_cache_file}（提示词版本 {translation_cache.prompt_version}）")
+    
+    # 批处理模式：先离线翻译所有未缓存的标签并写入翻译缓存，之后的流水线直接命中缓存
+    if args.llm_mode == 'batch':
+        if not translation_cache:
+            print("❌ 批处理模式需要启用翻译缓存（llm.cache_enabled）")
+            journal.close()
+            return
+        # 角色名册能直接解析的标签由流水线使用官方译名，不提交批处理任务
+        registry = get_roster_registry()
+        batch_tags = [tag for tag in pending_tags if not registry.lookup(tag)]
+        if len(batch_tags) < len(pending_tags):
+            print(f"📚 角色名册命中 {len(pending_tags) - len(batch_tags)} 个标签，不提交批处理任务")
+        # --no-llm-cache 在批处理模式下表示重新翻译所有标签
+        cached = {} if args.no_llm_cache else translation_cache.get_many(batch_tags)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            batch_ok = await run_batch_job(
+                session, ({"tag": tag} for tag in batch_tags if tag not in cached),
+                config, sem_llm, translation_cache, source_name_mapping, stats, batch_size
+            )
+        if not batch_ok:
+            print("❌ 批处理任务没有返回任何结果")
+            translation_cache.close()
+            journal.close()
+            return
+    
+    # 图片搜索结果存储：已知有图/无图的标签在有效期内不请求网络
+    image_store = None
+    if config.img_store_enabled and not args.no_image_store:
+        image_store = ImageResultStore(
+            config.img_store_file, config.img_hit_ttl_days, args.image_miss_ttl
+        )
+        get_image_manager().set_result_store(image_store)
+        print(f"💾 图片结果存储: {config.img_store_file}（无图有效期 {args.image_miss_ttl} 天）")
+    
+    # 图片源熔断：连续失败的图片源在冷却时间内直接跳过
+    get_image_manager().set_breaker(
+        config.img_breaker_failures, config.img_breaker_cooldown, config.img_health_window
+    )
+    
+    # Safebooru 合并查询：同时等待搜图的标签合并为一个 OR 查询
+    if config.img_batch_enabled and not args.no_image_batch:
+        get_image_manager().replace_source(BatchedSafebooruImageSource(
+            config.img_batch_max_tags, config.img_batch_limit, config.img_batch_window,
+            config.img_solo_min_count, config.img_prefilter_batch,
+            config.img_candidates, config.img_target_aspect
+        ))
+        print(f"📦 Safebooru 合并查询: 每次最多 {config.img_batch_max_tags} 个标签")
+    else:
+        get_image_manager().replace_source(SafebooruImageSource(
+            config.img_solo_min_count, config.img_prefilter_batch,
+            config.img_candidates, config.img_target_aspect
+        ))
+    
     async with aiohttp.ClientSession(timeout=timeout) as session:
         
-        # 将所有待处理数据分组
-        batches = [data_to_process[i : i + args.batch_size] for i in range(0, len(data_to_process), args.batch_size)]
-        
-        tasks = []
-        for batch in batches:
-            # 创建所有批次的协程任务
-            task = asyncio.create_task(
-                pipeline_batch(session, batch, config, sem_llm, sem_img, stats, source_name_mapping)
-            )
-            tasks.append(task)
+        data_to_process = (
+            {"tag": tag, "color": tags_dict[tag]["color"], "content": tags_dict[tag]["content"]}
+            for tag in pending_tags
+        )
+        batches = iter_batches_with_cache(
+            data_to_process, batch_size,
+            None if args.no_llm_cache and args.llm_mode != 'batch' else translation_cache,
+            stats, source_name_mapping, batch_sizer
+        )
         
         # 4. 异步执行并显示进度
         current_data = complete_data.copy()
         finished_batches = 0
         
         # 使用角色数量而不是批次数量来显示进度
-        total_characters = len(data_to_process)
+        total_characters = len(pending_tags)
         pbar = tqdm(total=total_characters, desc="🚀 处理中", unit="角色")
         
-        for coro in asyncio.as_completed(tasks):
-            batch_result = await coro
+        async for batch_result in stream_pipeline(
+            session, batches, config, sem_llm, sem_img, stats, source_name_mapping,
+            args.workers, config.queue_size, translation_cache, batch_sizer
+        ):
+            # 写入和 fsync 在线程中执行，等待落盘期间其他请求照常进行；返回后这一批才算已持久化
+            await asyncio.to_thread(journal.append, batch_result)
             current_data.extend(batch_result)
             finished_batches += 1
             stats.total_processed += len(batch_result)
@@ -190,19 +349,64 @@ async def main():
                 postfix_dict['LLM'] = f"{stats.llm_success/llm_total*100:.0f}%"
             if img_total > 0:
                 postfix_dict['图片'] = f"{stats.img_success/img_total*100:.0f}%"
+            open_sources = [name for name, h in get_image_manager().health.items() if h.state != 'closed']
+            if open_sources:
+                postfix_dict['熔断'] = ','.join(open_sources)
+            if batch_sizer:
+                postfix_dict['批'] = batch_sizer.size
+            if llm_limiters:
+                postfix_dict['并发'] = '/'.join(
+                    str(limiter.current_limit)
+                    for limiter in (*llm_limiters.limiters.values(), *img_limiters.limiters.values())
+                )
+            if stats.snapshot_writes > 0:
+                postfix_dict['存盘'] = f"{stats.snapshot_last_seconds:.2f}s"
             if postfix_dict:
                 pbar.set_postfix(postfix_dict)
             
-            # 定期存盘，而不是每批次都存
+            # 定期存盘，而不是每批次都存；缓存的写入同时提交
             if finished_batches % config.save_interval_batches == 0:
-                output_file = config.debug_output_file if args.debug else config.output_file
-                save_data(current_data, output_file)
+                snapshot_writer.submit(current_data)
+                if translation_cache:
+                    translation_cache.flush()
+                if image_store:
+                    image_store.flush()
         
         pbar.close()
         
-        # 最后再一次性保存，确保数据完整
-        output_file = config.debug_output_file if args.debug else config.output_file
-        save_data(current_data, output_file)
+        # 最后再一次性保存，确保数据完整；快照写入成功后日志已无用
+        snapshot_writer.submit(current_data)
+        if await asyncio.to_thread(snapshot_writer.close):
+            journal.clear()
+        else:
+            journal.close()
+    
+    stats.rate_limit_summary = rate_limit_summary()
+    stats.img_source_health = get_image_manager().health_summary()
+    
+    if endpoint_pool:
+        stats.llm_endpoint_summary = endpoint_pool.summary()
+        set_endpoint_pool(None)
+    
+    if llm_limiters:
+        stats.limiter_summary = {**llm_limiters.summary(), **img_limiters.summary()}
+        get_image_manager().set_limiters(None)
+    
+    # 记录批大小调整结果，下次运行从调优后的值开始
+    if batch_sizer:
+        stats.batch_size_summary = batch_sizer.summary()
+        stats.batch_size_decisions = batch_sizer.decisions
+        if not args.debug:
+            save_tuning_state(config.tuning_state_file, {
+                'llm_batch_size': batch_sizer.size,
+                'llm_batch_size_history': stats.batch_size_summary,
+            })
+    
+    if translation_cache:
+        translation_cache.close()
+    if image_store:
+        get_image_manager().set_result_store(None)
+        image_store.close()
     
     # 打印统计报告
     stats.print_summary()
@@ -0,0 +1,62 @@
+"""
+测试公共工具：把 scripts 目录加入导入路径，提供本地 aiohttp 测试服务器和测试配置
+"""
+
+import os
+import re
+import sys
+
+from aiohttp import web
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from card_generator.config import Config  # noqa: E402
+
+
+async def start_server(app: web.Application):
+    """
+    在随机端口启动测试服务器
+
+    Returns:
+        (runner, 根地址)，用完后调用 runner.cleanup()
+    """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def make_config(tmp_path, api_url: str) -> Config:
+    """不读取 config.json 的测试配置（非流式、单次重试、无等待）"""
+    config = Config(str(tmp_path))
+    config.llm_api_url = api_url
+    config.llm_api_key = 'test-key'
+    config.llm_model = 'test-model'
+    config.llm_stream = False
+    config.llm_retry_times = 1
+    config.llm_retry_delay = 0
+    config.llm_batch_poll_interval = 0
+    config.llm_batch_state_file = str(tmp_path / 'llm_batch_state.json')
+    return config
+
+
+def prompt_tags(prompt: str):
+    """从提示词中取出编号后的标签列表"""
+    return re.findall(r'^\d+\. (\S+)$', prompt, re.MULTILINE)
+
+
+def translation(tag: str):
+    """测试用的有效翻译条目"""
+    return {
+        'tag': tag,
+        'cn_name': f'中文{tag}',
+        'cn_name_status': '推断译名',
+        'en_name': tag.title(),
+        'source_cn': '测试作品',
+        'source_en': 'Test Work',
+        'source_name_status': '推断译名',
+    }
@@ -0,0 +1,106 @@
+"""
+批处理模式：本地模拟 /files、/batches 接口，覆盖提交 → 轮询 → 下载结果 → 写入翻译缓存
+"""
+
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+
+from conftest import start_server, make_config, prompt_tags, translation
+from card_generator.llm import get_prompt_version
+from card_generator.llm_batch import run_batch_job, load_batch_state
+from card_generator.llm_cache import TranslationCache
+from card_generator.llm_pool import set_endpoint_pool
+from card_generator.stats import Stats
+
+
+def build_app(state):
+    """批处理接口和实时接口的模拟服务器；结果文件中 tag_b 缺失、tag_a 重复（第二条无效）"""
+    async def upload(request):
+        form = await request.post()
+        state['input'] = form['file'].file.read().decode('utf-8')
+        return web.json_response({'id': 'file-in'})
+
+    async def create_batch(request):
+        body = await request.json()
+        assert body['input_file_id'] == 'file-in'
+        return web.json_response({'id': 'batch-1', 'status': 'validating'})
+
+    async def get_batch(request):
+        state['polls'] += 1
+        if state['polls'] < 2:
+            return web.json_response({'id': 'batch-1', 'status': 'in_progress'})
+        return web.json_response({'id': 'batch-1', 'status': 'completed', 'output_file_id': 'file-out'})
+
+    async def output_content(request):
+        lines = []
+        for line in state['input'].splitlines():
+            req = json.loads(line)
+            tags = prompt_tags(req['body']['messages'][1]['content'])
+            items = [translation(tag) for tag in tags if tag != 'tag_b']
+            if 'tag_a' in tags:
+                items.append({**translation('tag_a'), 'cn_name': '重复'})
+            body = {
+                'choices': [{'message': {'content': json.dumps(items, ensure_ascii=False)}}],
+                'usage': {'prompt_tokens': 10, 'completion_tokens': 20},
+            }
+            lines.append(json.dumps({
+                'custom_id': req['custom_id'],
+                'response': {'status_code': 200, 'body': body},
+            }, ensure_ascii=False))
+        return web.Response(text='\n'.join(lines) + '\n')
+
+    async def chat(request):
+        body = await request.json()
+        tags = prompt_tags(body['messages'][1]['content'])
+        state['repairs'].append(tags)
+        content = json.dumps([translation(tag) for tag in tags], ensure_ascii=False)
+        return web.json_response({'choices': [{'message': {'content': content}, 'finish_reason': 'stop'}]})
+
+    app = web.Application()
+    app.router.add_post('/v1/files', upload)
+    app.router.add_post('/v1/batches', create_batch)
+    app.router.add_get('/v1/batches/batch-1', get_batch)
+    app.router.add_get('/v1/files/file-out/content', output_content)
+    app.router.add_post('/v1/chat/completions', chat)
+    return app
+
+
+def test_submit_poll_ingest(tmp_path):
+    set_endpoint_pool(None)
+    state = {'polls': 0, 'repairs': []}
+
+    async def scenario():
+        runner, base = await start_server(build_app(state))
+        try:
+            config = make_config(tmp_path, f"{base}/v1/chat/completions")
+            cache = TranslationCache(str(tmp_path / 'llm_cache.sqlite3'), config.llm_model, get_prompt_version(config))
+            stats = Stats()
+            tags = ['tag_a', 'tag_b', 'tag_c', 'tag_d']
+            async with aiohttp.ClientSession() as session:
+                ok = await run_batch_job(
+                    session, ({'tag': tag} for tag in tags), config, asyncio.Semaphore(2),
+                    cache, None, stats, 2
+                )
+            return ok, cache.get_many(tags), stats
+        finally:
+            await runner.cleanup()
+
+    ok, cached, stats = asyncio.run(scenario())
+
+    assert ok
+    assert state['polls'] == 2
+    # 结果中缺失的标签经补全轮次（实时请求）得到翻译
+    assert state['repairs'] == [['tag_b']]
+    assert set(cached) == {'tag_a', 'tag_b', 'tag_c', 'tag_d'}
+    # 重复条目取第一个
+    assert cached['tag_a']['cn_name'] == '中文tag_a'
+    assert stats.llm_batch_ingested == 4
+    assert stats.llm_batch_failed == 0
+    # 批处理结果只写入缓存，不计入实时模式的成功数
+    assert stats.llm_success == 0
+    assert stats.llm_token_usage['batch/verbose']['requests'] == 2
+    # 任务完成后清理状态
+    assert load_batch_state(str(tmp_path / 'llm_batch_state.json')) is None
@@ -0,0 +1,190 @@
+"""
+LLM 端点池：本地模拟多个端点，覆盖对冲请求、故障端点移除和请求计数释放
+"""
+
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+
+from conftest import start_server, make_config
+from card_generator.llm import call_llm_custom, _start_attempt
+from card_generator.llm_pool import LLMEndpoint, LLMEndpointPool, build_endpoint_pool, set_endpoint_pool
+
+
+def build_app(calls):
+    """三个端点：slow 延迟 1 秒，fast 立即返回，bad 返回 500"""
+    def reply(name):
+        content = json.dumps([{'endpoint': name}])
+        return web.json_response({'choices': [{'message': {'content': content}, 'finish_reason': 'stop'}]})
+
+    async def slow(request):
+        calls.append('slow')
+        await asyncio.sleep(1)
+        return reply('slow')
+
+    async def fast(request):
+        calls.append('fast')
+        return reply('fast')
+
+    async def bad(request):
+        calls.append('bad')
+        return web.Response(status=500)
+
+    app = web.Application()
+    app.router.add_post('/slow', slow)
+    app.router.add_post('/fast', fast)
+    app.router.add_post('/bad', bad)
+    return app
+
+
+def endpoint(base, name):
+    return LLMEndpoint(name, f"{base}/{name}", 'test-key', None, 2, 2, adaptive=False)
+
+
+def run_with_pool(tmp_path, make_pool, scenario):
+    """启动模拟端点，设置全局端点池后执行 scenario(session, config, pool)"""
+    async def main():
+        calls = []
+        runner, base = await start_server(build_app(calls))
+        pool = make_pool(base)
+        set_endpoint_pool(pool)
+        try:
+            config = make_config(tmp_path, f"{base}/fast")
+            async with aiohttp.ClientSession() as session:
+                result = await scenario(session, config, pool)
+            return result, calls, pool
+        finally:
+            set_endpoint_pool(None)
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def test_hedge_to_second_endpoint(tmp_path):
+    def make_pool(base):
+        slow, fast = endpoint(base, 'slow'), endpoint(base, 'fast')
+        # slow 的历史延迟很短，本次请求超过该分位数后立即对冲
+        slow.latencies.extend([0.05] * 5)
+        return LLMEndpointPool([slow, fast], hedge_percentile=95, hedge_min_samples=5)
+
+    async def scenario(session, config, pool):
+        return await call_llm_custom(session, 'prompt', config, asyncio.Semaphore(1))
+
+    content, calls, pool = run_with_pool(tmp_path, make_pool, scenario)
+    slow, fast = pool.endpoints
+
+    assert json.loads(content) == [{'endpoint': 'fast'}]
+    assert calls == ['slow', 'fast']
+    assert slow.hedges == 1 and fast.hedge_wins == 1
+    # 被取消的 slow 请求也释放了请求计数
+    assert slow.in_flight == 0 and fast.in_flight == 0
+
+
+def test_eject_failing_endpoint(tmp_path):
+    def make_pool(base):
+        return LLMEndpointPool(
+            [endpoint(base, 'bad'), endpoint(base, 'fast')],
+            hedge_percentile=0, eject_after_failures=2, eject_seconds=60
+        )
+
+    async def scenario(session, config, pool):
+        config.llm_retry_times = 3
+        first = await call_llm_custom(session, 'prompt', config, asyncio.Semaphore(1))
+        second = await call_llm_custom(session, 'prompt', config, asyncio.Semaphore(1))
+        return first, second
+
+    (first, second), calls, pool = run_with_pool(tmp_path, make_pool, scenario)
+    bad, fast = pool.endpoints
+
+    assert json.loads(first) == json.loads(second) == [{'endpoint': 'fast'}]
+    # bad 连续失败 2 次后被移除，之后的请求直接发往 fast
+    assert calls == ['bad', 'bad', 'fast', 'fast']
+    assert bad.ejections == 1 and bad.failures == 2
+    assert bad.in_flight == 0 and fast.in_flight == 0
+
+
+def test_release_when_cancelled_before_start():
+    async def scenario():
+        ep = LLMEndpoint('unused', 'http://127.0.0.1:1/unused', 'test-key', None, 1, 1, adaptive=False)
+        pool = LLMEndpointPool([ep])
+        assert pool.pick() is ep
+        # 对冲请求任务在开始执行前被取消（协程体一行都没有运行）
+        task = _start_attempt(None, pool, ep, {}, None)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return ep
+
+    ep = asyncio.run(scenario())
+
+    assert ep.requests == 1
+    assert ep.in_flight == 0
+
+
+def test_endpoint_without_key_is_skipped(tmp_path, monkeypatch):
+    config = make_config(tmp_path, 'http://primary/v1/chat/completions')
+    config.llm_pool = {'endpoints': [
+        {'name': 'other', 'url': 'http://other/v1/chat/completions', 'api_key_env': 'TEST_OTHER_KEY'},
+        {'name': 'same-host', 'url': 'http://primary/v1/chat/completions'},
+        {'name': 'keyed', 'url': 'http://keyed/v1/chat/completions', 'api_key_env': 'TEST_KEYED_KEY'},
+    ]}
+    monkeypatch.delenv('TEST_OTHER_KEY', raising=False)
+    monkeypatch.setenv('TEST_KEYED_KEY', 'keyed-key')
+
+    pool = build_endpoint_pool(config, 2, adaptive=False)
+
+    # 默认端点的 Key 只用于默认端点的地址，不会发给其他服务商
+    assert {ep.name: ep.api_key for ep in pool.endpoints} == {
+        'default': 'test-key', 'same-host': 'test-key', 'keyed': 'keyed-key'
+    }
+
+
+def test_strong_tier_keeps_its_model(tmp_path):
+    async def main():
+        calls = []
+
+        async def handle(request):
+            body = await request.json()
+            calls.append((request.path.strip('/'), body['model']))
+            content = json.dumps([{'endpoint': request.path}])
+            return web.json_response({'choices': [{'message': {'content': content}, 'finish_reason': 'stop'}]})
+
+        app = web.Application()
+        app.router.add_post('/{name}', handle)
+        runner, base = await start_server(app)
+        config = make_config(tmp_path, f"{base}/direct")
+        config.llm_strong_model = 'strong-model'
+        strong = config.strong_tier_config()
+        sem = asyncio.Semaphore(4)
+
+        def pooled(name):
+            return LLMEndpoint(name, f"{base}/{name}", 'test-key', 'pooled-model', 2, 2, adaptive=False)
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                async def run(pool, tier_config):
+                    calls.clear()
+                    set_endpoint_pool(pool)
+                    await asyncio.gather(*[call_llm_custom(session, 'prompt', tier_config, sem) for _ in range(2)])
+                    return sorted(calls)
+
+                mixed = LLMEndpointPool([endpoint(base, 'default'), pooled('pooled')], hedge_percentile=0,
+                                        default_model=config.llm_model)
+                cheap_calls = await run(mixed, config)
+                strong_calls = await run(mixed, strong)
+                only_pooled = LLMEndpointPool([pooled('pooled')], hedge_percentile=0, default_model=config.llm_model)
+                direct_calls = await run(only_pooled, strong)
+        finally:
+            set_endpoint_pool(None)
+            await runner.cleanup()
+        return cheap_calls, strong_calls, direct_calls
+
+    cheap_calls, strong_calls, direct_calls = asyncio.run(main())
+
+    # 默认模型的请求分散到两个端点，配置了自己模型的端点换成该模型
+    assert cheap_calls == [('default', 'test-model'), ('pooled', 'pooled-model')]
+    # 强模型的请求不发往配置了自己模型的端点，模型名保持不变
+    assert strong_calls == [('default', 'strong-model'), ('default', 'strong-model')]
+    # 没有能处理强模型的端点时直接请求 LLM_API_URL
+    assert direct_calls == [('direct', 'strong-model'), ('direct', 'strong-model')]
@@ -0,0 +1,50 @@
+"""
+翻译缓存和图片结果存储：写入累计到 commit_every 行才提交，未提交的行对同一连接可见，close 时提交
+"""
+
+import sqlite3
+
+from card_generator.image_source.store import ImageResultStore
+from card_generator.llm_cache import TranslationCache
+
+from conftest import translation
+
+
+def committed_rows(db_file, table):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_image_store_batches_commits(tmp_path):
+    db_file = str(tmp_path / 'image_results.sqlite3')
+    store = ImageResultStore(db_file, commit_every=3)
+    store.put('Safebooru', 'tag_a', 'http://img/a.jpg')
+    store.put('Safebooru', 'tag_b', None)
+    assert store.get('Safebooru', 'tag_a') == (True, 'http://img/a.jpg')
+    assert committed_rows(db_file, 'image_results') == 0
+
+    store.put('Safebooru', 'tag_c', 'http://img/c.jpg')
+    assert committed_rows(db_file, 'image_results') == 3
+
+    store.put('Safebooru', 'tag_d', None)
+    store.close()
+    assert committed_rows(db_file, 'image_results') == 4
+
+
+def test_translation_cache_batches_commits(tmp_path):
+    db_file = str(tmp_path / 'llm_cache.sqlite3')
+    cache = TranslationCache(db_file, 'test-model', 'v1', commit_every=3)
+    cache.put_many([translation('tag_a'), translation('tag_b')])
+    assert set(cache.get_many(['tag_a', 'tag_b'])) == {'tag_a', 'tag_b'}
+    assert committed_rows(db_file, 'translations') == 0
+
+    cache.put_many([translation('tag_c')])
+    assert committed_rows(db_file, 'translations') == 3
+
+    cache.put_many([translation('tag_d')])
+    cache.flush()
+    assert committed_rows(db_file, 'translations') == 4
+    cache.close()
@@ -0,0 +1,139 @@
+"""
+Safebooru 合并查询：与单标签查询选图一致、熔断时不当作无图、等待队列被取消时退回单标签查询
+"""
+
+import asyncio
+import re
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+from card_generator.image_source import CircuitOpenError
+from card_generator.safebooru import SafebooruImageSource, BatchedSafebooruImageSource
+from card_generator.stats import Stats
+
+
+def make_posts():
+    """按 id 倒序返回的 post：tag_a 很多图，tag_b 少量图，tag_c 只有非 solo 图，tag_d 没有图"""
+    posts = []
+    for i in range(1, 41):
+        tags = ['tag_a', 'solo'] if i % 3 else ['tag_a', 'tag_b']
+        if i % 7 == 0:
+            tags = ['tag_b', 'solo']
+        if i in (5, 17):
+            tags = ['tag_c', 'multiple_girls']
+        posts.append({
+            'id': i, 'directory': '1', 'image': f'{i}.jpg', 'tags': ' '.join(tags),
+            'score': i % 5, 'width': 100, 'height': 100 + i,
+        })
+    return sorted(posts, key=lambda post: -post['id'])
+
+
+class FakeApi:
+    """解析 post 接口的查询（单标签、{a ~ b} OR 查询，可带 solo），返回最新的 limit 个 post"""
+
+    def __init__(self):
+        self.posts = make_posts()
+        self.queries = []
+
+    async def fetch_posts(self, session, url, sem_img, retry_times, retry_delay):
+        params = parse_qs(urlparse(url).query)
+        query, limit = params['tags'][0], int(params['limit'][0])
+        self.queries.append(query)
+        solo = query.endswith(' solo')
+        query = query[:-len(' solo')] if solo else query
+        wanted = set(re.sub(r'[{}]', '', query).split(' ~ '))
+        result = [
+            post for post in self.posts
+            if wanted & set(post['tags'].split()) and (not solo or 'solo' in post['tags'].split())
+        ]
+        await asyncio.sleep(0)
+        return result[:limit]
+
+
+def patch(source, api):
+    source.fetch_posts = api.fetch_posts
+    return source
+
+
+async def search_all(source, tags):
+    stats = Stats()
+    results = await asyncio.gather(*[
+        source.search(None, tag, {}, asyncio.Semaphore(5), 1, 0, stats) for tag in tags
+    ])
+    return dict(zip(tags, results)), stats
+
+
+@pytest.mark.parametrize('candidates', [1, 3, 10])
+def test_batched_matches_single_queries(candidates):
+    tags = ['tag_a', 'tag_b', 'tag_c', 'tag_d']
+    single = patch(SafebooruImageSource(candidates=candidates), FakeApi())
+    # limit 较小，结果会被截断，候选不完整的标签退回单标签查询
+    api = FakeApi()
+    batched = patch(BatchedSafebooruImageSource(max_tags=4, limit=12, candidates=candidates), api)
+
+    expected, _ = asyncio.run(search_all(single, tags))
+    actual, stats = asyncio.run(search_all(batched, tags))
+
+    assert actual == expected
+    assert {tag: batched.pop_alternates(tag) for tag in tags} == {tag: single.pop_alternates(tag) for tag in tags}
+    assert stats.img_batch_requests == 1
+    assert stats.img_batch_resolved >= 1
+    assert ('solo' in api.queries[0]) == (candidates == 1)
+
+
+def test_circuit_open_is_not_a_miss():
+    calls = []
+
+    async def open_breaker(session, url, *args):
+        calls.append(url)
+        raise CircuitOpenError("图片源 Safebooru 已熔断")
+
+    batched = BatchedSafebooruImageSource(max_tags=2, window=0.01)
+    batched.fetch_posts = open_breaker
+
+    async def scenario():
+        return await asyncio.gather(*[
+            batched.search(None, tag, {}, asyncio.Semaphore(1), 1, 0, Stats()) for tag in ('tag_a', 'tag_b')
+        ], return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, CircuitOpenError) for result in results)
+    # 熔断错误直接交给调用方，不退回单标签查询
+    assert len(calls) == 1
+
+
+def test_cancelled_flush_falls_back_to_single_queries():
+    api = FakeApi()
+    batched = patch(BatchedSafebooruImageSource(max_tags=10, window=60, candidates=3), api)
+
+    async def scenario():
+        task = asyncio.create_task(search_all(batched, ['tag_a', 'tag_b']))
+        await asyncio.sleep(0.01)
+        batched._flush_task.cancel()
+        return await asyncio.wait_for(task, 5)
+
+    results, stats = asyncio.run(scenario())
+
+    assert all(results.values())
+    assert stats.img_batch_requests == 0
+    assert stats.img_batch_fallback == 2
+    assert api.queries == ['tag_a', 'tag_b']
+
+
+@pytest.mark.parametrize('candidates', [1, 10])
+def test_untruncated_misses_are_not_requeried(candidates):
+    tags = ['tag_a', 'tag_b', 'tag_c', 'tag_d']
+    single = patch(SafebooruImageSource(candidates=candidates), FakeApi())
+    api = FakeApi()
+    batched = patch(BatchedSafebooruImageSource(max_tags=4, limit=100, candidates=candidates), api)
+
+    expected, _ = asyncio.run(search_all(single, tags))
+    actual, stats = asyncio.run(search_all(batched, tags))
+
+    assert actual == expected
+    # tag_d 没有图片（candidates 为 1 时 tag_c 也没有 solo 图），结果未被截断，不再单独查询
+    assert expected['tag_d'] is None
+    assert len(api.queries) == 1
+    assert stats.img_batch_fallback == 0
+    assert stats.img_batch_resolved == len(tags)
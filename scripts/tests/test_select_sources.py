@@ -0,0 +1,64 @@
+"""
+图片源选择：按 (作品后缀, source_en) 缓存的结果与逐条调用匹配函数的原始实现一致
+"""
+
+from benchmark_select_sources import DummyImageSource, legacy_select_sources
+from card_generator.image_source import ImageSourceManager
+
+
+def build_manager(*patterns):
+    manager = ImageSourceManager()
+    for name in ('Safebooru', 'Suffix', 'Name', 'Work', 'Custom'):
+        manager.register_source(DummyImageSource(name))
+    manager.add_pattern_rule(r'_\(genshin_impact\)$', 'Suffix')
+    for pattern in patterns:
+        manager.add_pattern_rule(pattern, 'Name')
+    manager.add_source_rule('Genshin Impact', 'Work')
+    return manager
+
+
+TAGS = [
+    ('hu_tao_(genshin_impact)', 'Genshin Impact'),
+    ('keqing_(genshin_impact)', ''),
+    ('keqing_(genshin_impact)', 'Genshin Impact'),
+    ('hu_tao_(cosplay)', 'Genshin Impact'),
+    ('hu_tao', None),
+    ('kamisato_ayaka_(genshin_impact)', 'Genshin Impact'),
+    ('kamisato_ayato_(genshin_impact)', ''),
+    ('_(genshin_impact)', ''),
+    ('hu_tao_(genshin_impact)_(cosplay)', ''),
+]
+
+
+def check(manager):
+    for _ in range(2):
+        for tag, source_en in TAGS:
+            item = {'tag': tag, 'source_en': source_en}
+            assert manager.select_sources(tag, item) == legacy_select_sources(manager, tag, item), tag
+
+
+def test_suffix_cache_matches_legacy():
+    check(build_manager())
+
+
+def test_name_patterns_bypass_suffix_cache():
+    check(build_manager(r'^kamisato_', r'ayaka_\(genshin', r'(?<=o)_\(cosplay\)', r'\bhu_tao'))
+
+
+def test_custom_rules_and_uncombinable_patterns():
+    manager = build_manager(r'(ka)misato_\1')
+    manager.add_rule(lambda tag, item_data: tag.startswith('keqing'), 'Custom')
+    check(manager)
+
+
+def test_overlapping_rules_all_selected():
+    manager = ImageSourceManager()
+    for name in ('Safebooru', 'A', 'B'):
+        manager.register_source(DummyImageSource(name))
+    manager.add_pattern_rule('hu_tao', 'A')
+    manager.add_pattern_rule('hu_', 'B')
+    manager.add_pattern_rule('hu', 'A')
+    for tag in ('hu_tao', 'hu_tao_(genshin_impact)', 'shu_', 'hu'):
+        item = {'tag': tag, 'source_en': ''}
+        assert manager.select_sources(tag, item) == legacy_select_sources(manager, tag, item), tag
+    assert [s.get_name() for s in manager.select_sources('hu_tao', {})] == ['A', 'B', 'Safebooru']
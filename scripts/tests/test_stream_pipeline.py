@@ -0,0 +1,46 @@
+"""
+流水线预筛选：生产者跨批次凑满 img_prefilter_batch 个标签后才发起一次预筛选
+"""
+
+import asyncio
+
+from card_generator import data_processor
+from card_generator.stats import Stats
+
+from conftest import make_config
+
+
+def test_prefilter_spans_batches(tmp_path, monkeypatch):
+    calls = []
+    seen = []
+
+    async def fake_prefilter(session, items, sem_img, retry_times, retry_delay, stats):
+        calls.append(len(items))
+
+    async def fake_pipeline_batch(session, batch, *args):
+        prefilter_task = args[-1]
+        await asyncio.shield(prefilter_task)
+        seen.append(prefilter_task)
+        return batch
+
+    monkeypatch.setattr(data_processor._image_manager, 'prefilter', fake_prefilter)
+    monkeypatch.setattr(data_processor, 'pipeline_batch', fake_pipeline_batch)
+
+    config = make_config(tmp_path, 'http://127.0.0.1:1')
+    config.img_prefilter_enabled = True
+    config.img_prefilter_batch = 100
+    batches = ([{'tag': f'tag_{i}_{j}'} for j in range(10)] for i in range(25))
+
+    async def run():
+        results = []
+        async for result in data_processor.stream_pipeline(
+            None, batches, config, asyncio.Semaphore(1), asyncio.Semaphore(1),
+            Stats(), None, workers=4, queue_size=4
+        ):
+            results.append(result)
+        return results
+
+    results = asyncio.run(run())
+    assert len(results) == 25
+    assert calls == [100, 100, 50]
+    assert len(set(seen)) == 3